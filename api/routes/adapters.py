@@ -3,9 +3,11 @@ from tortoise.transactions import in_transaction
 from typing import Annotated
 
 from models import StorageAdapter
+from models.database import OneDriveItem, OneDriveMirrorState, TelegramCatalogState, TelegramMessage
 from schemas import AdapterCreate, AdapterOut
 from services.auth import get_current_active_user, User
 from services.adapters.registry import runtime_registry, get_config_schemas
+from services.block_cache import block_cache
 from api.response import success
 from services.logging import LogService
 
@@ -87,6 +89,23 @@ async def available_adapter_types(
     return success(data)
 
 
+@router.get("/block-cache", summary="流式读取块缓存状态")
+async def block_cache_stats(
+    current_user: Annotated[User, Depends(get_current_active_user)]
+):
+    return success(block_cache.stats())
+
+
+@router.delete("/block-cache", summary="清空流式读取块缓存")
+async def clear_block_cache(
+    current_user: Annotated[User, Depends(get_current_active_user)]
+):
+    if current_user.username != 'admin':
+        raise HTTPException(status_code=403, detail="仅管理员可操作")
+    block_cache.clear()
+    return success(msg="块缓存已清空")
+
+
 @router.get("/{adapter_id}")
 async def get_adapter(
     adapter_id: int,
@@ -140,6 +159,10 @@ async def delete_adapter(
     if not deleted:
         raise HTTPException(404, detail="Not found")
     runtime_registry.remove(adapter_id)
+    await TelegramMessage.filter(adapter_id=adapter_id).delete()
+    await TelegramCatalogState.filter(adapter_id=adapter_id).delete()
+    await OneDriveItem.filter(adapter_id=adapter_id).delete()
+    await OneDriveMirrorState.filter(adapter_id=adapter_id).delete()
     await LogService.action(
         "route:adapters",
         f"Deleted adapter {adapter_id}",
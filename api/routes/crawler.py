@@ -0,0 +1,23 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from services.auth import get_current_active_user
+from models.database import UserAccount
+from services.crawler import crawler_service
+from api.response import success
+
+router = APIRouter(prefix="/api/crawler", tags=["crawler"])
+
+
+@router.get("/status", summary="各挂载点的遍历状态")
+async def crawler_status(user: UserAccount = Depends(get_current_active_user)):
+    return success(await crawler_service.status())
+
+
+@router.post("/run", summary="立即遍历挂载点")
+async def run_crawler(
+    adapter_id: int | None = Query(None, description="适配器 ID，为空时遍历全部"),
+    user: UserAccount = Depends(get_current_active_user),
+):
+    if user.username != 'admin':
+        raise HTTPException(status_code=403, detail="仅管理员可操作")
+    crawler_service.run_now(adapter_id)
+    return success(msg="遍历已开始")
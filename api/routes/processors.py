@@ -1,7 +1,8 @@
-from fastapi import APIRouter, Depends, Body
+from fastapi import APIRouter, Depends, Body, HTTPException
 from typing import Annotated
 from services.processors.registry import get_config_schemas
 from services.task_queue import task_queue_service
+from services.batch_jobs import batch_job_service
 from services.auth import get_current_active_user, User
 from api.response import success
 from pydantic import BaseModel
@@ -50,3 +51,35 @@ async def process_file_with_processor(
         },
     )
     return success({"task_id": task.id})
+
+
+class ProcessDirectoryRequest(BaseModel):
+    path: str
+    processor_type: str
+    config: dict
+    pattern: str | None = None
+    recursive: bool = True
+    save_to_dir: str | None = None
+    overwrite: bool = False
+    concurrency: int = 4
+
+
+@router.post("/process-directory")
+async def process_directory_with_processor(
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    req: ProcessDirectoryRequest = Body(...)
+):
+    try:
+        task = await batch_job_service.submit(
+            req.path,
+            req.processor_type,
+            req.config,
+            pattern=req.pattern,
+            recursive=req.recursive,
+            save_to_dir=req.save_to_dir,
+            overwrite=req.overwrite,
+            concurrency=req.concurrency,
+        )
+    except ValueError as e:
+        raise HTTPException(400, detail=str(e))
+    return success({"task_id": task.id, "job_id": task.task_info["job_id"]})
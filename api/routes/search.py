@@ -1,41 +1,201 @@
-from fastapi import APIRouter, Depends, Query
+import asyncio
+import json
+from typing import Any, Dict, List
+
+from fastapi import APIRouter, Depends, HTTPException, Query
 from schemas.fs import SearchResultItem
 from services.auth import get_current_active_user, User
-from services.ai import get_text_embedding
-from services.vector_db import VectorDBService
+from services.image_features import FEATURE_COLLECTION, FEATURE_DIM, FEATURE_MODEL, features_for_path
+from services.query_cache import cache_stats, get_query_embedding, normalize_query, search_result_cache
+from services.vector_store import vector_store
+from services.filename_index import filename_index
+from services.task_queue import task_queue_service
+from api.response import success
 
 router = APIRouter(prefix="/api/search", tags=["search"])
 
-async def search_files_by_vector(q: str, top_k: int):
-    embedding = await get_text_embedding(q)
-    vector_db = VectorDBService()
-    results = vector_db.search_vectors("vector_collection", embedding, top_k)
+# 倒数排名融合的平滑常数
+RRF_K = 60
+# 混合检索时每一路召回的候选数 = top_k * HYBRID_CANDIDATES
+HYBRID_CANDIDATES = 2
+
+
+def build_filters(mount: str | None = None, exts: str | None = None, min_size: int | None = None,
+                  max_size: int | None = None, modified_after: int | None = None,
+                  modified_before: int | None = None) -> Dict[str, Any] | None:
+    filters = {
+        "path_prefix": mount.rstrip('/') if mount and mount != '/' else None,
+        "exts": [e.strip().lstrip('.').lower() for e in exts.split(',') if e.strip()] if exts else None,
+        "min_size": min_size,
+        "max_size": max_size,
+        "mtime_from": modified_after,
+        "mtime_to": modified_before,
+    }
+    filters = {k: v for k, v in filters.items() if v is not None}
+    return filters or None
+
+
+def reciprocal_rank_fusion(*rankings: List[str], k: int = RRF_K) -> List[tuple[str, float]]:
+    """按 Σ 1/(k + rank) 合并多路排序结果，返回 (路径, 融合分数)，分数从高到低"""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, path in enumerate(ranking, start=1):
+            scores[path] = scores.get(path, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: -item[1])
+
+
+async def search_files_by_vector(q: str, top_k: int, filters: Dict[str, Any] | None = None,
+                                 filter_mode: str = "pre"):
+    embedding = await get_query_embedding(q)
+    if not await vector_store.matches("vector_collection", len(embedding)):
+        # 集合缺失或与当前模型不一致（待重建）：查询不做迁移，直接返回空结果
+        return {"items": [], "query": q}
+    results = await vector_store.search_files("vector_collection", embedding, top_k, filters, filter_mode)
     items = [
-        SearchResultItem(id=res["id"], path=res["entity"]["path"], score=res["distance"])
-        for res in results[0]
+        SearchResultItem(id=res["path"], path=res["path"], score=res["score"], snippet=res["snippet"])
+        for res in results
     ]
     return {"items": items, "query": q}
 
-async def search_files_by_name(q: str, top_k: int):
-    vector_db = VectorDBService()
-    results = vector_db.search_by_path("vector_collection", q, top_k)
+async def search_adapter_catalog(q: str, top_k: int, mount: str, page: int = 1):
+    """挂载点的适配器自带可搜索的本地目录（如 Telegram 消息目录）时直接查询；否则返回 None"""
+    from services.virtual_fs import resolve_adapter_and_rel
+
+    try:
+        adapter, _, root, rel = await resolve_adapter_and_rel(mount)
+    except HTTPException:
+        return None
+    search = getattr(adapter, "search", None)
+    if not callable(search) or rel.strip('/'):
+        return None
+    entries, total = await search(root, q, page, top_k)
+    base = mount.rstrip('/')
     items = [
-        SearchResultItem(id=idx, path=res["entity"]["path"], score=res["distance"])
-        for idx, res in enumerate(results[0])
+        SearchResultItem(id=f"{base}/{e['name']}", path=f"{base}/{e['name']}", score=1.0) for e in entries
     ]
-    return {"items": items, "query": q}
+    return {"items": items, "query": q, "page": page, "has_more": page * top_k < total}
+
+
+async def search_files_by_name(q: str, top_k: int, match: str = "substring", mount: str | None = None, page: int = 1,
+                               filters: Dict[str, Any] | None = None):
+    result = await filename_index.search(q, match=match, mount=mount, page=page, page_size=top_k, filters=filters)
+    items = [
+        SearchResultItem(id=res["id"], path=res["path"], score=res["score"])
+        for res in result["items"]
+    ]
+    return {"items": items, "query": q, "page": result["page"], "has_more": result["has_more"]}
+
+
+async def search_files_hybrid(q: str, top_k: int, match: str = "substring", filters: Dict[str, Any] | None = None,
+                              filter_mode: str = "pre"):
+    """向量检索与文件名检索并发执行，在同一组过滤条件下各取候选，再用倒数排名融合"""
+    candidates = top_k * HYBRID_CANDIDATES
+    mount = (filters or {}).get("path_prefix")
+    vector_result, name_result = await asyncio.gather(
+        search_files_by_vector(q, candidates, filters, filter_mode),
+        filename_index.search(q, match=match, mount=mount, page_size=candidates, filters=filters),
+        return_exceptions=True,
+    )
+    if isinstance(name_result, BaseException):
+        raise name_result
+    vector_items = [] if isinstance(vector_result, BaseException) else vector_result["items"]
+    vector_hits = [item.path for item in vector_items]
+    snippets = {item.path: item.snippet for item in vector_items}
+    name_hits = [item["path"] for item in name_result["items"]]
+    fused = reciprocal_rank_fusion(vector_hits, name_hits)[:top_k]
+    response = {
+        "items": [
+            SearchResultItem(id=path, path=path, score=score, snippet=snippets.get(path)) for path, score in fused
+        ],
+        "query": q,
+        "sources": {"vector": len(vector_hits), "filename": len(name_hits)},
+    }
+    if isinstance(vector_result, BaseException):
+        # 未配置嵌入模型等情况下退化为文件名检索
+        response["vector_error"] = str(vector_result)
+    return response
 
 
 @router.get("")
 async def search_files(
     q: str = Query(..., description="搜索查询"),
     top_k: int = Query(10, description="返回结果数量"),
-    mode: str = Query("vector", description="搜索模式: 'vector' 或 'filename'"),
+    mode: str = Query("vector", description="搜索模式: 'vector'、'filename' 或 'hybrid'"),
+    match: str = Query("substring", description="文件名匹配方式: 'substring'、'prefix' 或 'fuzzy'"),
+    mount: str | None = Query(None, description="仅搜索该挂载点（或目录）下的文件"),
+    page: int = Query(1, ge=1, description="文件名搜索页码"),
+    exts: str | None = Query(None, description="扩展名过滤，逗号分隔，如 jpg,png"),
+    min_size: int | None = Query(None, ge=0, description="最小文件大小（字节）"),
+    max_size: int | None = Query(None, ge=0, description="最大文件大小（字节）"),
+    modified_after: int | None = Query(None, description="修改时间下限（Unix 秒）"),
+    modified_before: int | None = Query(None, description="修改时间上限（Unix 秒）"),
+    filter_mode: str = Query("pre", description="向量检索的过滤方式: 'pre'（检索内过滤）或 'post'（检索后过滤）"),
     user: User = Depends(get_current_active_user),
 ):
+    filters = build_filters(mount, exts, min_size, max_size, modified_after, modified_before)
+    if mode == "filename" and mount and match == "substring" and set(filters or {}) <= {"path_prefix"}:
+        # 适配器目录随其自身同步变化，不在索引版本之内，结果不经过缓存
+        result = await search_adapter_catalog(q, top_k, mount, page)
+        if result is not None:
+            return result
+    # 键中包含索引版本：向量集合或文件名索引变化后旧结果不再命中
+    cache_key = (
+        mode, normalize_query(q), top_k, match, mount, page, filter_mode,
+        json.dumps(filters, sort_keys=True), vector_store.version, filename_index.version,
+    )
+    cached = search_result_cache.get(cache_key)
+    if cached is not None:
+        return {**cached, "query": q}
     if mode == "vector":
-        return await search_files_by_vector(q, top_k)
+        result = await search_files_by_vector(q, top_k, filters, filter_mode)
     elif mode == "filename":
-        return await search_files_by_name(q, top_k)
+        result = await search_files_by_name(q, top_k, match, mount, page, filters)
+    elif mode == "hybrid":
+        result = await search_files_hybrid(q, top_k, match, filters, filter_mode)
     else:
-        return {"items": [], "query": q, "error": "Invalid search mode"}
\ No newline at end of file
+        return {"items": [], "query": q, "error": "Invalid search mode"}
+    if "vector_error" not in result:
+        search_result_cache.set(cache_key, result)
+    return result
+
+
+@router.get("/similar", summary="查找相似图片")
+async def search_similar_images(
+    path: str = Query(..., description="作为查询的图片路径"),
+    top_k: int = Query(10, description="返回结果数量"),
+    mount: str | None = Query(None, description="仅搜索该挂载点（或目录）下的文件"),
+    exts: str | None = Query(None, description="扩展名过滤，逗号分隔，如 jpg,png"),
+    user: User = Depends(get_current_active_user),
+):
+    """用本地图片特征（感知哈希 + 颜色直方图）在 image_local 索引中查找相似图片，结果不含查询图片本身"""
+    path = '/' + path if not path.startswith('/') else path
+    # 只读检查：集合缺失或特征版本不符（重建中）时返回空结果，查询不触发建集合或重建
+    if not await vector_store.matches(FEATURE_COLLECTION, FEATURE_DIM, FEATURE_MODEL):
+        return success({"items": [], "query": path})
+    try:
+        features = await features_for_path(path)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    filters = build_filters(mount, exts)
+    results = await vector_store.search(FEATURE_COLLECTION, features, top_k + 1, filters)
+    items = [
+        SearchResultItem(id=r["entity"]["path"], path=r["entity"]["path"], score=r["distance"])
+        for r in results[0] if r["entity"]["path"] != path
+    ][:top_k]
+    return success({"items": items, "query": path})
+
+
+@router.get("/cache-stats", summary="查询缓存命中率")
+async def get_search_cache_stats(user: User = Depends(get_current_active_user)):
+    return success(cache_stats())
+
+
+@router.post("/filename-index/rebuild", summary="重建文件名索引")
+async def rebuild_filename_index(
+    path: str = Query("/", description="重建范围"),
+    user: User = Depends(get_current_active_user),
+):
+    if user.username != 'admin':
+        raise HTTPException(status_code=403, detail="仅管理员可操作")
+    task = await task_queue_service.add_task("filename_index_rebuild", {"path": path})
+    return success({"task_id": task.id})
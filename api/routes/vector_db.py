@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException
 from services.auth import get_current_active_user
 from models.database import UserAccount
-from services.vector_db import VectorDBService
+from services.vector_store import vector_store
 from api.response import success
 
 router = APIRouter(prefix="/api/vector-db", tags=["vector-db"])
@@ -12,8 +12,22 @@ async def clear_vector_db(user: UserAccount = Depends(get_current_active_user)):
     if user.username != 'admin':
         raise HTTPException(status_code=403, detail="仅管理员可操作")
     try:
-        service = VectorDBService()
-        service.clear_all_data()
+        await vector_store.clear_all()
         return success(msg="向量数据库已清空")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/status", summary="向量集合与索引配置状态")
+async def vector_db_status(user: UserAccount = Depends(get_current_active_user)):
+    return success(await vector_store.status())
+
+
+@router.post("/rebuild", summary="按当前嵌入模型与索引配置重建向量集合")
+async def rebuild_vector_db(user: UserAccount = Depends(get_current_active_user)):
+    if user.username != 'admin':
+        raise HTTPException(status_code=403, detail="仅管理员可操作")
+    await vector_store.rebuild()
+    return success(msg="向量集合重建已开始")
+
+
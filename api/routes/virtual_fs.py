@@ -15,9 +15,12 @@ from services.virtual_fs import (
     stream_file,
     generate_temp_link_token,
     verify_temp_link_token,
+    is_cross_mount,
 )
+from services.transfer import transfer_service
 from services.thumbnail import is_image_filename, get_or_create_thumb, is_raw_filename
 from schemas import MkdirRequest, MoveRequest
+from schemas.fs import TransferRequest
 from api.response import success
 from services.config import ConfigCenter
 
@@ -223,6 +226,11 @@ async def api_move(
 ):
     src = body.src if body.src.startswith('/') else '/' + body.src
     dst = body.dst if body.dst.startswith('/') else '/' + body.dst
+    if await is_cross_mount(src, dst):
+        # 跨挂载点移动需要搬运数据，转为后台传输任务
+        task = await _submit_transfer(src, dst, "move", False)
+        return success({"moved": False, "queued": True, "src": src, "dst": dst,
+                        "task_id": task.id, "job_id": task.task_info["job_id"]})
     await move_path(src, dst)
     return success({"moved": True, "src": src, "dst": dst})
 
@@ -257,6 +265,10 @@ async def api_copy(
     from services.virtual_fs import copy_path
     src = body.src if body.src.startswith('/') else '/' + body.src
     dst = body.dst if body.dst.startswith('/') else '/' + body.dst
+    if await is_cross_mount(src, dst):
+        task = await _submit_transfer(src, dst, "copy", overwrite)
+        return success({"copied": False, "queued": True, "src": src, "dst": dst, "overwrite": overwrite,
+                        "task_id": task.id, "job_id": task.task_info["job_id"]})
     debug_info = await copy_path(src, dst, overwrite=overwrite, return_debug=debug)
     return success({
         "copied": True,
@@ -267,6 +279,37 @@ async def api_copy(
     })
 
 
+async def _submit_transfer(src: str, dst: str, operation: str, overwrite: bool, verify: str = "size",
+                           concurrency: int = 4):
+    try:
+        return await transfer_service.submit(src, dst, operation, overwrite, verify, concurrency)
+    except ValueError as e:
+        raise HTTPException(400, detail=str(e))
+
+
+@router.post("/transfer")
+async def api_transfer(
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    body: TransferRequest
+):
+    """提交跨挂载点（也可同挂载点）的流式复制/移动任务，进度通过任务队列或 /transfer/{job_id} 查询"""
+    src = body.src if body.src.startswith('/') else '/' + body.src
+    dst = body.dst if body.dst.startswith('/') else '/' + body.dst
+    task = await _submit_transfer(src, dst, body.operation, body.overwrite, body.verify, body.concurrency)
+    return success({"task_id": task.id, "job_id": task.task_info["job_id"]})
+
+
+@router.get("/transfer/{job_id}")
+async def api_transfer_status(
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    job_id: int
+):
+    info = await transfer_service.status(job_id)
+    if not info:
+        raise HTTPException(404, detail="Transfer job not found")
+    return success(info)
+
+
 @router.post("/upload/{full_path:path}")
 async def upload_stream(
     current_user: Annotated[User, Depends(get_current_active_user)],
@@ -297,7 +340,7 @@ async def upload_stream(
             if not chunk:
                 break
             yield chunk
-    size = await write_file_stream(full_path, gen(), overwrite=overwrite)
+    size = await write_file_stream(full_path, gen(), overwrite=overwrite, size_hint=file.size)
     return success({"uploaded": True, "path": full_path, "size": size, "overwrite": overwrite})
 
 
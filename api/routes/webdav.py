@@ -222,7 +222,9 @@ async def dav_put(path: str, request: Request, user: User = Depends(_get_basic_u
         async for chunk in request.stream():
             if chunk:
                 yield chunk
-    size = await write_file_stream(full_path, body_iter(), overwrite=True)
+    length = request.headers.get("content-length")
+    size_hint = int(length) if length and length.isdigit() else None
+    size = await write_file_stream(full_path, body_iter(), overwrite=True, size_hint=size_hint)
     return Response(status_code=201, headers=_dav_headers({"Content-Length": "0"}))
 
 
@@ -0,0 +1,56 @@
+"""嵌入请求合并吞吐基准：在本地替身嵌入服务上并发提交文本，对比不同合并批大小下的请求数与吞吐。
+
+    python -m benchmarks.embedding --texts 512 --latency-ms 50 --batch-sizes 1 8 32
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Dict, List
+
+from services.ai import DEFAULT_CONCURRENCY, DEFAULT_EMBED_BATCH_SIZE, AIClient
+from tests.servers import serve_embeddings, server_url
+
+
+async def run(texts: int = 512, latency_ms: int = 50, dim: int = 64, concurrency: int = DEFAULT_CONCURRENCY,
+              batch_sizes: List[int] | None = None) -> Dict[str, Any]:
+    results = {}
+    for batch_size in batch_sizes or [1, 8, DEFAULT_EMBED_BATCH_SIZE]:
+        stats: Dict[str, Any] = {}
+        server = await serve_embeddings(latency_ms / 1000, dim, stats)
+        client = AIClient({
+            "url": server_url(server, "/v1/embeddings"), "model": "benchmark", "api_key": "benchmark",
+            "batch_size": max(1, batch_size), "concurrency": max(1, concurrency), "rpm": 0, "dimensions": 0,
+        })
+        try:
+            started = time.perf_counter()
+            vectors = await client.embed_many([f"benchmark text {i}" for i in range(texts)])
+            elapsed = time.perf_counter() - started
+            results[str(batch_size)] = {
+                "seconds": round(elapsed, 3),
+                "texts_per_sec": round(texts / elapsed, 1),
+                "requests": stats["requests"],
+                "max_concurrent_requests": stats["max_active"],
+                "ok": len(vectors) == texts and all(len(v) == dim for v in vectors),
+            }
+        finally:
+            await client.aclose()
+            server.close()
+            await server.wait_closed()
+    return {"texts": texts, "latency_ms": latency_ms, "concurrency": concurrency, "batch_sizes": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--texts", type=int, default=512)
+    parser.add_argument("--latency-ms", type=int, default=50)
+    parser.add_argument("--dim", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, DEFAULT_EMBED_BATCH_SIZE])
+    args = parser.parse_args()
+    result = asyncio.run(run(args.texts, args.latency_ms, args.dim, args.concurrency, args.batch_sizes))
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""分段并发下载吞吐基准：在本地高延迟、单连接限速的替身服务上，对比不同并发度的分段读取吞吐。
+
+    python -m benchmarks.range_fetch --size-mb 64 --latency-ms 50 --bandwidth-mbps 20 --concurrency 1 2 4 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import Any, Dict, List
+
+import httpx
+
+from services.range_fetch import read_ranges
+from tests.servers import serve_ranges, server_url
+
+
+async def run(size_mb: int = 64, latency_ms: int = 50, bandwidth_mbps: int = 20,
+              concurrency_levels: List[int] | None = None) -> Dict[str, Any]:
+    data = os.urandom(size_mb * 1024 * 1024)
+    server = await serve_ranges(data, latency_ms / 1000, bandwidth_mbps * 1024 * 1024)
+    url = server_url(server, "/file")
+    results = {}
+    try:
+        for concurrency in concurrency_levels or [1, 2, 4, 8]:
+            async with httpx.AsyncClient(timeout=60, limits=httpx.Limits(max_connections=concurrency)) as client:
+                async def fetch(s: int, e: int) -> bytes:
+                    resp = await client.get(url, headers={"Range": f"bytes={s}-{e}"})
+                    resp.raise_for_status()
+                    return resp.content
+
+                stats: Dict[str, Any] = {}
+                started = time.perf_counter()
+                body = await read_ranges(fetch, 0, len(data) - 1, concurrency, stats)
+                elapsed = time.perf_counter() - started
+            results[str(concurrency)] = {
+                "seconds": round(elapsed, 3),
+                "mb_per_sec": round(len(body) / elapsed / 1024 / 1024, 2),
+                "segments": stats["segments"],
+                "final_segment_size": stats.get("segment_size"),
+                "ok": body == data,
+            }
+    finally:
+        server.close()
+        await server.wait_closed()
+    return {"size_mb": size_mb, "latency_ms": latency_ms, "bandwidth_mbps_per_connection": bandwidth_mbps,
+            "concurrency": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=64)
+    parser.add_argument("--latency-ms", type=int, default=50)
+    parser.add_argument("--bandwidth-mbps", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+    result = asyncio.run(run(args.size_mb, args.latency_ms, args.bandwidth_mbps, args.concurrency))
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
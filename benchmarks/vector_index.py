@@ -0,0 +1,163 @@
+"""向量索引基准：在临时目录中为各后端建库，测量合并写入吞吐、查询延迟与指定索引类型的 recall@k。
+
+    python -m benchmarks.vector_index --backends milvus numpy --index-type IVF_FLAT --count 5000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+from services.vector_db import BACKEND_MODULES, DEFAULT_INDEX_TYPE, create_backend
+from services.vector_store import AsyncVectorStore
+
+
+class _BenchStore(AsyncVectorStore):
+    """写入合并与线程调度沿用 AsyncVectorStore，后端换成临时实例，不触碰正式数据"""
+
+    def __init__(self, backend):
+        super().__init__()
+        self._backend = backend
+
+    @property
+    def _db(self):
+        return self._backend
+
+
+def _dataset(count: int, dim: int, queries: int, top_k: int, clusters: int):
+    """带聚类结构的合成数据、查询向量与精确 top-k 结果"""
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(clusters, dim))
+    data = centers[rng.integers(0, clusters, count)] + 0.3 * rng.normal(size=(count, dim))
+    data = (data / np.linalg.norm(data, axis=1, keepdims=True)).astype(np.float32)
+    q = data[rng.choice(count, queries)] + 0.05 * rng.normal(size=(queries, dim))
+    q = (q / np.linalg.norm(q, axis=1, keepdims=True)).astype(np.float32)
+    exact = np.argsort(-(q @ data.T), axis=1)[:, :top_k]
+    return data, q, exact
+
+
+def _percentiles(latencies: List[float]) -> Dict[str, float]:
+    latencies = sorted(latencies)
+    return {
+        "search_p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "search_p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 2),
+    }
+
+
+async def throughput(store: _BenchStore, count: int, dim: int, concurrency: int, queries: int,
+                     top_k: int) -> Dict[str, Any]:
+    """并发写入随机向量（经缓冲窗口合并为批量 upsert），再测查询延迟"""
+    collection_name = f"bench_{int(time.time() * 1000)}"
+    rng = random.Random(0)
+    rows = [{"path": f"/bench/{i}", "embedding": [rng.random() for _ in range(dim)]} for i in range(count)]
+    await store._create(collection_name, {"dim": dim, "index_type": None, "params": {}, "model": "benchmark"})
+    try:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def write(row):
+            async with semaphore:
+                await store.upsert(collection_name, row)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(write(row) for row in rows))
+        write_elapsed = time.perf_counter() - started
+
+        latencies = []
+        for i in range(queries):
+            t0 = time.perf_counter()
+            await store.search(collection_name, rows[i % count]["embedding"], top_k)
+            latencies.append(time.perf_counter() - t0)
+        return {
+            "concurrency": concurrency,
+            "upsert_seconds": round(write_elapsed, 3),
+            "upserts_per_sec": round(count / max(write_elapsed, 1e-9), 1),
+            **_percentiles(latencies),
+        }
+    finally:
+        await store.drop_collection(collection_name)
+
+
+async def recall(store: _BenchStore, index_type: str | None, data: np.ndarray, q: np.ndarray, exact: np.ndarray,
+                 top_k: int) -> Dict[str, Any]:
+    """按指定索引类型建集合，对比精确检索结果计算 recall@k"""
+    backend = store._db
+    count, dim = data.shape
+    collection_name = f"bench_{int(time.time() * 1000)}"
+    resolved = backend.resolve_index(index_type, dim)[0]
+    started = time.perf_counter()
+    await store._run(backend.ensure_collection, collection_name, True, dim, index_type=index_type, model="benchmark")
+    try:
+        for i in range(0, count, 1000):
+            rows = [{"path": str(j), "embedding": data[j].tolist()} for j in range(i, min(i + 1000, count))]
+            await store._run(backend.upsert_vector, collection_name, rows)
+        insert_elapsed = time.perf_counter() - started
+
+        hits = 0
+        latencies = []
+        for i in range(q.shape[0]):
+            t0 = time.perf_counter()
+            results = await store._run(backend.search_vectors, collection_name, q[i].tolist(), top_k)
+            latencies.append(time.perf_counter() - t0)
+            found = {int(r["entity"]["path"]) for r in results[0]}
+            hits += len(found & set(exact[i].tolist()))
+        return {
+            "effective_index_type": resolved,
+            "recall": round(hits / (q.shape[0] * top_k), 4),
+            "insert_seconds": round(insert_elapsed, 3),
+            **_percentiles(latencies),
+        }
+    finally:
+        await store._run(backend.drop_collection, collection_name)
+
+
+async def run(backends: List[str] | None = None, index_type: str = DEFAULT_INDEX_TYPE, count: int = 5000,
+              dim: int = 128, queries: int = 100, top_k: int = 10, concurrency: int = 64,
+              clusters: int = 32) -> Dict[str, Any]:
+    data, q, exact = _dataset(count, dim, queries, top_k, clusters)
+    results: Dict[str, Any] = {}
+    for name in backends or list(BACKEND_MODULES):
+        with tempfile.TemporaryDirectory(prefix=f"foxel-bench-{name}-") as tmp:
+            # Milvus 使用临时的 Milvus Lite 文件，其余后端以目录为存储根
+            location = os.path.join(tmp, "bench.db") if name == "milvus" else tmp
+            try:
+                backend = create_backend(name, location)
+            except Exception as e:
+                results[name] = {"error": str(e)}
+                continue
+            store = _BenchStore(backend)
+            try:
+                results[name] = {
+                    "throughput": await throughput(store, count, dim, concurrency, queries, top_k),
+                    "recall": await recall(store, index_type, data, q, exact, top_k),
+                }
+            except Exception as e:
+                results[name] = {"error": str(e)}
+            finally:
+                await store._run(backend.close)
+                await store.aclose()
+    return {"count": count, "dim": dim, "queries": queries, "top_k": top_k, "index_type": index_type.upper(),
+            "backends": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backends", nargs="+", default=list(BACKEND_MODULES))
+    parser.add_argument("--index-type", default=DEFAULT_INDEX_TYPE)
+    parser.add_argument("--count", type=int, default=5000)
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=64)
+    args = parser.parse_args()
+    result = asyncio.run(run(args.backends, args.index_type, args.count, args.dim, args.queries, args.top_k,
+                             args.concurrency))
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,13 @@ from services.middleware.logging_middleware import LoggingMiddleware
 from services.middleware.exception_handler import global_exception_handler
 from dotenv import load_dotenv
 from services.task_queue import task_queue_service
+from services.events import file_event_bus
+from services.batch_jobs import batch_job_service
+from services.transfer import transfer_service
+from services.ai import ai_client
+from services.vector_store import vector_store
+from services.filename_index import filename_index
+from services.crawler import crawler_service
 
 load_dotenv()
 
@@ -21,10 +28,21 @@ async def lifespan(app: FastAPI):
     await runtime_registry.refresh()
     await ConfigCenter.set("APP_VERSION", VERSION)
     await task_queue_service.start_worker()
+    await batch_job_service.resume_pending()
+    await transfer_service.resume_pending()
+    await filename_index.ensure_built()
+    await vector_store.resume_rebuild()
+    await crawler_service.start()
     try:
         yield
     finally:
+        await crawler_service.stop()
+        await file_event_bus.stop()
         await task_queue_service.stop_worker()
+        await runtime_registry.aclose()
+        await ai_client.aclose()
+        await vector_store.aclose()
+        await filename_index.aclose()
         await close_db()
 
 
@@ -53,6 +53,182 @@ class AutomationTask(Model):
         table = "automation_tasks"
 
 
+class BatchJob(Model):
+    id = fields.IntField(pk=True)
+    key = fields.CharField(max_length=64, index=True)
+    path = fields.CharField(max_length=1024)
+    pattern = fields.CharField(max_length=255, null=True)
+    recursive = fields.BooleanField(default=True)
+
+    processor_type = fields.CharField(max_length=100)
+    processor_config = fields.JSONField()
+    save_to_dir = fields.CharField(max_length=1024, null=True)
+    overwrite = fields.BooleanField(default=False)
+    concurrency = fields.IntField(default=4)
+
+    status = fields.CharField(max_length=20, default="pending")
+    # 遍历顺序下已连续完成的文件数，用于断点续跑
+    done_count = fields.IntField(default=0)
+    # 水位之后已乱序完成的文件序号，续跑时跳过，不重复处理和计数
+    done_after = fields.JSONField(null=True)
+    processed = fields.IntField(default=0)
+    failed = fields.IntField(default=0)
+    bytes_processed = fields.BigIntField(default=0)
+    error = fields.TextField(null=True)
+
+    created_at = fields.DatetimeField(auto_now_add=True)
+    updated_at = fields.DatetimeField(auto_now=True)
+
+    class Meta:
+        table = "batch_jobs"
+
+
+class TransferJob(Model):
+    id = fields.IntField(pk=True)
+    key = fields.CharField(max_length=64, index=True)
+    src = fields.CharField(max_length=1024)
+    dst = fields.CharField(max_length=1024)
+    # copy 或 move
+    operation = fields.CharField(max_length=10, default="copy")
+    overwrite = fields.BooleanField(default=False)
+    # none、size 或 checksum
+    verify = fields.CharField(max_length=10, default="size")
+    concurrency = fields.IntField(default=4)
+
+    status = fields.CharField(max_length=20, default="pending")
+    # 遍历顺序下已连续完成的文件数，用于复制任务断点续跑
+    done_count = fields.IntField(default=0)
+    # 续跑记录：writing 为中断时正在写入或写入失败的目标（本任务写过，允许覆盖），
+    # conflicts 为因目标已存在而失败的文件（重新尝试但不覆盖）；旧格式为 writing 列表
+    in_flight = fields.JSONField(default=list)
+    processed = fields.IntField(default=0)
+    skipped = fields.IntField(default=0)
+    failed = fields.IntField(default=0)
+    bytes_transferred = fields.BigIntField(default=0)
+    error = fields.TextField(null=True)
+
+    created_at = fields.DatetimeField(auto_now_add=True)
+    updated_at = fields.DatetimeField(auto_now=True)
+
+    class Meta:
+        table = "transfer_jobs"
+
+
+class EmbeddingCache(Model):
+    id = fields.IntField(pk=True)
+    content_hash = fields.CharField(max_length=64, index=True)
+    model = fields.CharField(max_length=255)
+    description = fields.TextField(null=True)
+    # float32 小端序列化的向量
+    embedding = fields.BinaryField()
+    created_at = fields.DatetimeField(auto_now_add=True)
+
+    class Meta:
+        table = "embedding_cache"
+        unique_together = (("content_hash", "model"),)
+
+
+class CatalogEntry(Model):
+    id = fields.IntField(pk=True)
+    adapter_id = fields.IntField(index=True)
+    path = fields.CharField(max_length=1024, index=True)
+    parent = fields.CharField(max_length=1024, index=True)
+    name = fields.CharField(max_length=255)
+    is_dir = fields.BooleanField(default=False)
+    size = fields.BigIntField(default=0)
+    mtime = fields.BigIntField(default=0)
+    etag = fields.CharField(max_length=255, null=True)
+    # 远端条目 ID（如 OneDrive item id），增量变更按 ID 定位
+    remote_id = fields.CharField(max_length=255, null=True, index=True)
+    # 最近一次遍历的代数，遍历完成后低于当前代数的条目视为已删除
+    gen = fields.IntField(default=0)
+
+    class Meta:
+        table = "catalog_entries"
+        unique_together = (("adapter_id", "path"),)
+
+
+class CrawlState(Model):
+    id = fields.IntField(pk=True)
+    adapter_id = fields.IntField(unique=True)
+    status = fields.CharField(max_length=20, default="idle")
+    strategy = fields.CharField(max_length=20, null=True)
+    gen = fields.IntField(default=0)
+    # 未完成遍历的断点：待遍历目录或列举标记
+    cursor = fields.JSONField(null=True)
+    stats = fields.JSONField(null=True)
+    error = fields.TextField(null=True)
+    started_at = fields.DatetimeField(null=True)
+    finished_at = fields.DatetimeField(null=True)
+    updated_at = fields.DatetimeField(auto_now=True)
+
+    class Meta:
+        table = "crawl_states"
+
+
+class TelegramMessage(Model):
+    id = fields.IntField(pk=True)
+    adapter_id = fields.IntField(index=True)
+    message_id = fields.BigIntField()
+    # 列表中展示的文件名：消息ID_原文件名
+    name = fields.CharField(max_length=512, index=True)
+    filename = fields.CharField(max_length=255)
+    size = fields.BigIntField(default=0)
+    date = fields.BigIntField(default=0)
+    # document、video、audio 或 photo
+    media_type = fields.CharField(max_length=20)
+    mime_type = fields.CharField(max_length=255, null=True)
+
+    class Meta:
+        table = "telegram_messages"
+        unique_together = (("adapter_id", "message_id"),)
+
+
+class TelegramCatalogState(Model):
+    id = fields.IntField(pk=True)
+    adapter_id = fields.IntField(unique=True)
+    # 收录的频道；适配器改配到其他频道后目录重新收录
+    chat_id = fields.CharField(max_length=255, null=True)
+    # 已收录的最大消息ID，增量同步从这里向新消息方向继续（min_id）
+    max_id = fields.BigIntField(default=0)
+    # 回溯历史时已到达的最小消息ID，下次从这里向旧消息方向继续（offset_id）
+    oldest_id = fields.BigIntField(default=0)
+    history_done = fields.BooleanField(default=False)
+    synced_at = fields.DatetimeField(null=True)
+
+    class Meta:
+        table = "telegram_catalog_states"
+
+
+class OneDriveItem(Model):
+    id = fields.IntField(pk=True)
+    adapter_id = fields.IntField(index=True)
+    item_id = fields.CharField(max_length=255)
+    parent_id = fields.CharField(max_length=255, null=True, index=True)
+    name = fields.CharField(max_length=255)
+    is_dir = fields.BooleanField(default=False)
+    size = fields.BigIntField(default=0)
+    mtime = fields.BigIntField(default=0)
+    etag = fields.CharField(max_length=255, null=True)
+
+    class Meta:
+        table = "onedrive_items"
+        unique_together = (("adapter_id", "item_id"),)
+
+
+class OneDriveMirrorState(Model):
+    id = fields.IntField(pk=True)
+    adapter_id = fields.IntField(unique=True)
+    # 下一次 delta 请求的地址：全量枚举未完成时为 nextLink，完成后为 deltaLink
+    cursor = fields.TextField(null=True)
+    # 全量枚举已完成，列表与 stat 可直接由镜像提供
+    ready = fields.BooleanField(default=False)
+    synced_at = fields.DatetimeField(null=True)
+
+    class Meta:
+        table = "onedrive_mirror_states"
+
+
 class Log(Model):
     id = fields.IntField(pk=True)
     timestamp = fields.DatetimeField(auto_now_add=True)
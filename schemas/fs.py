@@ -21,6 +21,7 @@ class SearchResultItem(BaseModel):
     id: int | str
     path: str
     score: float
+    snippet: str | None = None
 
 
 class MkdirRequest(BaseModel):
@@ -30,3 +31,12 @@ class MkdirRequest(BaseModel):
 class MoveRequest(BaseModel):
     src: str
     dst: str
+
+
+class TransferRequest(BaseModel):
+    src: str
+    dst: str
+    operation: str = "copy"
+    overwrite: bool = False
+    verify: str = "size"
+    concurrency: int = 4
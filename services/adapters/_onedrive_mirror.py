@@ -0,0 +1,309 @@
+"""OneDrive 元数据镜像：经 Graph /delta 维护本地条目树（id/父目录/名称/大小/修改时间），
+列表、stat 与按路径查 id 直接查询数据库；增量同步发现的外部变更作为文件事件发出"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Tuple
+
+from tortoise import timezone
+
+from models.database import OneDriveItem, OneDriveMirrorState
+from services.events import file_event_bus
+
+logger = logging.getLogger(__name__)
+
+# 访问时触发增量同步的最短间隔（秒）
+SYNC_INTERVAL = 30.0
+# 后台轮询 delta 的默认间隔（秒），0 表示只在访问时同步
+DEFAULT_POLL_INTERVAL = 60
+DELTA_PAGE_SIZE = 999
+WALK_BATCH = 1000
+UPDATE_FIELDS = ["parent_id", "name", "is_dir", "size", "mtime", "etag"]
+
+
+def change_from_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    """把 Graph driveItem（delta 条目或普通响应）转换为统一的变更项"""
+    deleted = "deleted" in item
+    is_dir = "folder" in item or "root" in item
+    mtime = item.get("lastModifiedDateTime")
+    return {
+        "id": item["id"],
+        "parent_id": (item.get("parentReference") or {}).get("id"),
+        "name": item.get("name"),
+        "is_dir": is_dir,
+        "size": 0 if is_dir or deleted else item.get("size", 0),
+        "mtime": int(datetime.fromisoformat(mtime.replace("Z", "+00:00")).timestamp()) if mtime else 0,
+        # cTag 只随内容变化，元数据修改不会触发重新索引
+        "etag": item.get("cTag") or item.get("eTag"),
+        "deleted": deleted,
+    }
+
+
+def to_entry(row: OneDriveItem) -> Dict[str, Any]:
+    return {
+        "name": row.name,
+        "is_dir": row.is_dir,
+        "size": 0 if row.is_dir else row.size,
+        "mtime": row.mtime,
+        "type": "dir" if row.is_dir else "file",
+    }
+
+
+class OneDriveMirror:
+    """一个 OneDrive 适配器实例的条目镜像。全量枚举在后台按 nextLink 分页进行并记录断点，
+    完成前调用方回退到实时请求；完成后按 deltaLink 增量同步"""
+
+    def __init__(self, adapter, poll_interval: int = DEFAULT_POLL_INTERVAL):
+        self.adapter = adapter
+        self.adapter_id = adapter.record.id
+        self.mount = '/' + (adapter.record.path or '').strip('/')
+        self.poll_interval = poll_interval
+        self._lock = asyncio.Lock()
+        self._synced_at = 0.0
+        self._root_id: str | None = None
+        self._task: asyncio.Task | None = None
+
+    async def _state(self) -> OneDriveMirrorState:
+        state, _ = await OneDriveMirrorState.get_or_create(adapter_id=self.adapter_id)
+        return state
+
+    async def root_id(self) -> str:
+        if self._root_id is None:
+            self._root_id = await self.adapter.delta_root_id("")
+        return self._root_id
+
+    async def ready(self) -> bool:
+        return (await self._state()).ready
+
+    # ---- 同步 ----
+
+    async def _descendants(self, item_ids: List[str]) -> List[str]:
+        found = list(item_ids)
+        level = list(item_ids)
+        while level:
+            level = await OneDriveItem.filter(adapter_id=self.adapter_id, parent_id__in=level) \
+                .values_list("item_id", flat=True)
+            found.extend(level)
+        return found
+
+    async def _path_of(self, item_id: str, cache: Dict[str, str | None]) -> str | None:
+        """条目相对有效根目录的路径；不在有效根目录下时返回 None"""
+        root_id = await self.root_id()
+        chain = []
+        current = item_id
+        while current != root_id:
+            if current in cache:
+                base = cache[current]
+                break
+            row = await OneDriveItem.get_or_none(adapter_id=self.adapter_id, item_id=current)
+            if row is None or not row.parent_id:
+                base = None
+                break
+            chain.append((current, row.name))
+            current = row.parent_id
+        else:
+            base = ""
+        for cid, name in reversed(chain):
+            base = None if base is None else f"{base}/{name}" if base else name
+            cache[cid] = base
+        return base
+
+    async def _apply(self, changes: List[Dict[str, Any]], emit: bool):
+        """写入一页变更；emit 时对比写入前后的路径与内容标签，发出 file_written/file_deleted/file_moved"""
+        root_id = await self.root_id()
+        changes = [ch for ch in changes if ch["id"] != root_id]
+        if not changes:
+            return
+        ids = [ch["id"] for ch in changes]
+        existing = {
+            row.item_id: row
+            for row in await OneDriveItem.filter(adapter_id=self.adapter_id, item_id__in=ids)
+        }
+        before: Dict[str, str | None] = {}
+        if emit:
+            cache: Dict[str, str | None] = {}
+            for item_id in existing:
+                before[item_id] = await self._path_of(item_id, cache)
+
+        deleted = [ch["id"] for ch in changes if ch["deleted"]]
+        if deleted:
+            await OneDriveItem.filter(
+                adapter_id=self.adapter_id, item_id__in=await self._descendants(deleted)
+            ).delete()
+        rows = [
+            OneDriveItem(adapter_id=self.adapter_id, item_id=ch["id"], parent_id=ch["parent_id"], name=ch["name"],
+                         is_dir=ch["is_dir"], size=ch["size"], mtime=ch["mtime"], etag=ch["etag"])
+            for ch in changes if not ch["deleted"]
+        ]
+        if rows:
+            await OneDriveItem.bulk_create(rows, on_conflict=["adapter_id", "item_id"], update_fields=UPDATE_FIELDS)
+        if not emit:
+            return
+
+        cache = {}
+        events: List[Tuple[str, str, str | None]] = []
+        for ch in changes:
+            old_row = existing.get(ch["id"])
+            old = before.get(ch["id"])
+            if ch["deleted"]:
+                if old:
+                    events.append(("file_deleted", old, None))
+                continue
+            new = await self._path_of(ch["id"], cache)
+            if old and new and old != new:
+                events.append(("file_moved", new, old))
+            elif old and not new:
+                events.append(("file_deleted", old, None))
+            elif new and not ch["is_dir"] and (old is None or old_row.etag != ch["etag"]):
+                events.append(("file_written", new, None))
+        for event, rel, src in events:
+            await file_event_bus.emit(
+                event, self._mount_path(rel), src=self._mount_path(src) if src is not None else None,
+            )
+
+    def _mount_path(self, rel: str) -> str:
+        return self.mount.rstrip('/') + '/' + rel if rel else self.mount
+
+    async def _sync(self):
+        """从断点继续拉取 delta 直到拿到新的 deltaLink；每页写入后保存断点"""
+        async with self._lock:
+            state = await self._state()
+            while True:
+                if state.cursor:
+                    resp = await self.adapter._request("GET", full_url=state.cursor)
+                else:
+                    resp = await self.adapter._request("GET", api_path_segment="/delta",
+                                                       params={"$top": DELTA_PAGE_SIZE})
+                if resp.status_code == 410:
+                    # deltaLink 失效：重新全量枚举，期间回退到实时请求
+                    logger.warning("OneDrive delta token expired for adapter %s, re-enumerating", self.adapter_id)
+                    await OneDriveItem.filter(adapter_id=self.adapter_id).delete()
+                    state.cursor = None
+                    state.ready = False
+                    await state.save()
+                    continue
+                resp.raise_for_status()
+                data = resp.json()
+                await self._apply([change_from_item(item) for item in data.get("value", [])], emit=state.ready)
+                next_link = data.get("@odata.nextLink")
+                state.cursor = next_link or data.get("@odata.deltaLink")
+                if not next_link:
+                    state.ready = True
+                state.synced_at = timezone.now()
+                await state.save()
+                if not next_link:
+                    return
+
+    async def _run(self):
+        while True:
+            try:
+                await self._sync()
+                self._synced_at = time.monotonic()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("OneDrive mirror sync for adapter %s failed: %s", self.adapter_id, e)
+            if self.poll_interval <= 0:
+                return
+            await asyncio.sleep(self.poll_interval)
+
+    def _ensure_task(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def refresh(self, force: bool = False) -> bool:
+        """未完成全量枚举时在后台继续并返回 False；已完成时按间隔增量同步并返回 True"""
+        if not await self.ready():
+            self._ensure_task()
+            return False
+        if self.poll_interval > 0:
+            self._ensure_task()
+        if force or time.monotonic() - self._synced_at >= SYNC_INTERVAL:
+            self._synced_at = time.monotonic()
+            await self._sync()
+        return True
+
+    async def sync(self):
+        """同步到最新的 deltaLink 后返回；未完成的全量枚举从断点继续"""
+        await self._sync()
+        self._synced_at = time.monotonic()
+
+    def mark_stale(self):
+        """远端可能已有未经本实例记录的变更（如异步复制），下次访问时先同步"""
+        self._synced_at = 0.0
+
+    # ---- 查询与本地更新 ----
+
+    async def _resolve(self, rel: str) -> Tuple[str | None, OneDriveItem | None]:
+        """逐级按名称（不区分大小写）查找，返回 (item id, 条目)；根目录没有条目行"""
+        current = await self.root_id()
+        row = None
+        for name in [p for p in rel.strip('/').split('/') if p]:
+            row = await OneDriveItem.get_or_none(adapter_id=self.adapter_id, parent_id=current, name__iexact=name)
+            if row is None:
+                return None, None
+            current = row.item_id
+        return current, row
+
+    async def lookup(self, rel: str) -> OneDriveItem | None:
+        return (await self._resolve(rel))[1]
+
+    async def item_id(self, rel: str) -> str | None:
+        return (await self._resolve(rel))[0]
+
+    async def children(self, item_id: str) -> List[Dict[str, Any]]:
+        rows = await OneDriveItem.filter(adapter_id=self.adapter_id, parent_id=item_id)
+        return [to_entry(row) for row in rows]
+
+    async def put(self, item: Dict[str, Any]):
+        """记录经本实例写入的条目（上传、建目录、移动的响应），不发出事件"""
+        ch = change_from_item(item)
+        if ch["deleted"] or ch["id"] == await self.root_id():
+            return
+        await OneDriveItem.bulk_create([OneDriveItem(
+            adapter_id=self.adapter_id, item_id=ch["id"], parent_id=ch["parent_id"], name=ch["name"],
+            is_dir=ch["is_dir"], size=ch["size"], mtime=ch["mtime"], etag=ch["etag"],
+        )], on_conflict=["adapter_id", "item_id"], update_fields=UPDATE_FIELDS)
+
+    async def remove(self, item_id: str):
+        await OneDriveItem.filter(
+            adapter_id=self.adapter_id, item_id__in=await self._descendants([item_id])
+        ).delete()
+
+    async def walk(self, start_after: str | None = None) -> AsyncIterator[Dict[str, Any]]:
+        """按条目 id 顺序平铺列举镜像中有效根目录下的条目，marker 为条目 id"""
+        cache: Dict[str, str | None] = {}
+        after = start_after or ""
+        while True:
+            rows = await OneDriveItem.filter(adapter_id=self.adapter_id, item_id__gt=after) \
+                .order_by("item_id").limit(WALK_BATCH)
+            if not rows:
+                return
+            for row in rows:
+                path = await self._path_of(row.item_id, cache)
+                if path:
+                    yield {**to_entry(row), "path": path, "etag": row.etag, "remote_id": row.item_id,
+                           "marker": row.item_id}
+            after = rows[-1].item_id
+
+    async def status(self) -> Dict[str, Any]:
+        state = await self._state()
+        return {
+            "items": await OneDriveItem.filter(adapter_id=self.adapter_id).count(),
+            "ready": state.ready,
+            "syncing": self._task is not None and not self._task.done(),
+            "synced_at": state.synced_at.isoformat() if state.synced_at else None,
+        }
+
+    async def clear(self):
+        await self.aclose()
+        await OneDriveItem.filter(adapter_id=self.adapter_id).delete()
+        await OneDriveMirrorState.filter(adapter_id=self.adapter_id).delete()
+
+    async def aclose(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
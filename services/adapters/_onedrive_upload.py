@@ -0,0 +1,208 @@
+"""OneDrive 可续传上传：createUploadSession 会话按 320 KiB 对齐的分片顺序上传，
+读取下一分片与上传当前分片并行；单个分片失败时按服务端的 nextExpectedRanges 重试。
+调用方给出续传标识（目标、大小与源内容版本）时会话记录在本地，同一内容中断后重新上传时从最后确认的字节继续"""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Tuple
+
+import httpx
+
+# Graph 要求除最后一片外，分片大小为 320 KiB 的整数倍且不超过 60 MiB
+FRAGMENT_ALIGN = 320 * 1024
+DEFAULT_FRAGMENT_SIZE = 32 * FRAGMENT_ALIGN
+MAX_FRAGMENT_SIZE = 192 * FRAGMENT_ALIGN
+# 不超过该大小的文件直接 PUT :/content，无需会话
+SIMPLE_UPLOAD_LIMIT = 4 * 1024 * 1024
+FRAGMENT_RETRIES = 5
+RETRY_DELAY = 1.0
+SESSIONS_PATH = "data/db/onedrive_upload_sessions.json"
+
+CreateSession = Callable[[], Awaitable[Dict[str, Any]]]
+
+_sessions_lock = asyncio.Lock()
+
+
+class UploadSessionExpired(Exception):
+    pass
+
+
+def fragment_size_for(size_mb: Any) -> int:
+    """把配置的分片大小（MB）向下对齐到 320 KiB 的整数倍"""
+    try:
+        size = int(float(size_mb) * 1024 * 1024)
+    except (TypeError, ValueError):
+        return DEFAULT_FRAGMENT_SIZE
+    return max(FRAGMENT_ALIGN, min(MAX_FRAGMENT_SIZE, size // FRAGMENT_ALIGN * FRAGMENT_ALIGN))
+
+
+def _load_sessions() -> Dict[str, Dict[str, Any]]:
+    try:
+        with open(SESSIONS_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_sessions(sessions: Dict[str, Dict[str, Any]]):
+    os.makedirs(os.path.dirname(SESSIONS_PATH), exist_ok=True)
+    tmp = SESSIONS_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(sessions, f)
+    os.replace(tmp, SESSIONS_PATH)
+
+
+async def _get_saved(key: str) -> Dict[str, Any] | None:
+    async with _sessions_lock:
+        session = _load_sessions().get(key)
+    if not session:
+        return None
+    expires = session.get("expires")
+    if expires and datetime.fromisoformat(expires.replace("Z", "+00:00")) <= datetime.now(timezone.utc):
+        await _set_saved(key, None)
+        return None
+    return session
+
+
+async def _set_saved(key: str, session: Dict[str, Any] | None):
+    async with _sessions_lock:
+        sessions = _load_sessions()
+        if session is None:
+            sessions.pop(key, None)
+        else:
+            sessions[key] = session
+        await asyncio.to_thread(_write_sessions, sessions)
+
+
+def _next_expected(status: Dict[str, Any]) -> int | None:
+    ranges = status.get("nextExpectedRanges") or []
+    if not ranges:
+        return None
+    return int(str(ranges[0]).split("-", 1)[0])
+
+
+async def _query_offset(client: httpx.AsyncClient, url: str) -> int | None:
+    """查询会话状态，返回服务端期望的下一个字节；会话不存在或已过期时抛出 UploadSessionExpired"""
+    resp = await client.get(url)
+    if resp.status_code in (404, 410):
+        raise UploadSessionExpired(url)
+    resp.raise_for_status()
+    return _next_expected(resp.json())
+
+
+async def _fragments(data_iter: AsyncIterator[bytes], fragment_size: int) -> AsyncIterator[Tuple[int, bytes]]:
+    """把输入流切成 (起始偏移, 分片)"""
+    buf = bytearray()
+    offset = 0
+    async for chunk in data_iter:
+        if not chunk:
+            continue
+        buf.extend(chunk)
+        while len(buf) >= fragment_size:
+            yield offset, bytes(buf[:fragment_size])
+            offset += fragment_size
+            del buf[:fragment_size]
+    if buf:
+        yield offset, bytes(buf)
+
+
+async def upload(create_session: CreateSession, data_iter: AsyncIterator[bytes], total: int, key: str | None,
+                 fragment_size: int = DEFAULT_FRAGMENT_SIZE, stats: Dict[str, Any] | None = None,
+                 retry_delay: float = RETRY_DELAY) -> Dict[str, Any]:
+    """经上传会话写入 total 字节，返回创建的 driveItem。key 是续传标识，必须能区分内容不同的上传
+    （目标、大小加上源文件版本或内容摘要）；为 None 时不记录会话，中断后重新上传从头开始"""
+    stats = stats if stats is not None else {}
+    stats.setdefault("retries", 0)
+    stats.setdefault("resumed_from", 0)
+    agen = _fragments(data_iter, fragment_size)
+    fragment = await anext(agen, None)
+    # 上传地址自带鉴权，请求中不能带 Authorization 头
+    async with httpx.AsyncClient(timeout=120.0) as client:
+        session = await _get_saved(key) if key else None
+        skip = 0
+        if session:
+            try:
+                skip = await _query_offset(client, session["url"]) or 0
+                stats["resumed_from"] = skip
+            except UploadSessionExpired:
+                session = None
+        if not session:
+            created = await create_session()
+            session = {"url": created["uploadUrl"], "expires": created.get("expirationDateTime")}
+            if key:
+                await _set_saved(key, session)
+        url = session["url"]
+
+        async def put(start: int, data: bytes) -> Dict[str, Any] | None:
+            """上传一个分片，失败时查询服务端进度后只重传未确认的部分；返回完成时的 driveItem"""
+            end = start + len(data)
+            for attempt in range(FRAGMENT_RETRIES + 1):
+                try:
+                    resp = await client.put(url, content=data, headers={
+                        "Content-Length": str(len(data)),
+                        "Content-Range": f"bytes {start}-{end - 1}/{total}",
+                    })
+                    if resp.status_code in (200, 201):
+                        return resp.json()
+                    if resp.status_code == 202:
+                        return None
+                    if resp.status_code in (404, 410):
+                        raise UploadSessionExpired(url)
+                    if resp.status_code < 500 and resp.status_code not in (408, 416, 429):
+                        resp.raise_for_status()
+                    error = f"HTTP {resp.status_code}"
+                except (httpx.TransportError, httpx.TimeoutException) as e:
+                    error = str(e) or e.__class__.__name__
+                if attempt >= FRAGMENT_RETRIES:
+                    raise IOError(f"Upload fragment {start}-{end - 1} failed: {error}")
+                stats["retries"] += 1
+                await asyncio.sleep(retry_delay * 2 ** attempt)
+                try:
+                    expected = await _query_offset(client, url)
+                except httpx.HTTPError:
+                    continue
+                if expected is None or expected >= end:
+                    # 分片其实已被接收
+                    return None
+                if expected > start:
+                    data = data[expected - start:]
+                    start = expected
+                elif expected < start:
+                    raise IOError(f"Upload session expects byte {expected}, already past {start}")
+            return None
+
+        item = None
+        received = 0
+        pending = None
+        try:
+            while fragment is not None:
+                # 上传当前分片的同时读取下一分片
+                pending = asyncio.create_task(anext(agen, None))
+                start, data = fragment
+                if start + len(data) > total:
+                    raise IOError(f"Upload stream exceeds declared size {total}")
+                if start + len(data) > skip:
+                    # 服务端已确认的前 skip 个字节不再重传
+                    if start < skip:
+                        data = data[skip - start:]
+                        start = skip
+                    item = await put(start, data)
+                    stats["fragments"] = stats.get("fragments", 0) + 1
+                received = start + len(data)
+                fragment = await pending
+        except UploadSessionExpired:
+            if key:
+                await _set_saved(key, None)
+            raise
+        finally:
+            if pending is not None and not pending.done():
+                pending.cancel()
+                await asyncio.gather(pending, return_exceptions=True)
+        if received != total or item is None:
+            raise IOError(f"Upload incomplete: sent {received} of {total} bytes")
+        if key:
+            await _set_saved(key, None)
+        return item
@@ -0,0 +1,136 @@
+"""S3 前缀级批量操作：流式列举 key，并发分批删除，大对象分块服务端复制，目录并发复制"""
+from __future__ import annotations
+
+import asyncio
+from typing import AsyncIterator, Callable, Dict, List, Tuple
+
+# delete_objects 单次请求的 key 数上限
+DELETE_BATCH = 1000
+# copy_object 单次复制的对象大小上限，超过后改用 upload_part_copy
+MAX_COPY_OBJECT_SIZE = 5 * 1024 * 1024 * 1024
+COPY_PART_SIZE = 512 * 1024 * 1024
+MAX_PARTS = 10000
+DEFAULT_CONCURRENCY = 8
+
+Progress = Callable[[int, int], None]
+
+
+async def iter_objects(s3, bucket: str, prefix: str) -> AsyncIterator[Tuple[str, int]]:
+    """逐页产出 prefix 下全部对象的 (key, size)，不在内存中累积整棵目录"""
+    paginator = s3.get_paginator("list_objects_v2")
+    async for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for content in page.get("Contents", []):
+            yield content["Key"], content.get("Size", 0)
+
+
+async def delete_prefix(s3, bucket: str, prefix: str, concurrency: int = DEFAULT_CONCURRENCY,
+                        progress: Progress | None = None) -> int:
+    """边列举边按 1000 个 key 一批并发 delete_objects；返回删除的对象数，有 key 删除失败时抛出 IOError"""
+    slots = asyncio.Semaphore(max(1, concurrency))
+    tasks: List[asyncio.Task] = []
+    deleted = 0
+
+    async def send(batch: List[Dict[str, str]]):
+        nonlocal deleted
+        try:
+            resp = await s3.delete_objects(Bucket=bucket, Delete={"Objects": batch, "Quiet": True})
+        finally:
+            slots.release()
+        errors = resp.get("Errors") or []
+        if errors:
+            first = errors[0]
+            raise IOError(f"Failed to delete {len(errors)} objects, e.g. {first.get('Key')}: {first.get('Message')}")
+        deleted += len(batch)
+        if progress:
+            progress(deleted, 0)
+
+    batch: List[Dict[str, str]] = []
+    try:
+        async for key, _ in iter_objects(s3, bucket, prefix):
+            batch.append({"Key": key})
+            if len(batch) >= DELETE_BATCH:
+                await slots.acquire()
+                tasks.append(asyncio.create_task(send(batch)))
+                batch = []
+        if batch:
+            await slots.acquire()
+            tasks.append(asyncio.create_task(send(batch)))
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    return deleted
+
+
+async def copy_object(s3, bucket: str, src_key: str, dst_key: str, size: int,
+                      concurrency: int = DEFAULT_CONCURRENCY):
+    """服务端复制单个对象；超过 5 GB 时按字节范围并发 upload_part_copy"""
+    if size <= MAX_COPY_OBJECT_SIZE:
+        await s3.copy_object(CopySource={"Bucket": bucket, "Key": src_key}, Bucket=bucket, Key=dst_key)
+        return
+    part_size = max(COPY_PART_SIZE, -(-size // MAX_PARTS))
+    mpu = await s3.create_multipart_upload(Bucket=bucket, Key=dst_key)
+    upload_id = mpu["UploadId"]
+    slots = asyncio.Semaphore(max(1, concurrency))
+
+    async def copy_part(number: int, start: int) -> Dict[str, object]:
+        end = min(start + part_size, size) - 1
+        async with slots:
+            resp = await s3.upload_part_copy(
+                Bucket=bucket, Key=dst_key, UploadId=upload_id, PartNumber=number,
+                CopySource={"Bucket": bucket, "Key": src_key}, CopySourceRange=f"bytes={start}-{end}",
+            )
+        return {"PartNumber": number, "ETag": resp["CopyPartResult"]["ETag"]}
+
+    try:
+        parts = await asyncio.gather(*(
+            copy_part(i + 1, start) for i, start in enumerate(range(0, size, part_size))
+        ))
+        await s3.complete_multipart_upload(
+            Bucket=bucket, Key=dst_key, UploadId=upload_id, MultipartUpload={"Parts": list(parts)},
+        )
+    except BaseException:
+        await s3.abort_multipart_upload(Bucket=bucket, Key=dst_key, UploadId=upload_id)
+        raise
+
+
+async def copy_prefix(s3, bucket: str, src_prefix: str, dst_prefix: str, concurrency: int = DEFAULT_CONCURRENCY,
+                      progress: Progress | None = None) -> Tuple[int, int]:
+    """把 src_prefix 下的全部对象并发复制到 dst_prefix；列举与复制同时进行，返回 (对象数, 字节数)"""
+    if dst_prefix.startswith(src_prefix):
+        # 边列举边写入会把新复制的对象再次列出，移动时随后的删除还会连同副本一起删掉
+        raise ValueError("Destination is inside source")
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, concurrency) * 4)
+    totals = {"objects": 0, "bytes": 0}
+
+    async def worker():
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            key, size = item
+            await copy_object(s3, bucket, key, dst_prefix + key[len(src_prefix):], size)
+            totals["objects"] += 1
+            totals["bytes"] += size
+            if progress:
+                progress(totals["objects"], totals["bytes"])
+
+    async def produce():
+        async for key, size in iter_objects(s3, bucket, src_prefix):
+            await queue.put((key, size))
+        for _ in range(workers):
+            await queue.put(None)
+
+    workers = max(1, concurrency)
+    # 任一复制失败时 gather 立即返回，取消列举与其余复制
+    tasks = [asyncio.create_task(produce())] + [asyncio.create_task(worker()) for _ in range(workers)]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    return totals["objects"], totals["bytes"]
@@ -0,0 +1,284 @@
+"""Telegram 频道媒体消息的本地目录：按 min_id 增量收录新消息、按 offset_id 在后台回溯全部历史，
+并定期按ID核对已收录的消息以清除在 Foxel 之外删除的消息；列表、stat 与搜索直接查询数据库"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Any, AsyncIterator, Dict, List, Tuple
+
+from tortoise import timezone
+
+from models.database import TelegramCatalogState, TelegramMessage
+
+logger = logging.getLogger(__name__)
+
+# 单次 get_messages 取回的消息数
+FETCH_BATCH = 100
+# list_dir 触发增量同步的最短间隔（秒）
+SYNC_INTERVAL = 30.0
+# 核对已收录消息是否仍存在的间隔（秒）；增量同步只看新消息，发现不了别处的删除
+RECONCILE_INTERVAL = 6 * 3600.0
+SORT_FIELDS = {"name": "name", "size": "size", "mtime": "date"}
+
+
+def entry_from_message(message) -> Dict[str, Any] | None:
+    """从消息中提取文件信息；不含文件的消息返回 None"""
+    photo = getattr(message, "photo", None)
+    document = getattr(message, "document", None) or getattr(message, "video", None)
+    if not (photo or document):
+        return None
+    filename = None
+    mime_type = None
+    if photo:
+        photo_size = photo.sizes[-1]
+        size = photo_size.size if hasattr(photo_size, 'size') else 0
+        filename = f"photo_{message.id}.jpg"
+        media_type = "photo"
+        mime_type = "image/jpeg"
+    else:
+        size = document.size
+        mime_type = getattr(document, "mime_type", None)
+        for attr in getattr(document, "attributes", None) or []:
+            if getattr(attr, "file_name", None):
+                filename = attr.file_name
+                break
+        if getattr(message, "video", None) or (mime_type or "").startswith("video/"):
+            media_type = "video"
+        elif (mime_type or "").startswith("audio/"):
+            media_type = "audio"
+        else:
+            media_type = "document"
+    text = getattr(message, "text", None)
+    if not filename and text and '.' in text and len(text) < 256 and '\n' not in text:
+        filename = text
+    if not filename:
+        filename = f"unknown_{message.id}"
+    return {
+        "message_id": message.id,
+        "name": f"{message.id}_{filename}",
+        "filename": filename,
+        "size": size or 0,
+        "date": int(message.date.timestamp()) if message.date else 0,
+        "media_type": media_type,
+        "mime_type": mime_type,
+    }
+
+
+def to_entry(row: TelegramMessage) -> Dict[str, Any]:
+    return {"name": row.name, "is_dir": False, "size": row.size, "mtime": row.date, "type": "file"}
+
+
+class TelegramCatalog:
+    """一个 Telegram 适配器实例的消息目录；消息读取经适配器的共享客户端（含限流重试）"""
+
+    def __init__(self, adapter):
+        self.adapter = adapter
+        self.adapter_id = adapter.record.id
+        self._lock = asyncio.Lock()
+        self._synced_at = 0.0
+        self._backfill: asyncio.Task | None = None
+        self._reconciled_at = 0.0
+        self._reconcile: asyncio.Task | None = None
+
+    async def _state(self) -> TelegramCatalogState:
+        state, _ = await TelegramCatalogState.get_or_create(adapter_id=self.adapter_id)
+        chat_id = str(self.adapter.chat_id)
+        if state.chat_id != chat_id:
+            await TelegramMessage.filter(adapter_id=self.adapter_id).delete()
+            state.chat_id = chat_id
+            state.max_id = state.oldest_id = 0
+            state.history_done = False
+            await state.save()
+        return state
+
+    async def _fetch(self, **kwargs) -> List[Any]:
+        chat_id = self.adapter.chat_id
+        return list(await self.adapter._call(lambda c: c.get_messages(chat_id, limit=FETCH_BATCH, **kwargs)))
+
+    async def _save(self, messages: List[Any]):
+        rows = []
+        for message in messages:
+            entry = entry_from_message(message)
+            if entry:
+                rows.append(TelegramMessage(adapter_id=self.adapter_id, **entry))
+        if rows:
+            await TelegramMessage.bulk_create(
+                rows, on_conflict=["adapter_id", "message_id"],
+                update_fields=["name", "filename", "size", "date", "media_type", "mime_type"],
+            )
+
+    async def _backfill_batch(self) -> bool:
+        """向旧消息方向取一批；返回历史是否已全部收录"""
+        async with self._lock:
+            state = await self._state()
+            if state.history_done:
+                return True
+            messages = await self._fetch(offset_id=state.oldest_id)
+            await self._save(messages)
+            ids = [m.id for m in messages]
+            if ids:
+                state.oldest_id = min(ids)
+                state.max_id = max(state.max_id, max(ids))
+            else:
+                state.history_done = True
+            state.synced_at = timezone.now()
+            await state.save()
+            return state.history_done
+
+    async def _sync_new(self):
+        """从已收录的最大ID向新消息方向增量收录"""
+        async with self._lock:
+            state = await self._state()
+            if not state.max_id:
+                # 尚未收录任何消息（如首次回溯时频道为空）：取最新一批，更早的部分交给后台回溯
+                messages = await self._fetch()
+                if messages:
+                    await self._save(messages)
+                    ids = [m.id for m in messages]
+                    state.max_id = max(ids)
+                    state.oldest_id = min(ids)
+                    state.history_done = len(messages) < FETCH_BATCH
+                    state.synced_at = timezone.now()
+                    await state.save()
+                return
+            while True:
+                messages = await self._fetch(min_id=state.max_id, reverse=True)
+                if not messages:
+                    break
+                await self._save(messages)
+                state.max_id = max(state.max_id, max(m.id for m in messages))
+                await state.save()
+                if len(messages) < FETCH_BATCH:
+                    break
+
+    async def _run_backfill(self):
+        try:
+            while not await self._backfill_batch():
+                pass
+            logger.info("Telegram catalog for adapter %s has full history", self.adapter_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Telegram catalog backfill for adapter %s stopped: %s", self.adapter_id, e)
+
+    async def _reconcile_all(self) -> int:
+        """按消息ID逐批向频道核对已收录的消息，删除已不存在或不再含文件的；返回删除数"""
+        chat_id = self.adapter.chat_id
+        after = 0
+        removed = 0
+        while True:
+            ids = await TelegramMessage.filter(adapter_id=self.adapter_id, message_id__gt=after) \
+                .order_by("message_id").limit(FETCH_BATCH).values_list("message_id", flat=True)
+            if not ids:
+                return removed
+            ids = list(ids)
+            # 按ID取消息时结果与 ids 一一对应，不存在的消息为 None
+            messages = await self.adapter._call(lambda c: c.get_messages(chat_id, ids=ids))
+            gone = [mid for mid, m in zip(ids, messages) if m is None or entry_from_message(m) is None]
+            if gone:
+                await TelegramMessage.filter(adapter_id=self.adapter_id, message_id__in=gone).delete()
+                removed += len(gone)
+            after = ids[-1]
+
+    async def _run_reconcile(self):
+        try:
+            removed = await self._reconcile_all()
+            if removed:
+                logger.info("Telegram catalog for adapter %s dropped %s deleted messages", self.adapter_id, removed)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # 下次 refresh 到期后再试
+            self._reconciled_at = 0.0
+            logger.warning("Telegram catalog reconcile for adapter %s stopped: %s", self.adapter_id, e)
+
+    async def refresh(self, force: bool = False):
+        """收录新消息，并在后台继续回溯历史、定期核对删除；首次使用时先同步取回最新一批"""
+        if not force and time.monotonic() - self._synced_at < SYNC_INTERVAL:
+            return
+        self._synced_at = time.monotonic()
+        state = await self._state()
+        if not state.max_id and not state.history_done:
+            await self._backfill_batch()
+        else:
+            await self._sync_new()
+        if not (await self._state()).history_done and (self._backfill is None or self._backfill.done()):
+            self._backfill = asyncio.create_task(self._run_backfill())
+        if time.monotonic() - self._reconciled_at >= RECONCILE_INTERVAL and (
+                self._reconcile is None or self._reconcile.done()):
+            self._reconciled_at = time.monotonic()
+            self._reconcile = asyncio.create_task(self._run_reconcile())
+
+    async def list(self, page_num: int, page_size: int, sort_by: str = "name",
+                   sort_order: str = "asc") -> Tuple[List[Dict[str, Any]], int]:
+        field = SORT_FIELDS.get(sort_by.lower(), "name")
+        prefix = "-" if sort_order.lower() == "desc" else ""
+        query = TelegramMessage.filter(adapter_id=self.adapter_id)
+        total = await query.count()
+        rows = await query.order_by(prefix + field, prefix + "message_id") \
+            .offset(max(page_num - 1, 0) * page_size).limit(page_size)
+        return [to_entry(row) for row in rows], total
+
+    async def search(self, q: str, page_num: int = 1, page_size: int = 50) -> Tuple[List[Dict[str, Any]], int]:
+        """按文件名子串搜索，新消息在前"""
+        query = TelegramMessage.filter(adapter_id=self.adapter_id, filename__icontains=q.strip())
+        total = await query.count()
+        rows = await query.order_by("-date", "-message_id") \
+            .offset(max(page_num - 1, 0) * page_size).limit(page_size)
+        return [to_entry(row) for row in rows], total
+
+    async def clear(self):
+        """删除该适配器的目录与同步进度"""
+        await self.aclose()
+        await TelegramMessage.filter(adapter_id=self.adapter_id).delete()
+        await TelegramCatalogState.filter(adapter_id=self.adapter_id).delete()
+
+    async def get(self, message_id: int) -> TelegramMessage | None:
+        return await TelegramMessage.get_or_none(adapter_id=self.adapter_id, message_id=message_id)
+
+    async def add(self, message):
+        """收录适配器写入或读到的消息；比已收录的最大ID新时接着增量同步到它，
+        max_id 随之前进，又不会跳过其他客户端在此之前发到频道的消息"""
+        await self._save([message])
+        if message.id <= (await self._state()).max_id:
+            return
+        try:
+            await self._sync_new()
+            self._synced_at = time.monotonic()
+        except Exception as e:
+            logger.warning("Telegram catalog sync for adapter %s failed: %s", self.adapter_id, e)
+
+    async def remove(self, message_id: int):
+        await TelegramMessage.filter(adapter_id=self.adapter_id, message_id=message_id).delete()
+
+    async def walk(self, start_after: str | None = None) -> AsyncIterator[Dict[str, Any]]:
+        """按消息ID顺序平铺列举已收录的文件，marker 为消息ID"""
+        await self.refresh()
+        after = int(start_after) if start_after else 0
+        while True:
+            rows = await TelegramMessage.filter(adapter_id=self.adapter_id, message_id__gt=after) \
+                .order_by("message_id").limit(FETCH_BATCH * 5)
+            if not rows:
+                return
+            for row in rows:
+                yield {**to_entry(row), "path": row.name, "marker": str(row.message_id)}
+            after = rows[-1].message_id
+
+    async def status(self) -> Dict[str, Any]:
+        state = await self._state()
+        return {
+            "messages": await TelegramMessage.filter(adapter_id=self.adapter_id).count(),
+            "max_id": state.max_id,
+            "oldest_id": state.oldest_id,
+            "history_done": state.history_done,
+            "backfilling": self._backfill is not None and not self._backfill.done(),
+            "reconciling": self._reconcile is not None and not self._reconcile.done(),
+            "synced_at": state.synced_at.isoformat() if state.synced_at else None,
+        }
+
+    async def aclose(self):
+        for task in (self._backfill, self._reconcile):
+            if task and not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
@@ -6,6 +6,18 @@ from models import StorageAdapter
 # ADAPTER_TYPE: str
 # CONFIG_SCHEMA: List[Dict]
 # ADAPTER_FACTORY: Callable[[StorageAdapter], BaseAdapter] (可省略, 会自动寻找 *Adapter 类)
+#
+# 可选的遍历接口（供 services.crawler 增量遍历使用）:
+# async def walk_files(self, root, start_after: str | None = None) -> AsyncIterator[Dict]
+#     按 key 顺序平铺列举根下全部条目，每项含 path(相对路径)/is_dir/size/mtime/etag/marker，
+#     start_after 传入上次的 marker 续传
+# emits_changes: bool
+#     为 True 时适配器自身（如 OneDrive delta 镜像）把外部变更作为文件事件发出，遍历只维护快照
+#
+# 可选的搜索接口（适配器自带本地目录时，按挂载点搜索文件名直接查询该目录）:
+# async def search(self, root, q: str, page_num: int = 1, page_size: int = 50) -> Tuple[List[Dict], int]
+#     返回当前页条目（name 为相对挂载点的路径）与总数
+
 
 @runtime_checkable
 class BaseAdapter(Protocol):
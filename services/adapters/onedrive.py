@@ -1,10 +1,16 @@
 from __future__ import annotations
+import asyncio
+import hashlib
 from datetime import datetime, timezone, timedelta
 from typing import List, Dict, Tuple, AsyncIterator
 import httpx
 from fastapi.responses import StreamingResponse
 from fastapi import HTTPException
 from models import StorageAdapter
+from services.block_cache import block_cache
+from services.adapters import _onedrive_upload as upload_session
+from services.adapters._onedrive_mirror import OneDriveMirror, to_entry, DEFAULT_POLL_INTERVAL
+from services.processors._streaming import new_spool, iter_file
 
 MS_GRAPH_URL = "https://graph.microsoft.com/v1.0"
 MS_OAUTH_URL = "https://login.microsoftonline.com/common/oauth2/v2.0/token"
@@ -13,6 +19,9 @@ MS_OAUTH_URL = "https://login.microsoftonline.com/common/oauth2/v2.0/token"
 class OneDriveAdapter:
     """OneDrive 存储适配器"""
 
+    # 外部变更由 delta 镜像发出文件事件，遍历服务只维护快照
+    emits_changes = True
+
     def __init__(self, record: StorageAdapter):
         self.record = record
         cfg = record.config
@@ -20,6 +29,7 @@ class OneDriveAdapter:
         self.client_secret = cfg.get("client_secret")
         self.refresh_token = cfg.get("refresh_token")
         self.root = cfg.get("root", "/").strip("/")
+        self.fragment_size = upload_session.fragment_size_for(cfg.get("chunk_size_mb", 10))
 
         if not all([self.client_id, self.client_secret, self.refresh_token]):
             raise ValueError(
@@ -27,6 +37,14 @@ class OneDriveAdapter:
 
         self._access_token: str | None = None
         self._token_expiry: datetime | None = None
+        try:
+            poll_interval = int(cfg.get("delta_poll_interval", DEFAULT_POLL_INTERVAL))
+        except (TypeError, ValueError):
+            poll_interval = DEFAULT_POLL_INTERVAL
+        self.mirror = OneDriveMirror(self, poll_interval)
+
+    async def aclose(self):
+        await self.mirror.aclose()
 
     def get_effective_root(self, sub_path: str | None) -> str:
         """
@@ -118,6 +136,7 @@ class OneDriveAdapter:
         """
         列出目录内容。
         由于 Graph API 不支持基于偏移($skip)的分页，此方法将获取所有项目，
+        delta 镜像完成全量枚举后直接由本地条目树提供，不再请求 Graph。
         :param root: 根路径 (在此适配器中未使用，通过配置的 root 确定)。
         :param rel: 相对路径。
         :param page_num: 页码。
@@ -126,6 +145,11 @@ class OneDriveAdapter:
         :param sort_order: 排序顺序
         :return: 文件/目录列表和总数。
         """
+        if await self.mirror.refresh():
+            dir_id = await self.mirror.item_id(rel)
+            if dir_id is not None:
+                return self._sort_page(await self.mirror.children(dir_id), page_num, page_size, sort_by, sort_order)
+
         api_path = self._get_api_path(rel)
         children_path = f"{api_path}:/children" if api_path else "/children"
         all_items = []
@@ -151,7 +175,11 @@ class OneDriveAdapter:
             resp = await self._request("GET", full_url=next_link)
 
         formatted_items = [self._format_item(item) for item in all_items]
-        
+        return self._sort_page(formatted_items, page_num, page_size, sort_by, sort_order)
+
+    @staticmethod
+    def _sort_page(formatted_items: List[Dict], page_num: int, page_size: int, sort_by: str,
+                   sort_order: str) -> Tuple[List[Dict], int]:
         # 排序
         reverse = sort_order.lower() == "desc"
         def get_sort_key(item):
@@ -174,6 +202,27 @@ class OneDriveAdapter:
 
         return formatted_items[start_idx:end_idx], total_count
 
+    async def delta_root_id(self, root: str) -> str:
+        """
+        获取有效根目录的 item id。
+        :param root: 根路径。
+        :return: item id。
+        """
+        resp = await self._request("GET", api_path_segment=self._get_api_path(""), params={"$select": "id"})
+        resp.raise_for_status()
+        return resp.json()["id"]
+
+    async def walk_files(self, root: str, start_after: str | None = None) -> AsyncIterator[Dict]:
+        """
+        供遍历服务列举全部条目：先把 delta 镜像同步到最新（全量枚举按 nextLink 分页并逐页记录断点），
+        再按条目 id 顺序读取本地条目树。
+        :param root: 根路径 (在此适配器中未使用，通过配置的 root 确定)。
+        :param start_after: 上次处理到的条目 id。
+        """
+        await self.mirror.sync()
+        async for entry in self.mirror.walk(start_after):
+            yield entry
+
     async def read_file(self, root: str, rel: str) -> bytes:
         """
         读取文件内容。
@@ -201,24 +250,83 @@ class OneDriveAdapter:
         api_path = self._get_api_path(rel)
         if not api_path:
             raise ValueError("不能直接写入根路径")
+        if len(data) > upload_session.SIMPLE_UPLOAD_LIMIT:
+            async def gen():
+                yield data
+            await self._upload_large(api_path, gen(), len(data), hashlib.sha256(data).hexdigest())
+            return
         resp = await self._request("PUT", api_path_segment=f"{api_path}:/content", content=data)
         resp.raise_for_status()
+        await self.mirror.put(resp.json())
+
+    async def _upload_large(self, api_path: str, data_iter: AsyncIterator[bytes], size: int,
+                            version: str | None = None) -> Dict:
+        """经上传会话分片写入。给出 version（源文件版本或内容摘要）时，中断后再次上传同一路径、
+        同样大小且 version 相同的内容从已确认的字节继续；没有 version 无法确认内容相同，每次都新建会话"""
+        async def create_session() -> Dict:
+            resp = await self._request(
+                "POST", api_path_segment=f"{api_path}:/createUploadSession",
+                json={"item": {"@microsoft.graph.conflictBehavior": "replace"}},
+            )
+            resp.raise_for_status()
+            return resp.json()
+
+        key = f"{self.record.id}|{api_path}|{size}|{version}" if version else None
+        item = await upload_session.upload(create_session, data_iter, size, key, self.fragment_size)
+        await self.mirror.put(item)
+        return item
 
-    async def write_file_stream(self, root: str, rel: str, data_iter: AsyncIterator[bytes]):
+    async def write_file_stream(self, root: str, rel: str, data_iter: AsyncIterator[bytes],
+                                size_hint: int | None = None, version: str | None = None):
         """
         以流式方式写入文件。
         :param root: 根路径。
         :param rel: 相对路径。
         :param data_iter: 文件内容的异步迭代器。
+        :param size_hint: 已知的文件大小；未知时先读入临时文件以得到上传会话所需的总大小。
+        :param version: 源内容的版本标识，用于中断后续传；读入临时文件时改用整个内容的摘要。
         :return: 文件大小。
         """
         api_path = self._get_api_path(rel)
         if not api_path:
             raise ValueError("不能直接写入根路径")
 
-        resp = await self._request("PUT", api_path_segment=f"{api_path}:/content", content=data_iter)
-        resp.raise_for_status()
-        return resp.json().get("size", 0)
+        if size_hint is None:
+            head = bytearray()
+            spooled = None
+            digest = hashlib.sha256()
+            try:
+                async for chunk in data_iter:
+                    digest.update(chunk)
+                    if spooled is not None:
+                        await asyncio.to_thread(spooled.write, chunk)
+                        continue
+                    head.extend(chunk)
+                    if len(head) > upload_session.SIMPLE_UPLOAD_LIMIT:
+                        spooled = new_spool()
+                        await asyncio.to_thread(spooled.write, bytes(head))
+            except BaseException:
+                if spooled is not None:
+                    spooled.close()
+                raise
+            if spooled is None:
+                data = bytes(head)
+                resp = await self._request("PUT", api_path_segment=f"{api_path}:/content", content=data)
+                resp.raise_for_status()
+                await self.mirror.put(resp.json())
+                return len(data)
+            size_hint = spooled.tell()
+            data_iter = iter_file(spooled)
+            version = digest.hexdigest()
+        elif size_hint <= upload_session.SIMPLE_UPLOAD_LIMIT:
+            resp = await self._request("PUT", api_path_segment=f"{api_path}:/content", content=data_iter)
+            resp.raise_for_status()
+            item = resp.json()
+            await self.mirror.put(item)
+            return item.get("size", 0)
+
+        item = await self._upload_large(api_path, data_iter, size_hint, version)
+        return item.get("size", size_hint)
 
     async def mkdir(self, root: str, rel: str):
         """
@@ -239,6 +347,7 @@ class OneDriveAdapter:
         }
         resp = await self._request("POST", api_path_segment=children_path, json=payload)
         resp.raise_for_status()
+        await self.mirror.put(resp.json())
 
     async def delete(self, root: str, rel: str):
         """
@@ -253,6 +362,25 @@ class OneDriveAdapter:
         resp = await self._request("DELETE", api_path_segment=api_path)
         if resp.status_code not in (204, 404):
             resp.raise_for_status()
+        row = await self.mirror.lookup(rel)
+        if row:
+            await self.mirror.remove(row.item_id)
+
+    async def _item_id(self, rel: str) -> str:
+        """
+        获取路径对应的 item id，镜像就绪时直接查本地条目树。
+        :param rel: 相对路径。
+        :return: item id。
+        """
+        if await self.mirror.ready():
+            item_id = await self.mirror.item_id(rel)
+            if item_id is not None:
+                return item_id
+        resp = await self._request("GET", api_path_segment=self._get_api_path(rel), params={"$select": "id"})
+        if resp.status_code == 404:
+            raise FileNotFoundError(rel)
+        resp.raise_for_status()
+        return resp.json()["id"]
 
     async def move(self, root: str, src_rel: str, dst_rel: str):
         """
@@ -267,12 +395,8 @@ class OneDriveAdapter:
 
         dst_parent_rel, dst_name = dst_rel.rstrip(
             '/').rsplit('/', 1) if '/' in dst_rel.rstrip('/') else ('', dst_rel)
-        dst_parent_api_path = self._get_api_path(dst_parent_rel)
 
-        # 获取父项目的 ID
-        parent_resp = await self._request("GET", api_path_segment=dst_parent_api_path)
-        parent_resp.raise_for_status()
-        parent_id = parent_resp.json()["id"]
+        parent_id = await self._item_id(dst_parent_rel)
 
         payload = {
             "parentReference": {"id": parent_id},
@@ -280,6 +404,7 @@ class OneDriveAdapter:
         }
         resp = await self._request("PATCH", api_path_segment=src_api_path, json=payload)
         resp.raise_for_status()
+        await self.mirror.put(resp.json())
 
     async def rename(self, root: str, src_rel: str, dst_rel: str):
         """
@@ -302,16 +427,15 @@ class OneDriveAdapter:
 
         dst_parent_rel, dst_name = dst_rel.rstrip(
             '/').rsplit('/', 1) if '/' in dst_rel.rstrip('/') else ('', dst_rel)
-        dst_parent_api_path = self._get_api_path(dst_parent_rel)
 
-        parent_resp = await self._request("GET", api_path_segment=dst_parent_api_path)
-        parent_resp.raise_for_status()
-        parent_id = parent_resp.json()["id"]
+        parent_id = await self._item_id(dst_parent_rel)
 
         payload = {"parentReference": {"id": parent_id}, "name": dst_name}
         copy_path = f"{src_api_path}:/copy"
         resp = await self._request("POST", api_path_segment=copy_path, json=payload)
         resp.raise_for_status()
+        # 复制在服务端异步完成，结果由下次 delta 同步收录
+        self.mirror.mark_stale()
 
     async def stream_file(self, root: str, rel: str, range_header: str | None):
         """
@@ -369,8 +493,24 @@ class OneDriveAdapter:
         else:
             headers["Content-Length"] = str(file_size)
 
+        version = item_data.get("eTag") or item_data.get("cTag")
+
+        async def fetch_block(block_start: int, block_end: int) -> bytes:
+            async with httpx.AsyncClient(timeout=60.0) as client:
+                block_resp = await client.get(download_url, headers={'Range': f'bytes={block_start}-{block_end}'})
+                if block_resp.status_code == 404:
+                    raise FileNotFoundError(rel)
+                block_resp.raise_for_status()
+                return block_resp.content
+
         async def file_iterator():
             nonlocal start, end
+            if block_cache.wants(range_header) and version and file_size > 0:
+                # 播放器反复探测的范围（moov、尾部索引）由本地块缓存提供
+                key = block_cache.make_key(self.record.id, rel, version)
+                async for chunk in block_cache.iter_range(key, file_size, start, end, fetch_block):
+                    yield chunk
+                return
             async with httpx.AsyncClient(timeout=60.0) as client:
                 req_headers = {'Range': f'bytes={start}-{end}'}
                 async with client.stream("GET", download_url, headers=req_headers) as stream_resp:
@@ -416,12 +556,20 @@ class OneDriveAdapter:
         :param rel: 相对路径。
         :return: 格式化后的文件/目录信息。
         """
+        if await self.mirror.refresh():
+            row = await self.mirror.lookup(rel)
+            if row is not None:
+                return to_entry(row)
         api_path = self._get_api_path(rel)
         resp = await self._request("GET", api_path_segment=api_path)
         if resp.status_code == 404:
             raise FileNotFoundError(rel)
         resp.raise_for_status()
-        return self._format_item(resp.json())
+        item = resp.json()
+        if api_path:
+            # 镜像尚未同步到的条目（如刚由其他客户端创建）
+            await self.mirror.put(item)
+        return self._format_item(item)
 
 
 ADAPTER_TYPE = "OneDrive"
@@ -434,6 +582,10 @@ CONFIG_SCHEMA = [
         "required": True, "help_text": "可以通过运行 'python -m services.adapters.onedrive' 获取"},
     {"key": "root", "label": "根目录 (Root Path)", "type": "string",
      "required": False, "placeholder": "默认为根目录 /"},
+    {"key": "chunk_size_mb", "label": "上传分片大小 (MB)", "type": "number", "required": False, "default": 10,
+     "help_text": "超过 4MB 的文件经上传会话分片上传，分片按 320KB 对齐，最大 60MB"},
+    {"key": "delta_poll_interval", "label": "变更轮询间隔 (秒)", "type": "number", "required": False, "default": 60,
+     "help_text": "后台经 delta 同步元数据镜像并发出变更事件的间隔，0 表示只在浏览时同步"},
 ]
 
 
@@ -12,6 +12,7 @@ from fastapi import HTTPException
 from fastapi.responses import StreamingResponse
 
 from models import StorageAdapter
+from services.block_cache import block_cache
 from .base import BaseAdapter
 
 
@@ -321,10 +322,12 @@ class QuarkAdapter:
         if not it or it["is_dir"]:
             raise FileNotFoundError(rel)
         url = await self._get_download_url(it["fid"])
+        transcoded = False
         if self.use_transcoding_address and self._is_video_name(name):
             tr = await self._get_transcoding_url(it["fid"]) 
             if tr:
                 url = tr
+                transcoded = True
         dl_headers = self._download_headers()
 
         # 预获取大小/是否支持范围
@@ -369,7 +372,28 @@ class QuarkAdapter:
         elif total_size is not None:
             resp_headers["Content-Length"] = str(total_size)
 
+        async def fetch_block(block_start: int, block_end: int) -> bytes:
+            headers = dict(dl_headers)
+            headers["Range"] = f"bytes={block_start}-{block_end}"
+            async with httpx.AsyncClient(timeout=self._timeout, follow_redirects=True) as client:
+                resp = await client.get(url, headers=headers)
+                if resp.status_code == 404:
+                    raise FileNotFoundError(rel)
+                resp.raise_for_status()
+                return resp.content
+
         async def iterator():
+            if block_cache.wants(range_header) and total_size:
+                # 播放器反复探测的范围（moov、尾部索引）由本地块缓存提供
+                version = f"{it['fid']}|{total_size}|{it.get('mtime')}|{'transcode' if transcoded else 'raw'}"
+                key = block_cache.make_key(self.record.id, rel, version)
+                last = end if end is not None else total_size - 1
+                try:
+                    async for chunk in block_cache.iter_range(key, total_size, start, last, fetch_block):
+                        yield chunk
+                except FileNotFoundError:
+                    raise HTTPException(404, detail="Upstream not available")
+                return
             headers = dict(dl_headers)
             if status_code == 206 and end is not None:
                 headers["Range"] = f"bytes={start}-{end}"
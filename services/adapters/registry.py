@@ -1,4 +1,5 @@
-from typing import Dict, Callable
+from typing import Dict, Callable, Set
+import asyncio
 import pkgutil
 import inspect
 from importlib import import_module
@@ -55,12 +56,37 @@ def get_config_schema(adapter_type: str):
     return CONFIG_SCHEMAS.get(adapter_type)
 
 
+async def close_adapter(instance: object):
+    """释放适配器持有的长连接等资源（实现了 aclose 的适配器）"""
+    closer = getattr(instance, "aclose", None)
+    if closer is None:
+        return
+    try:
+        await closer()
+    except Exception:
+        pass
+
+
 class RuntimeRegistry:
     def __init__(self):
         self._instances: Dict[int, object] = {}
+        self._closing: Set[asyncio.Task] = set()
+
+    def _discard(self, instance: object | None):
+        """被替换或移除的实例在后台关闭，不阻塞调用方"""
+        if instance is None or getattr(instance, "aclose", None) is None:
+            return
+        try:
+            task = asyncio.get_running_loop().create_task(close_adapter(instance))
+        except RuntimeError:
+            return
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
 
     async def refresh(self):
         discover_adapters()
+        for instance in self._instances.values():
+            self._discard(instance)
         self._instances.clear()
         adapters = await StorageAdapter.filter(enabled=True)
         for rec in adapters:
@@ -81,7 +107,7 @@ class RuntimeRegistry:
     def remove(self, adapter_id: int):
         """从缓存中移除一个适配器实例"""
         if adapter_id in self._instances:
-            del self._instances[adapter_id]
+            self._discard(self._instances.pop(adapter_id))
 
     async def upsert(self, rec: StorageAdapter):
         """新增或更新一个适配器实例"""
@@ -98,11 +124,21 @@ class RuntimeRegistry:
 
         try:
             instance = factory(rec)
+            self._discard(self._instances.get(rec.id))
             self._instances[rec.id] = instance
         except Exception:
             self.remove(rec.id)
             pass
 
+    async def aclose(self):
+        """服务关闭时断开所有适配器的长连接"""
+        instances = list(self._instances.values())
+        self._instances.clear()
+        for instance in instances:
+            await close_adapter(instance)
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
+
 
 runtime_registry = RuntimeRegistry()
 discover_adapters()
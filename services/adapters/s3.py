@@ -1,16 +1,99 @@
 from __future__ import annotations
 import asyncio
 import mimetypes
+import time
 from datetime import datetime
 from typing import List, Dict, Tuple, AsyncIterator
 from urllib.parse import quote
 
 import aioboto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
 from fastapi import HTTPException
 from fastapi.responses import StreamingResponse
 from models import StorageAdapter
 from services.logging import LogService
+from services.adapters import _s3_bulk
+from services.range_fetch import DEFAULT_CONCURRENCY as DEFAULT_DOWNLOAD_CONCURRENCY, PARALLEL_THRESHOLD, \
+    fetch_ranges, read_ranges
+
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PART_SIZE = 5 * 1024 * 1024 * 1024
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+# 每上传这么多个分块后分块大小翻倍，大文件不会超过 S3 的 10000 分块上限
+PART_SIZE_STEP = 1000
+DEFAULT_UPLOAD_CONCURRENCY = 4
+PART_RETRIES = 3
+PART_RETRY_DELAY = 0.5
+# 目录复制、删除时并发的请求数
+DEFAULT_BULK_CONCURRENCY = 8
+PROGRESS_LOG_INTERVAL = 5.0
+
+
+def part_size_for(part_number: int, base: int = DEFAULT_PART_SIZE) -> int:
+    return min(base << ((part_number - 1) // PART_SIZE_STEP), MAX_PART_SIZE)
+
+
+class _PipelinedUpload:
+    """分块上传：最多 concurrency 个分块同时上传，单个分块失败时单独重试；
+    提交新分块前须等待空闲槽位，缓冲中的分块不超过 concurrency + 1 个"""
+
+    def __init__(self, s3, bucket: str, key: str, concurrency: int):
+        self.s3 = s3
+        self.bucket = bucket
+        self.key = key
+        self.upload_id: str | None = None
+        self.etags: Dict[int, str] = {}
+        self._slots = asyncio.Semaphore(max(1, concurrency))
+        self._tasks: set[asyncio.Task] = set()
+        self._error: BaseException | None = None
+
+    async def start(self):
+        mpu = await self.s3.create_multipart_upload(Bucket=self.bucket, Key=self.key)
+        self.upload_id = mpu["UploadId"]
+
+    async def submit(self, part_number: int, body: bytearray):
+        await self._slots.acquire()
+        if self._error:
+            self._slots.release()
+            raise self._error
+        task = asyncio.create_task(self._upload(part_number, body))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _upload(self, part_number: int, body: bytearray):
+        try:
+            for attempt in range(PART_RETRIES + 1):
+                try:
+                    resp = await self.s3.upload_part(
+                        Bucket=self.bucket, Key=self.key, PartNumber=part_number,
+                        UploadId=self.upload_id, Body=body,
+                    )
+                    self.etags[part_number] = resp["ETag"]
+                    return
+                except Exception as e:
+                    if attempt >= PART_RETRIES:
+                        self._error = self._error or e
+                        raise
+                    await asyncio.sleep(PART_RETRY_DELAY * 2 ** attempt)
+        finally:
+            self._slots.release()
+
+    async def complete(self):
+        await asyncio.gather(*self._tasks)
+        if self._error:
+            raise self._error
+        parts = [{"PartNumber": n, "ETag": self.etags[n]} for n in sorted(self.etags)]
+        await self.s3.complete_multipart_upload(
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id, MultipartUpload={"Parts": parts},
+        )
+
+    async def abort(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self.upload_id:
+            await self.s3.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
 
 
 class S3Adapter:
@@ -25,6 +108,11 @@ class S3Adapter:
         self.region_name = cfg.get("region_name")
         self.endpoint_url = cfg.get("endpoint_url")
         self.root = cfg.get("root", "").strip("/")
+        self.part_size = max(MIN_PART_SIZE, int(float(cfg.get("part_size_mb") or 0) * 1024 * 1024)
+                             or DEFAULT_PART_SIZE)
+        self.upload_concurrency = max(1, int(cfg.get("upload_concurrency") or DEFAULT_UPLOAD_CONCURRENCY))
+        self.bulk_concurrency = DEFAULT_BULK_CONCURRENCY
+        self.download_concurrency = max(1, int(cfg.get("download_concurrency") or DEFAULT_DOWNLOAD_CONCURRENCY))
 
         if not all([self.bucket_name, self.aws_access_key_id, self.aws_secret_access_key]):
             raise ValueError(
@@ -50,7 +138,9 @@ class S3Adapter:
         return rel_path
 
     def _get_client(self):
-        return self.session.client("s3", endpoint_url=self.endpoint_url)
+        # 连接池需容纳并发的分块上传与批量复制、删除请求
+        pool = max(10, self.upload_concurrency, self.bulk_concurrency, self.download_concurrency) + 2
+        return self.session.client("s3", endpoint_url=self.endpoint_url, config=Config(max_pool_connections=pool))
 
     async def list_dir(self, root: str, rel: str, page_num: int = 1, page_size: int = 50, sort_by: str = "name", sort_order: str = "asc") -> Tuple[List[Dict], int]:
         prefix = self._get_s3_key(rel)
@@ -112,16 +202,58 @@ class S3Adapter:
 
         return all_items[start_idx:end_idx], total_count
 
+    async def walk_files(self, root: str, start_after: str | None = None) -> AsyncIterator[Dict]:
+        """不带 Delimiter 按 key 顺序平铺列举全部对象，start_after 为上次的续传标记"""
+        prefix = self._get_s3_key("")
+        if prefix and not prefix.endswith("/"):
+            prefix += "/"
+        params = {"Bucket": self.bucket_name, "Prefix": prefix}
+        if start_after:
+            params["StartAfter"] = prefix + start_after
+
+        async with self._get_client() as s3:
+            paginator = s3.get_paginator("list_objects_v2")
+            async for result in paginator.paginate(**params):
+                for content in result.get("Contents", []):
+                    rel_key = content["Key"][len(prefix):]
+                    if not rel_key:
+                        continue
+                    is_dir = rel_key.endswith("/")
+                    yield {
+                        "path": rel_key.rstrip("/"),
+                        "is_dir": is_dir,
+                        "size": 0 if is_dir else content.get("Size", 0),
+                        "mtime": int(content.get("LastModified", datetime.now()).timestamp()),
+                        "etag": (content.get("ETag") or "").strip('"') or None,
+                        "marker": rel_key,
+                    }
+
+    def _range_fetch(self, s3, key: str):
+        async def fetch(start: int, end: int) -> bytes:
+            resp = await s3.get_object(Bucket=self.bucket_name, Key=key, Range=f"bytes={start}-{end}")
+            return await resp["Body"].read()
+        return fetch
+
     async def read_file(self, root: str, rel: str) -> bytes:
+        """首个请求只取前 PARALLEL_THRESHOLD 字节并从 Content-Range 得知总大小，大文件其余部分并发分段读取"""
         key = self._get_s3_key(rel)
         async with self._get_client() as s3:
             try:
-                resp = await s3.get_object(Bucket=self.bucket_name, Key=key)
-                return await resp["Body"].read()
+                resp = await s3.get_object(Bucket=self.bucket_name, Key=key, Range=f"bytes=0-{PARALLEL_THRESHOLD - 1}")
+                head = await resp["Body"].read()
             except ClientError as e:
-                if e.response["Error"]["Code"] == "NoSuchKey":
+                code = e.response["Error"]["Code"]
+                if code == "NoSuchKey":
                     raise FileNotFoundError(rel)
+                if code == "InvalidRange":
+                    # 空对象不接受任何 Range
+                    return b""
                 raise
+            total = int((resp.get("ContentRange") or "/").rsplit("/", 1)[1] or len(head))
+            if total <= len(head):
+                return head
+            rest = await read_ranges(self._range_fetch(s3, key), len(head), total - 1, self.download_concurrency)
+            return head + rest
 
     async def write_file(self, root: str, rel: str, data: bytes):
         key = self._get_s3_key(rel)
@@ -134,68 +266,50 @@ class S3Adapter:
             )
 
     async def write_file_stream(self, root: str, rel: str, data_iter: AsyncIterator[bytes]):
+        """小文件单次 put_object；超过一个分块时改为分块上传，多个分块并发在途。
+        分块缓冲随输入增长而不预先按分块大小分配，小文件只占用其实际大小的内存"""
         key = self._get_s3_key(rel)
-        MIN_PART_SIZE = 5 * 1024 * 1024
-        
+        total_size = 0
+        part_number = 1
+        limit = part_size_for(part_number, self.part_size)
+        buffer = bytearray()
+
         async with self._get_client() as s3:
-            mpu = await s3.create_multipart_upload(Bucket=self.bucket_name, Key=key)
-            upload_id = mpu['UploadId']
-            
-            parts = []
-            part_number = 1
-            total_size = 0
-            buffer = bytearray()
-            
+            upload: _PipelinedUpload | None = None
             try:
                 async for chunk in data_iter:
-                    if not chunk:
-                        continue
-                    buffer.extend(chunk)
-                    
-                    while len(buffer) >= MIN_PART_SIZE:
-                        part_data = buffer[:MIN_PART_SIZE]
-                        del buffer[:MIN_PART_SIZE]
-                        
-                        part = await s3.upload_part(
-                            Bucket=self.bucket_name,
-                            Key=key,
-                            PartNumber=part_number,
-                            UploadId=upload_id,
-                            Body=part_data
-                        )
-                        
-                        parts.append({'PartNumber': part_number, 'ETag': part['ETag']})
-                        total_size += len(part_data)
+                    view = memoryview(chunk)
+                    while view:
+                        n = min(limit - len(buffer), len(view))
+                        buffer += view[:n]
+                        view = view[n:]
+                        if len(buffer) < limit:
+                            continue
+                        if upload is None:
+                            upload = _PipelinedUpload(s3, self.bucket_name, key, self.upload_concurrency)
+                            await upload.start()
+                        await upload.submit(part_number, buffer)
+                        total_size += len(buffer)
                         part_number += 1
-
-                if buffer:
-                    part = await s3.upload_part(
-                        Bucket=self.bucket_name,
-                        Key=key,
-                        PartNumber=part_number,
-                        UploadId=upload_id,
-                        Body=bytes(buffer)
-                    )
-                    parts.append({'PartNumber': part_number, 'ETag': part['ETag']})
-                    total_size += len(buffer)
-                
-                await s3.complete_multipart_upload(
-                    Bucket=self.bucket_name,
-                    Key=key,
-                    UploadId=upload_id,
-                    MultipartUpload={'Parts': parts}
-                )
+                        limit = part_size_for(part_number, self.part_size)
+                        buffer = bytearray()
+
+                total_size += len(buffer)
+                if upload is None:
+                    await s3.put_object(Bucket=self.bucket_name, Key=key, Body=buffer)
+                else:
+                    if buffer:
+                        await upload.submit(part_number, buffer)
+                    await upload.complete()
             except Exception as e:
-                await s3.abort_multipart_upload(
-                    Bucket=self.bucket_name,
-                    Key=key,
-                    UploadId=upload_id
-                )
+                if upload is not None:
+                    await upload.abort()
                 raise IOError(f"S3 stream upload failed: {e}") from e
 
         await LogService.info(
             "adapter:s3", f"Wrote file stream to {rel}",
-            details={"adapter_id": self.record.id, "bucket": self.bucket_name, "key": key, "size": total_size}
+            details={"adapter_id": self.record.id, "bucket": self.bucket_name, "key": key, "size": total_size,
+                     "parts": part_number if upload else 1}
         )
         return total_size
 
@@ -211,36 +325,47 @@ class S3Adapter:
                          "bucket": self.bucket_name, "key": key}
             )
 
+    def _progress(self, action: str, rel: str):
+        """目录批量操作的进度回调：每隔 PROGRESS_LOG_INTERVAL 秒记一条日志"""
+        state = {"logged_at": time.monotonic()}
+
+        def report(objects: int, size: int):
+            now = time.monotonic()
+            if now - state["logged_at"] < PROGRESS_LOG_INTERVAL:
+                return
+            state["logged_at"] = now
+            asyncio.create_task(LogService.info(
+                "adapter:s3", f"{action} {rel}: {objects} objects",
+                details={"adapter_id": self.record.id, "objects": objects, "bytes": size},
+            ))
+        return report
+
+    async def _head(self, s3, key: str) -> Dict | None:
+        try:
+            return await s3.head_object(Bucket=self.bucket_name, Key=key)
+        except ClientError as e:
+            if e.response["Error"]["Code"] not in ("404", "NoSuchKey"):
+                raise
+            return None
+
     async def delete(self, root: str, rel: str):
         key = self._get_s3_key(rel)
         async with self._get_client() as s3:
-            is_dir_like = False
-            try:
-                head = await s3.head_object(Bucket=self.bucket_name, Key=key)
-                if head['ContentLength'] == 0 and key.endswith('/'):
-                    is_dir_like = True
-            except ClientError as e:
-                if e.response['Error']['Code'] != '404': 
-                    raise
-
-            # 如果是目录，删除目录下的所有对象
-            if is_dir_like or not await self.stat_file(root, rel):  
-                dir_key = key if key.endswith('/') else key + '/'
-                paginator = s3.get_paginator("list_objects_v2")
-                objects_to_delete = []
-                async for result in paginator.paginate(Bucket=self.bucket_name, Prefix=dir_key):
-                    for content in result.get("Contents", []):
-                        objects_to_delete.append({"Key": content["Key"]})
-                if objects_to_delete:
-                    await s3.delete_objects(Bucket=self.bucket_name, Delete={"Objects": objects_to_delete})
-            # 如果是文件，直接删除
-            else:
+            deleted = 0
+            if not key.endswith("/") and await self._head(s3, key) is not None:
                 await s3.delete_object(Bucket=self.bucket_name, Key=key)
+                deleted = 1
+            else:
+                # 目录：流式列举并分批并发删除前缀下的全部对象
+                deleted = await _s3_bulk.delete_prefix(
+                    s3, self.bucket_name, key.rstrip("/") + "/", self.bulk_concurrency,
+                    self._progress("Deleting", rel),
+                )
 
             await LogService.info(
                 "adapter:s3", f"Deleted {rel}",
                 details={"adapter_id": self.record.id,
-                         "bucket": self.bucket_name, "key": key}
+                         "bucket": self.bucket_name, "key": key, "objects": deleted}
             )
 
     async def move(self, root: str, src_rel: str, dst_rel: str):
@@ -256,24 +381,31 @@ class S3Adapter:
         await self.move(root, src_rel, dst_rel)
 
     async def copy(self, root: str, src_rel: str, dst_rel: str, overwrite: bool = False):
+        """服务端复制文件或目录；超过 5 GB 的对象分块复制，目录下的对象并发复制"""
         src_key = self._get_s3_key(src_rel)
         dst_key = self._get_s3_key(dst_rel)
 
         async with self._get_client() as s3:
-            if not overwrite:
-                try:
-                    await s3.head_object(Bucket=self.bucket_name, Key=dst_key)
-                    raise FileExistsError(dst_rel)
-                except ClientError as e:
-                    if e.response["Error"]["Code"] != "404":
-                        raise
+            if not overwrite and await self._head(s3, dst_key) is not None:
+                raise FileExistsError(dst_rel)
 
-            copy_source = {"Bucket": self.bucket_name, "Key": src_key}
-            await s3.copy_object(CopySource=copy_source, Bucket=self.bucket_name, Key=dst_key)
+            head = await self._head(s3, src_key)
+            if head is not None:
+                await _s3_bulk.copy_object(
+                    s3, self.bucket_name, src_key, dst_key, head["ContentLength"], self.bulk_concurrency,
+                )
+                objects, size = 1, head["ContentLength"]
+            else:
+                objects, size = await _s3_bulk.copy_prefix(
+                    s3, self.bucket_name, src_key.rstrip("/") + "/", dst_key.rstrip("/") + "/",
+                    self.bulk_concurrency, self._progress("Copying", src_rel),
+                )
+                if not objects:
+                    raise FileNotFoundError(src_rel)
             await LogService.info(
                 "adapter:s3", f"Copied {src_rel} to {dst_rel}",
                 details={"adapter_id": self.record.id, "bucket": self.bucket_name,
-                         "src_key": src_key, "dst_key": dst_key}
+                         "src_key": src_key, "dst_key": dst_key, "objects": objects, "bytes": size}
             )
 
     async def stat_file(self, root: str, rel: str):
@@ -344,16 +476,26 @@ class S3Adapter:
                     raise HTTPException(
                         status_code=400, detail="Invalid Range header")
 
-            range_arg = f"bytes={start}-{end}"
+        range_arg = f"bytes={start}-{end}"
 
-            async def iterator():
+        async def iterator():
+            if end < start:
+                return
+            # 响应体在请求处理函数返回后才开始迭代，需单独持有客户端
+            async with self._get_client() as s3c:
                 try:
-                    resp = await s3.get_object(Bucket=self.bucket_name, Key=key, Range=range_arg)
+                    if end - start + 1 > PARALLEL_THRESHOLD:
+                        async for chunk in fetch_ranges(
+                            self._range_fetch(s3c, key), start, end, self.download_concurrency,
+                        ):
+                            yield chunk
+                        return
+                    resp = await s3c.get_object(Bucket=self.bucket_name, Key=key, Range=range_arg)
                     body = resp["Body"]
                     while chunk := await body.read(65536):
                         yield chunk
                 except Exception as e:
-                    LogService.error(
+                    await LogService.error(
                         "adapter:s3", f"Error streaming file {key}: {e}")
 
         return StreamingResponse(iterator(), status_code=status, headers=headers, media_type=content_type)
@@ -374,6 +516,12 @@ CONFIG_SCHEMA = [
         "required": False, "placeholder": "对于 S3 兼容存储, 例如 https://minio.example.com"},
     {"key": "root", "label": "根路径 (Root Path)", "type": "string",
      "required": False, "placeholder": "在 bucket 内的路径前缀"},
+    {"key": "part_size_mb", "label": "分块大小(MB)", "type": "number",
+     "required": False, "default": 8, "placeholder": "分块上传的初始分块大小，不小于 5"},
+    {"key": "upload_concurrency", "label": "上传并发数", "type": "number",
+     "required": False, "default": DEFAULT_UPLOAD_CONCURRENCY},
+    {"key": "download_concurrency", "label": "下载并发数", "type": "number",
+     "required": False, "default": DEFAULT_DOWNLOAD_CONCURRENCY},
 ]
 
 
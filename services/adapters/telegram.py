@@ -1,12 +1,33 @@
 from __future__ import annotations
-from typing import List, Dict, Tuple, AsyncIterator
+from typing import Any, Awaitable, Callable, List, Dict, Tuple, AsyncIterator
+import asyncio
+import hashlib
 import io
+import logging
 import os
+import time
 from models import StorageAdapter
-from telethon import TelegramClient
+from services.adapters._telegram_catalog import TelegramCatalog
+from services.block_cache import block_cache
+from services.range_fetch import PARALLEL_THRESHOLD, read_ranges
+from telethon import TelegramClient, functions, helpers, types
+from telethon.errors import FloodWaitError
 from telethon.sessions import StringSession
 import socks
 
+logger = logging.getLogger(__name__)
+
+# 单次调用遇到限流或断线后的最大重试次数
+CALL_RETRIES = 3
+# 下载连接池大小：大文件分段并行 iter_download 使用的额外连接数
+DEFAULT_DOWNLOAD_CONNECTIONS = 2
+MAX_DOWNLOAD_CONNECTIONS = 8
+# 上传分片大小取 Telegram 允许的最大值；超过 10MB 的文件必须使用大文件分片
+UPLOAD_PART_SIZE = 512 * 1024
+BIG_FILE_THRESHOLD = 10 * 1024 * 1024
+DEFAULT_UPLOAD_CONCURRENCY = 4
+MAX_UPLOAD_CONCURRENCY = 16
+
 # 适配器类型标识
 ADAPTER_TYPE = "Telegram"
 
@@ -19,6 +40,10 @@ CONFIG_SCHEMA = [
     {"key": "proxy_protocol", "label": "代理协议", "type": "string", "required": False, "placeholder": "例如: socks5, http"},
     {"key": "proxy_host", "label": "代理主机", "type": "string", "required": False, "placeholder": "例如: 127.0.0.1"},
     {"key": "proxy_port", "label": "代理端口", "type": "number", "required": False, "placeholder": "例如: 1080"},
+    {"key": "download_connections", "label": "下载连接数", "type": "number", "required": False,
+     "default": DEFAULT_DOWNLOAD_CONNECTIONS, "help_text": "大文件并行下载使用的连接数"},
+    {"key": "upload_concurrency", "label": "上传并发分片数", "type": "number", "required": False,
+     "default": DEFAULT_UPLOAD_CONCURRENCY},
 ]
 
 class TelegramAdapter:
@@ -55,9 +80,109 @@ class TelegramAdapter:
         if not all([self.api_id, self.api_hash, self.session_string, self.chat_id]):
             raise ValueError("Telegram 适配器需要 api_id, api_hash, session_string 和 chat_id")
 
+        self.download_connections = max(1, min(
+            int(cfg.get("download_connections") or DEFAULT_DOWNLOAD_CONNECTIONS), MAX_DOWNLOAD_CONNECTIONS,
+        ))
+        self.upload_concurrency = max(1, min(
+            int(cfg.get("upload_concurrency") or DEFAULT_UPLOAD_CONCURRENCY), MAX_UPLOAD_CONCURRENCY,
+        ))
+        # 每个适配器实例复用一个已连接的客户端，另有一组下载连接用于并行下载
+        self._client: TelegramClient | None = None
+        self._client_lock = asyncio.Lock()
+        self._pool: List[TelegramClient] = []
+        self._pool_lock = asyncio.Lock()
+        self._pool_next = 0
+        # 限流截止时间：任一调用收到 FloodWait 后，所有调用都等到该时间再发起
+        self._flood_until = 0.0
+        self.catalog = TelegramCatalog(self)
+
     def _get_client(self) -> TelegramClient:
-        """创建一个新的 TelegramClient 实例"""
-        return TelegramClient(StringSession(self.session_string), self.api_id, self.api_hash, proxy=self.proxy)
+        """创建一个新的 TelegramClient 实例；限流不在库内各自休眠，统一由 _wait_flood 串行处理"""
+        return TelegramClient(StringSession(self.session_string), self.api_id, self.api_hash, proxy=self.proxy,
+                              flood_sleep_threshold=0, auto_reconnect=True)
+
+    async def _ensure_client(self) -> TelegramClient:
+        """返回已连接的共享客户端，断线后自动重连"""
+        async with self._client_lock:
+            if self._client is None:
+                self._client = self._get_client()
+            if not self._client.is_connected():
+                await self._client.connect()
+            return self._client
+
+    async def _download_client(self) -> TelegramClient:
+        """从下载连接池轮流取一个已连接的客户端，池未满时新建"""
+        async with self._pool_lock:
+            if len(self._pool) < self.download_connections:
+                client = self._get_client()
+                self._pool.append(client)
+            else:
+                client = self._pool[self._pool_next % len(self._pool)]
+                self._pool_next += 1
+            if not client.is_connected():
+                await client.connect()
+            return client
+
+    async def _wait_flood(self):
+        delay = self._flood_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def _on_flood(self, e: FloodWaitError):
+        self._flood_until = max(self._flood_until, time.monotonic() + e.seconds)
+        logger.warning("Telegram flood wait %ss for adapter %s", e.seconds, self.record.id)
+
+    async def _call(self, fn: Callable[[TelegramClient], Awaitable[Any]]) -> Any:
+        """在共享客户端上执行调用；FloodWait 时等待后重试，连接断开时重连后重试"""
+        for attempt in range(CALL_RETRIES + 1):
+            await self._wait_flood()
+            client = await self._ensure_client()
+            try:
+                return await fn(client)
+            except FloodWaitError as e:
+                if attempt >= CALL_RETRIES:
+                    raise
+                self._on_flood(e)
+            except ConnectionError:
+                if attempt >= CALL_RETRIES:
+                    raise
+                logger.warning("Telegram connection lost for adapter %s, reconnecting", self.record.id)
+                await client.disconnect()
+
+    async def aclose(self):
+        """断开共享客户端与下载连接池，由注册表在适配器停用或服务关闭时调用"""
+        await self.catalog.aclose()
+        clients = ([self._client] if self._client else []) + self._pool
+        self._client = None
+        self._pool = []
+        for client in clients:
+            try:
+                if client.is_connected():
+                    await client.disconnect()
+            except Exception as e:
+                logger.debug("Telegram disconnect failed: %s", e)
+
+    @staticmethod
+    def _parse_message_id(rel: str) -> int:
+        try:
+            message_id_str, _ = rel.split('_', 1)
+            return int(message_id_str)
+        except (ValueError, IndexError):
+            raise FileNotFoundError(f"无效的文件路径格式: {rel}")
+
+    async def _get_media_message(self, message_id: int):
+        message = await self._call(lambda c: c.get_messages(self.chat_id, ids=message_id))
+        if not message or not (message.document or message.video or message.photo):
+            await self.catalog.remove(message_id)
+            raise FileNotFoundError(f"在频道 {self.chat_id} 中未找到消息ID为 {message_id} 的文件")
+        return message
+
+    @staticmethod
+    def _media_size(message) -> int:
+        if message.photo:
+            photo_size = message.photo.sizes[-1]
+            return photo_size.size if hasattr(photo_size, 'size') else 0
+        return (message.document or message.video).size
 
     def get_effective_root(self, sub_path: str | None) -> str:
         return ""
@@ -66,135 +191,159 @@ class TelegramAdapter:
         if rel:
             return [], 0
 
-        client = self._get_client()
-        entries = []
-        try:
-            await client.connect()
-            messages = await client.get_messages(self.chat_id, limit=200)
-            for message in messages:
-                if not message:
-                    continue
-                
-                media = message.document or message.video or message.photo
-                if not media:
-                    continue
+        # 目录来自本地消息目录：全部历史可见，分页在数据库中完成
+        await self.catalog.refresh()
+        return await self.catalog.list(page_num, page_size, sort_by, sort_order)
 
-                filename = None
-                size = 0
-                
-                if message.photo:
-                    photo_size = message.photo.sizes[-1]
-                    size = photo_size.size if hasattr(photo_size, 'size') else 0
-                    filename = f"photo_{message.id}.jpg"
-
-                elif message.document or message.video:
-                    size = media.size
-                    if hasattr(media, 'attributes'):
-                        for attr in media.attributes:
-                            if hasattr(attr, 'file_name') and attr.file_name:
-                                filename = attr.file_name
-                                break
-                
-                if not filename:
-                    if message.text and '.' in message.text and len(message.text) < 256 and '\n' not in message.text:
-                        filename = message.text
-                
-                if not filename:
-                    filename = f"unknown_{message.id}"
-
-                entries.append({
-                    "name": f"{message.id}_{filename}",
-                    "is_dir": False,
-                    "size": size,
-                    "mtime": int(message.date.timestamp()),
-                    "type": "file",
-                })
-        finally:
-            if client.is_connected():
-                await client.disconnect()
+    async def walk_files(self, root: str, start_after: str | None = None) -> AsyncIterator[Dict]:
+        """供遍历服务按消息ID顺序列举全部文件"""
+        async for entry in self.catalog.walk(start_after):
+            yield entry
 
-        # 排序
-        reverse = sort_order.lower() == "desc"
-        def get_sort_key(item):
-            key = (not item["is_dir"],)
-            sort_field = sort_by.lower()
-            if sort_field == "name":
-                key += (item["name"].lower(),)
-            elif sort_field == "size":
-                key += (item["size"],)
-            elif sort_field == "mtime":
-                key += (item["mtime"],)
-            else:
-                key += (item["name"].lower(),)
-            return key
-        entries.sort(key=get_sort_key, reverse=reverse)
-        
-        total_count = len(entries)
-        
-        # 分页
-        start_idx = (page_num - 1) * page_size
-        end_idx = start_idx + page_size
-        page_entries = entries[start_idx:end_idx]
-        
-        return page_entries, total_count
+    async def search(self, root: str, q: str, page_num: int = 1, page_size: int = 50) -> Tuple[List[Dict], int]:
+        """在本地消息目录中按文件名搜索"""
+        await self.catalog.refresh()
+        return await self.catalog.search(q, page_num, page_size)
 
     async def read_file(self, root: str, rel: str) -> bytes:
-        try:
-            message_id_str, _ = rel.split('_', 1)
-            message_id = int(message_id_str)
-        except (ValueError, IndexError):
-            raise FileNotFoundError(f"无效的文件路径格式: {rel}")
-
-        client = self._get_client()
-        try:
-            await client.connect()
-            message = await client.get_messages(self.chat_id, ids=message_id)
-            if not message or not (message.document or message.video or message.photo):
-                raise FileNotFoundError(f"在频道 {self.chat_id} 中未找到消息ID为 {message_id} 的文件")
-            
-            file_bytes = await client.download_media(message, file=bytes)
-            return file_bytes
-        finally:
-            if client.is_connected():
+        message = await self._get_media_message(self._parse_message_id(rel))
+        size = self._media_size(message)
+        if message.photo or size <= PARALLEL_THRESHOLD:
+            return await self._call(lambda c: c.download_media(message, file=bytes))
+        # 大文件按范围分段，经下载连接池并行读取
+        media = message.document or message.video
+        return await read_ranges(
+            lambda start, end: self._download_range(media, start, end), 0, size - 1, self.download_connections,
+        )
+
+    async def _download_range(self, media, start: int, end: int) -> bytes:
+        """经下载连接池读取媒体 [start, end] 范围的字节；中途限流或断线时从已读位置继续"""
+        limit = end - start + 1
+        buf = bytearray()
+        for attempt in range(CALL_RETRIES + 1):
+            await self._wait_flood()
+            client = await self._download_client()
+            try:
+                async for chunk in client.iter_download(media, offset=start + len(buf)):
+                    buf.extend(chunk)
+                    if len(buf) >= limit:
+                        break
+                break
+            except FloodWaitError as e:
+                if attempt >= CALL_RETRIES:
+                    raise
+                self._on_flood(e)
+            except ConnectionError:
+                if attempt >= CALL_RETRIES:
+                    raise
                 await client.disconnect()
+        return bytes(buf[:limit])
 
     async def write_file(self, root: str, rel: str, data: bytes):
         """将字节数据作为文件上传"""
-        client = self._get_client()
         file_like = io.BytesIO(data)
         file_like.name = os.path.basename(rel) or "file"
 
+        async def send(client: TelegramClient):
+            file_like.seek(0)
+            return await client.send_file(self.chat_id, file_like, caption=file_like.name)
+
+        await self.catalog.add(await self._call(send))
+
+    async def _upload_parts(self, filename: str, data_iter: AsyncIterator[bytes]):
+        """把字节流直接切成分片并发上传，不落盘；返回 (InputFile 或 InputFileBig, 总字节数)。
+        前 10MB 先缓存在内存中以决定使用普通分片还是大文件分片；大文件在读到结尾前不知道
+        总分片数，此前的分片以 -1 作为 file_total_parts 上传"""
+        file_id = helpers.generate_random_long()
+        slots = asyncio.Semaphore(self.upload_concurrency)
+        tasks: List[asyncio.Task] = []
+        md5 = hashlib.md5()
+        early: List[bytes] = []
+        held: bytes | None = None
+        big = False
+        count = 0
+        total = 0
+
+        async def send(index: int, part: bytes, total_parts: int):
+            try:
+                if big:
+                    request = functions.upload.SaveBigFilePartRequest(file_id, index, total_parts, part)
+                else:
+                    request = functions.upload.SaveFilePartRequest(file_id, index, part)
+                if not await self._call(lambda c: c(request)):
+                    raise IOError(f"Failed to upload part {index} of {filename}")
+            finally:
+                slots.release()
+
+        async def submit(part: bytes, last: bool):
+            nonlocal count
+            # 先占并发槽再读下一块，内存中最多保留 upload_concurrency 个在途分片
+            await slots.acquire()
+            failed = next((t for t in tasks if t.done() and t.exception()), None)
+            if failed:
+                slots.release()
+                raise failed.exception()
+            tasks.append(asyncio.create_task(send(count, part, count + 1 if last else -1)))
+            count += 1
+
+        async def push(part: bytes):
+            nonlocal held, big
+            if not big:
+                early.append(part)
+                md5.update(part)
+                if len(early) * UPLOAD_PART_SIZE <= BIG_FILE_THRESHOLD:
+                    return
+                big = True
+                parts, early[:] = list(early), []
+                for p in parts[:-1]:
+                    await submit(p, False)
+                held = parts[-1]
+                return
+            # 保留最后一个整片，直到确认之后还有数据，才知道它是不是最后一片
+            await submit(held, False)
+            held = part
+
         try:
-            await client.connect()
-            await client.send_file(self.chat_id, file_like, caption=file_like.name)
-        finally:
-            if client.is_connected():
-                await client.disconnect()
+            buf = bytearray()
+            async for chunk in data_iter:
+                if not chunk:
+                    continue
+                total += len(chunk)
+                buf.extend(chunk)
+                while len(buf) >= UPLOAD_PART_SIZE:
+                    await push(bytes(buf[:UPLOAD_PART_SIZE]))
+                    del buf[:UPLOAD_PART_SIZE]
+            if total == 0:
+                raise ValueError("Telegram 不支持上传空文件")
+            if big:
+                if buf:
+                    await submit(held, False)
+                    await submit(bytes(buf), True)
+                else:
+                    await submit(held, True)
+            else:
+                if buf:
+                    early.append(bytes(buf))
+                    md5.update(buf)
+                big = total > BIG_FILE_THRESHOLD
+                for i, p in enumerate(early):
+                    await submit(p, i == len(early) - 1)
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        if big:
+            return types.InputFileBig(file_id, count, filename), total
+        return types.InputFile(file_id, count, filename, md5.hexdigest()), total
 
     async def write_file_stream(self, root: str, rel: str, data_iter: AsyncIterator[bytes]):
-        """以流式方式上传文件"""
-        client = self._get_client()
+        """以流式方式上传文件：分片边读边传，不使用临时文件"""
         filename = os.path.basename(rel) or "file"
-        import tempfile
-        temp_dir = tempfile.gettempdir()
-        temp_path = os.path.join(temp_dir, filename)
-        
-        total_size = 0
-        try:
-            with open(temp_path, "wb") as f:
-                async for chunk in data_iter:
-                    if chunk:
-                        f.write(chunk)
-                        total_size += len(chunk)
-            
-            await client.connect()
-            await client.send_file(self.chat_id, temp_path, caption=filename)
-
-        finally:
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-            if client.is_connected():
-                await client.disconnect()
+        input_file, total_size = await self._upload_parts(filename, data_iter)
+        message = await self._call(lambda c: c.send_file(self.chat_id, input_file, caption=filename))
+        await self.catalog.add(message)
         return total_size
 
     async def mkdir(self, root: str, rel: str):
@@ -208,15 +357,10 @@ class TelegramAdapter:
         except (ValueError, IndexError):
             raise FileNotFoundError(f"无效的文件路径格式，无法解析消息ID: {rel}")
 
-        client = self._get_client()
-        try:
-            await client.connect()
-            result = await client.delete_messages(self.chat_id, [message_id])
-            if not result or not result[0].pts:
-                 raise FileNotFoundError(f"在 {self.chat_id} 中删除消息 {message_id} 失败，可能消息不存在或无权限")
-        finally:
-            if client.is_connected():
-                await client.disconnect()
+        result = await self._call(lambda c: c.delete_messages(self.chat_id, [message_id]))
+        if not result or not result[0].pts:
+             raise FileNotFoundError(f"在 {self.chat_id} 中删除消息 {message_id} 失败，可能消息不存在或无权限")
+        await self.catalog.remove(message_id)
 
     async def move(self, root: str, src_rel: str, dst_rel: str):
         raise NotImplementedError("Telegram 适配器不支持移动。")
@@ -232,26 +376,18 @@ class TelegramAdapter:
         from fastapi import HTTPException
 
         try:
-            message_id_str, _ = rel.split('_', 1)
-            message_id = int(message_id_str)
-        except (ValueError, IndexError):
+            message_id = self._parse_message_id(rel)
+        except FileNotFoundError:
             raise HTTPException(status_code=400, detail=f"无效的文件路径格式: {rel}")
 
-        client = self._get_client()
-        
         try:
-            await client.connect()
-            message = await client.get_messages(self.chat_id, ids=message_id)
+            message = await self._get_media_message(message_id)
             media = message.document or message.video or message.photo
-            if not message or not media:
-                raise FileNotFoundError(f"在频道 {self.chat_id} 中未找到消息ID为 {message_id} 的文件")
 
+            file_size = self._media_size(message)
             if message.photo:
-                photo_size = media.sizes[-1]
-                file_size = photo_size.size if hasattr(photo_size, 'size') else 0
                 mime_type = "image/jpeg"
             else:
-                file_size = media.size
                 mime_type = media.mime_type or "application/octet-stream"
 
             start = 0
@@ -278,65 +414,53 @@ class TelegramAdapter:
                 except ValueError:
                     raise HTTPException(status_code=400, detail="Invalid Range header")
 
+            use_cache = block_cache.wants(range_header) and not message.photo and file_size > 0
+
+            async def fetch_block(block_start: int, block_end: int) -> bytes:
+                return await self._download_range(media, block_start, block_end)
+
             async def iterator():
-                try:
-                    limit = end - start + 1
-                    downloaded = 0
-                    
-                    async for chunk in client.iter_download(media, offset=start):
-                        if downloaded + len(chunk) > limit:
-                            yield chunk[:limit - downloaded]
-                            break
+                if use_cache:
+                    # 播放器反复探测的范围（moov、尾部索引）由本地块缓存提供
+                    key = block_cache.make_key(self.record.id, rel, f"{media.id}|{file_size}|{message.edit_date}")
+                    async for chunk in block_cache.iter_range(key, file_size, start, end, fetch_block):
                         yield chunk
-                        downloaded += len(chunk)
-                        if downloaded >= limit:
-                            break
-                finally:
-                    if client.is_connected():
-                        await client.disconnect()
+                    return
+                limit = end - start + 1
+                downloaded = 0
+                client = await self._download_client()
+                async for chunk in client.iter_download(media, offset=start):
+                    if downloaded + len(chunk) > limit:
+                        yield chunk[:limit - downloaded]
+                        break
+                    yield chunk
+                    downloaded += len(chunk)
+                    if downloaded >= limit:
+                        break
 
             return StreamingResponse(iterator(), status_code=status, headers=headers)
 
+        except HTTPException:
+            raise
         except FileNotFoundError as e:
-            if client.is_connected():
-                await client.disconnect()
             raise HTTPException(status_code=404, detail=str(e))
         except Exception as e:
-            if client.is_connected():
-                await client.disconnect()
             raise HTTPException(status_code=500, detail=f"Streaming failed: {str(e)}")
 
     async def stat_file(self, root: str, rel: str):
-        try:
-            message_id_str, filename = rel.split('_', 1)
-            message_id = int(message_id_str)
-        except (ValueError, IndexError):
-            raise FileNotFoundError(f"无效的文件路径格式: {rel}")
-
-        client = self._get_client()
-        try:
-            await client.connect()
-            message = await client.get_messages(self.chat_id, ids=message_id)
-            media = message.document or message.video or message.photo
-            if not message or not media:
-                raise FileNotFoundError(f"在频道 {self.chat_id} 中未找到消息ID为 {message_id} 的文件")
-
-            if message.photo:
-                photo_size = media.sizes[-1]
-                size = photo_size.size if hasattr(photo_size, 'size') else 0
-            else:
-                size = media.size
-
-            return {
-                "name": rel,
-                "is_dir": False,
-                "size": size,
-                "mtime": int(message.date.timestamp()),
-                "type": "file",
-            }
-        finally:
-            if client.is_connected():
-                await client.disconnect()
+        message_id = self._parse_message_id(rel)
+        row = await self.catalog.get(message_id)
+        if row:
+            return {"name": rel, "is_dir": False, "size": row.size, "mtime": row.date, "type": "file"}
+        message = await self._get_media_message(message_id)
+        await self.catalog.add(message)
+        return {
+            "name": rel,
+            "is_dir": False,
+            "size": self._media_size(message),
+            "mtime": int(message.date.timestamp()),
+            "type": "file",
+        }
 
 def ADAPTER_FACTORY(rec: StorageAdapter) -> TelegramAdapter:
     return TelegramAdapter(rec)
\ No newline at end of file
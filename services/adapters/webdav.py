@@ -9,7 +9,10 @@ import mimetypes
 import logging
 from fastapi import HTTPException
 from fastapi.responses import StreamingResponse, Response
+from services.block_cache import block_cache
 from services.logging import LogService
+from services.range_fetch import DEFAULT_CONCURRENCY as DEFAULT_DOWNLOAD_CONCURRENCY, PARALLEL_THRESHOLD, \
+    fetch_ranges, read_ranges
 
 NS = {"d": "DAV:"}
 
@@ -24,6 +27,7 @@ class WebDAVAdapter:
         self.username = cfg.get("username")
         self.password = cfg.get("password")
         self.timeout = cfg.get("timeout", 15)
+        self.download_concurrency = max(1, int(cfg.get("download_concurrency") or DEFAULT_DOWNLOAD_CONCURRENCY))
 
     def get_effective_root(self, sub_path: str | None) -> str:
         base_url = self.record.config.get("base_url", "").rstrip('/') + '/'
@@ -134,14 +138,66 @@ class WebDAVAdapter:
 
         return page_entries, total_count
 
+    def _range_client(self) -> httpx.AsyncClient:
+        auth = (self.username, self.password) if self.username else None
+        return httpx.AsyncClient(auth=auth, timeout=self.timeout, follow_redirects=True,
+                                 limits=httpx.Limits(max_connections=self.download_concurrency + 1))
+
+    @staticmethod
+    def _range_fetch(client: httpx.AsyncClient, url: str):
+        async def fetch(start: int, end: int) -> bytes:
+            resp = await client.get(url, headers={"Range": f"bytes={start}-{end}"})
+            if resp.status_code == 404:
+                raise FileNotFoundError(url)
+            if resp.status_code != 206:
+                raise IOError(f"Unexpected status {resp.status_code} for range {start}-{end}")
+            return resp.content
+        return fetch
+
+    @staticmethod
+    def _range_stream(client: httpx.AsyncClient, url: str):
+        async def stream(start: int, end: int):
+            req = client.build_request("GET", url, headers={"Range": f"bytes={start}-{end}"})
+            resp = await client.send(req, stream=True)
+            try:
+                if resp.status_code == 404:
+                    raise FileNotFoundError(url)
+                if resp.status_code != 206:
+                    raise IOError(f"Unexpected status {resp.status_code} for range {start}-{end}")
+                async for chunk in resp.aiter_bytes():
+                    yield chunk
+            finally:
+                await resp.aclose()
+        return stream
+
+    def _block_fetch(self, url: str):
+        """块缓存的预取可能晚于本次响应结束，每次读取使用独立连接"""
+        async def fetch(start: int, end: int) -> bytes:
+            async with self._client() as client:
+                return await self._range_fetch(client, url)(start, end)
+        return fetch
+
     async def read_file(self, root: str, rel: str) -> bytes:
+        """首个请求只取前 PARALLEL_THRESHOLD 字节；服务端支持 Range 且文件更大时，其余部分并发分段读取"""
         url = self._build_url(rel)
-        async with self._client() as client:
-            resp = await client.get(url)
+        async with self._range_client() as client:
+            resp = await client.get(url, headers={"Range": f"bytes=0-{PARALLEL_THRESHOLD - 1}"})
             if resp.status_code == 404:
                 raise FileNotFoundError(rel)
+            if resp.status_code == 416:
+                return b""
             resp.raise_for_status()
-            return resp.content
+            head = resp.content
+            content_range = resp.headers.get("Content-Range", "")
+            if resp.status_code != 206 or "/" not in content_range:
+                # 服务端忽略了 Range，已返回完整内容
+                return head
+            total = content_range.rsplit("/", 1)[1]
+            if not total.isdigit() or int(total) <= len(head):
+                return head
+            rest = await read_ranges(self._range_fetch(client, url), len(head), int(total) - 1,
+                                     self.download_concurrency)
+            return head + rest
 
     async def write_file(self, root: str, rel: str, data: bytes):
         url = self._build_url(rel)
@@ -292,6 +348,7 @@ class WebDAVAdapter:
 
         total_size = None
         accept_ranges = False
+        version = None
         async with httpx.AsyncClient(timeout=timeout, auth=auth, follow_redirects=True) as client:
             try:
                 head_resp = await client.head(url)
@@ -303,6 +360,7 @@ class WebDAVAdapter:
                         total_size = int(cl)
                     ar = head_resp.headers.get("Accept-Ranges", "").lower()
                     accept_ranges = "bytes" in ar
+                    version = head_resp.headers.get("ETag") or head_resp.headers.get("Last-Modified")
             except HTTPException:
                 raise
             except Exception as e:
@@ -349,10 +407,6 @@ class WebDAVAdapter:
                                                   "X-VFS-Remote-Status": str(resp.status_code)},
                                          media_type=upstream_ct)
 
-        SEGMENT_SIZE = 5 * 1024 * 1024
-        MAX_RETRY_PER_SEG = 3
-        FIRST_BYTE_MAX_RETRY = 3
-
         resp_headers = {
             "Accept-Ranges": "bytes",
             "Content-Type": content_type,
@@ -362,56 +416,44 @@ class WebDAVAdapter:
             resp_headers["Content-Range"] = f"bytes {client_start}-{client_end}/{total_size}"
 
         async def segmented_body():
-            current = client_start
-            first_byte_sent = False
-            while True:
-                if client_end is not None and current > client_end:
-                    break
-                seg_start = current
-                seg_end = (min(seg_start + SEGMENT_SIZE - 1, client_end)
-                           if client_end is not None else seg_start + SEGMENT_SIZE - 1)
-                attempt = 0
-                ok = False
-                while attempt < MAX_RETRY_PER_SEG and not ok:
-                    attempt += 1
-                    headers_req = {"Range": f"bytes={seg_start}-{seg_end}"}
-                    try:
-                        async with httpx.AsyncClient(timeout=timeout, auth=auth, follow_redirects=True) as cseg:
-                            req = cseg.build_request("GET", url, headers=headers_req)
-                            rseg = await cseg.send(req, stream=True)
-                            if rseg.status_code in (200, 206):
-                                async for chunk in rseg.aiter_bytes():
-                                    if chunk:
-                                        first_byte_sent = True
-                                        yield chunk
-                                await rseg.aclose()
-                                ok = True
-                            elif rseg.status_code == 404:
-                                await rseg.aclose()
-                                if not first_byte_sent:
-                                    raise HTTPException(404, detail="File not found")
-                                return
-                            else:
-                                await rseg.aclose()
-                                logger.warning("Segment unexpected status %s %s-%s %s", rel, seg_start, seg_end, rseg.status_code)
-                        if not ok:
-                            continue
-                    except (httpx.ReadError, httpx.HTTPError, httpx.StreamError) as e:
-                        if not first_byte_sent and attempt >= FIRST_BYTE_MAX_RETRY:
-                            raise HTTPException(502, detail=f"Upstream error before first byte err={e}")
-                        logger.warning("Segment error %s %s-%s attempt=%d err=%s", rel, seg_start, seg_end, attempt, e)
-                    except Exception as e:
-                        if not first_byte_sent:
-                            raise
-                        logger.error("Segment unexpected %s %s-%s attempt=%d err=%s", rel, seg_start, seg_end, attempt, e)
-                if not ok:
-                    logger.error("Abort streaming %s at %s-%s", rel, seg_start, seg_end)
-                    break
-                current = seg_end + 1
+            if (block_cache.wants(range_header) and accept_ranges and version and total_size is not None
+                    and client_end is not None and client_end < total_size):
+                # 播放器反复探测的范围（moov、尾部索引）由本地块缓存提供
+                key = block_cache.make_key(self.record.id, rel, f"{version}|{total_size}")
+                try:
+                    async for chunk in block_cache.iter_range(key, total_size, client_start, client_end,
+                                                              self._block_fetch(url)):
+                        yield chunk
+                except FileNotFoundError:
+                    raise HTTPException(404, detail="File not found")
+                except Exception as e:
+                    logger.error("Abort streaming %s at %s-%s err=%s", rel, client_start, client_end, e)
+                return
+            async with self._range_client() as client:
                 if client_end is None:
-                    continue
-                if current > client_end:
-                    break
+                    # 总大小未知，无法切分：从起点开始单连接读取
+                    req = client.build_request("GET", url, headers={"Range": f"bytes={client_start}-"})
+                    resp = await client.send(req, stream=True)
+                    try:
+                        if resp.status_code == 404:
+                            raise HTTPException(404, detail="File not found")
+                        async for chunk in resp.aiter_bytes():
+                            if chunk:
+                                yield chunk
+                    finally:
+                        await resp.aclose()
+                    return
+                try:
+                    # 首段流式返回，确认在顺序读取后再逐步增加在途分段；分段失败时单独重试
+                    async for chunk in fetch_ranges(
+                        self._range_fetch(client, url), client_start, client_end, self.download_concurrency,
+                        stream=self._range_stream(client, url),
+                    ):
+                        yield chunk
+                except FileNotFoundError:
+                    raise HTTPException(404, detail="File not found")
+                except Exception as e:
+                    logger.error("Abort streaming %s at %s-%s err=%s", rel, client_start, client_end, e)
 
         return StreamingResponse(segmented_body(), status_code=status_code, headers=resp_headers, media_type=content_type)
 
@@ -487,14 +529,17 @@ class WebDAVAdapter:
 
     async def write_file_stream(self, root: str, rel: str, data_iter: AsyncIterator[bytes]):
         url = self._build_url(rel)
+        size = 0
         async def agen():
+            nonlocal size
             async for chunk in data_iter:
                 if chunk:
+                    size += len(chunk)
                     yield chunk
         async with self._client() as client:
             resp = await client.put(url, content=agen())
             resp.raise_for_status()
-        return True
+        return size
 
     async def copy(self, root: str, src_rel: str, dst_rel: str, overwrite: bool = False):
         src_url = self._build_url(src_rel)
@@ -528,5 +573,7 @@ CONFIG_SCHEMA = [
     {"key": "password", "label": "密码", "type": "password", "required": False},
     {"key": "timeout",
         "label": "超时(秒)", "type": "number", "required": False, "default": 15},
+    {"key": "download_concurrency", "label": "下载并发数", "type": "number",
+        "required": False, "default": DEFAULT_DOWNLOAD_CONCURRENCY},
 ]
 def ADAPTER_FACTORY(rec): return WebDAVAdapter(rec)
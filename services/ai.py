@@ -1,23 +1,229 @@
+import asyncio
+import random
+import time
 import httpx
-from typing import List
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
 from services.config import ConfigCenter
 
+# 并发的 get_text_embedding 调用在该时间窗口内合并为一次 input: [...] 请求
+EMBED_BATCH_WINDOW = 0.02
+DEFAULT_EMBED_BATCH_SIZE = 32
+DEFAULT_CONCURRENCY = 4
+MAX_RETRIES = 4
+# 读写超时说明服务端已在处理，整体重试代价高（每次等满超时），最多再试这么多次
+TIMEOUT_RETRIES = 1
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 20.0
+RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+VISION_TIMEOUT_MESSAGE = "请求超时，请稍后重试。"
+VISION_ERROR_PREFIX = "请求失败: "
 
-async def describe_image_base64(base64_image: str, detail: str = "high") -> str:
+
+def _int_config(value: Any, default: int) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class _RateLimiter:
+    """按每分钟请求数平滑限流，rpm <= 0 表示不限"""
+
+    def __init__(self):
+        self._lock = asyncio.Lock()
+        self._next_at = 0.0
+
+    async def wait(self, rpm: int):
+        if rpm <= 0:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_at - now
+            self._next_at = max(now, self._next_at) + 60.0 / rpm
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class AIClient:
+    """复用连接池的 AI 接口客户端：限并发、限速、带抖动重试，并自动合并嵌入请求。
+    embed_config 给出时不读配置中心（测试与基准脚本用）"""
+
+    def __init__(self, embed_config: Dict[str, Any] | None = None):
+        self._http: httpx.AsyncClient | None = None
+        self._semaphores: Dict[str, Tuple[int, asyncio.Semaphore]] = {}
+        self._limiters: Dict[str, _RateLimiter] = {}
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._flusher: asyncio.Task | None = None
+        self._embed_override = embed_config
+        # kind -> (配置版本, 配置)，配置写入后失效
+        self._configs: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+
+    def _client(self) -> httpx.AsyncClient:
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(
+                timeout=60.0,
+                limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+            )
+        return self._http
+
+    async def aclose(self):
+        if self._http is not None and not self._http.is_closed:
+            await self._http.aclose()
+        self._http = None
+
+    async def _cached_config(self, kind: str, load: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        cached = self._configs.get(kind)
+        if cached is not None and cached[0] == ConfigCenter.version:
+            return cached[1]
+        version = ConfigCenter.version
+        cfg = await load()
+        self._configs[kind] = (version, cfg)
+        return cfg
+
+    async def _load_embed_config(self) -> Dict[str, Any]:
+        url = await ConfigCenter.get("AI_EMBED_API_URL")
+        if url and url.endswith("chat/completions"):
+            url = url.replace("chat/completions", "embeddings")
+        return {
+            "url": url,
+            "model": await ConfigCenter.get("AI_EMBED_MODEL"),
+            "api_key": await ConfigCenter.get("AI_EMBED_API_KEY"),
+            "batch_size": max(1, _int_config(await ConfigCenter.get("AI_EMBED_BATCH_SIZE"), DEFAULT_EMBED_BATCH_SIZE)),
+            "concurrency": max(1, _int_config(await ConfigCenter.get("AI_EMBED_CONCURRENCY"), DEFAULT_CONCURRENCY)),
+            "rpm": _int_config(await ConfigCenter.get("AI_EMBED_RPM"), 0),
+            # 支持降维的模型（如 text-embedding-3）按配置维度返回向量
+            "dimensions": _int_config(await ConfigCenter.get("AI_EMBED_DIM"), 0),
+        }
+
+    async def _load_vision_config(self) -> Dict[str, Any]:
+        return {
+            "url": await ConfigCenter.get("AI_VISION_API_URL"),
+            "model": await ConfigCenter.get("AI_VISION_MODEL"),
+            "api_key": await ConfigCenter.get("AI_VISION_API_KEY"),
+            "concurrency": max(1, _int_config(await ConfigCenter.get("AI_VISION_CONCURRENCY"), DEFAULT_CONCURRENCY)),
+            "rpm": _int_config(await ConfigCenter.get("AI_VISION_RPM"), 0),
+        }
+
+    async def _embed_config(self) -> Dict[str, Any]:
+        if self._embed_override is not None:
+            return self._embed_override
+        return await self._cached_config("embed", self._load_embed_config)
+
+    async def vision_config(self) -> Dict[str, Any]:
+        return await self._cached_config("vision", self._load_vision_config)
+
+    def _semaphore(self, kind: str, concurrency: int) -> asyncio.Semaphore:
+        """并发上限变化时换用新的信号量，已在途的请求在旧信号量上自然结束"""
+        current = self._semaphores.get(kind)
+        if current is None or current[0] != concurrency:
+            current = (concurrency, asyncio.Semaphore(concurrency))
+            self._semaphores[kind] = current
+        return current[1]
+
+    async def post_json(self, kind: str, url: str, api_key: str, payload: Dict[str, Any], *,
+                        concurrency: int = DEFAULT_CONCURRENCY, rpm: int = 0, timeout: float = 60.0) -> Dict[str, Any]:
+        """发送 JSON 请求；对连接错误、429 与 5xx 按指数退避加随机抖动重试，读写超时最多重试 TIMEOUT_RETRIES 次"""
+        semaphore = self._semaphore(kind, concurrency)
+        limiter = self._limiters.setdefault(kind, _RateLimiter())
+        headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        }
+        attempt = 0
+        timeouts = 0
+        while True:
+            await limiter.wait(rpm)
+            retry_after = None
+            async with semaphore:
+                try:
+                    resp = await self._client().post(url, headers=headers, json=payload, timeout=timeout)
+                except (httpx.ReadTimeout, httpx.WriteTimeout):
+                    timeouts += 1
+                    if attempt >= MAX_RETRIES or timeouts > TIMEOUT_RETRIES:
+                        raise
+                except httpx.TransportError:
+                    if attempt >= MAX_RETRIES:
+                        raise
+                else:
+                    if resp.status_code not in RETRY_STATUS or attempt >= MAX_RETRIES:
+                        resp.raise_for_status()
+                        return resp.json()
+                    retry_after = resp.headers.get("Retry-After")
+            delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+            if retry_after and retry_after.isdigit():
+                delay = max(delay, float(retry_after))
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def embed(self, text: str) -> List[float]:
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.append((text, fut))
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_after_window())
+        return await fut
+
+    async def embed_many(self, texts: List[str]) -> List[List[float]]:
+        return list(await asyncio.gather(*(self.embed(t) for t in texts)))
+
+    async def _flush_after_window(self):
+        await asyncio.sleep(EMBED_BATCH_WINDOW)
+        pending, self._pending = self._pending, []
+        # 发送期间到达的新请求由下一个窗口处理
+        self._flusher = None
+        if not pending:
+            return
+        try:
+            cfg = await self._embed_config()
+        except Exception as e:
+            for _, fut in pending:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        size = cfg["batch_size"]
+        await asyncio.gather(*(
+            self._send_embed_batch(cfg, pending[i:i + size]) for i in range(0, len(pending), size)
+        ))
+
+    async def _send_embed_batch(self, cfg: Dict[str, Any], batch: List[Tuple[str, asyncio.Future]]):
+        texts = [text for text, _ in batch]
+        # 单条时按字符串发送，兼容不接受数组输入的嵌入服务
+        payload = {"model": cfg["model"], "input": texts[0] if len(texts) == 1 else texts}
+        if cfg["dimensions"] > 0:
+            payload["dimensions"] = cfg["dimensions"]
+        try:
+            result = await self.post_json(
+                "embed", cfg["url"], cfg["api_key"], payload,
+                concurrency=cfg["concurrency"], rpm=cfg["rpm"],
+            )
+            items = sorted(result["data"], key=lambda d: d.get("index", 0))
+            if len(items) != len(batch):
+                raise ValueError(f"Embedding response size mismatch: {len(items)} != {len(batch)}")
+            for (_, fut), item in zip(batch, items):
+                if not fut.done():
+                    fut.set_result(item["embedding"])
+        except Exception as e:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+
+
+ai_client = AIClient()
+
+
+async def describe_image_base64(base64_image: str, detail: str = "high", mime: str = "image/jpeg") -> str:
     """
     传入base64图片和文本提示，返回图片描述文本。
     """
-    OAI_API_URL = await ConfigCenter.get("AI_VISION_API_URL")
-    VISION_MODEL = await ConfigCenter.get("AI_VISION_MODEL")
-    API_KEY = await ConfigCenter.get("AI_VISION_API_KEY")
+    cfg = await ai_client.vision_config()
     payload = {
-        "model": VISION_MODEL,
+        "model": cfg["model"],
         "messages": [
             {"role": "user", "content": [
                 {
                     "type": "image_url",
                     "image_url": {
-                        "url": f"data:image/jpeg;base64,{base64_image}",
+                        "url": f"data:{mime};base64,{base64_image}",
                         "detail": detail
                     }
                 },
@@ -28,43 +234,37 @@ async def describe_image_base64(base64_image: str, detail: str = "high") -> str:
             ]}
         ]
     }
-    headers = {
-        "Authorization": f"Bearer {API_KEY}",
-        "Content-Type": "application/json"
-    }
     try:
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            resp = await client.post(OAI_API_URL, headers=headers, json=payload)
-            resp.raise_for_status()
-            result = resp.json()
-            return result["choices"][0]["message"]["content"]
+        result = await ai_client.post_json(
+            "vision", cfg["url"], cfg["api_key"], payload, concurrency=cfg["concurrency"], rpm=cfg["rpm"],
+        )
+        return result["choices"][0]["message"]["content"]
     except httpx.ReadTimeout:
-        return "请求超时，请稍后重试。"
+        return VISION_TIMEOUT_MESSAGE
     except Exception as e:
-        return f"请求失败: {str(e)}"
+        return f"{VISION_ERROR_PREFIX}{str(e)}"
+
+
+async def embedding_model_key() -> str:
+    """嵌入模型标识（含配置的维度），用于缓存键与向量集合元数据"""
+    model = await ConfigCenter.get("AI_EMBED_MODEL") or ""
+    dim = _int_config(await ConfigCenter.get("AI_EMBED_DIM"), 0)
+    return f"{model}@{dim}" if dim > 0 else model
+
+
+def is_vision_error(description: str) -> bool:
+    return description == VISION_TIMEOUT_MESSAGE or description.startswith(VISION_ERROR_PREFIX)
 
 
 async def get_text_embedding(text: str) -> List[float]:
     """
-    传入文本，返回嵌入向量。
+    传入文本，返回嵌入向量。并发调用会被合并为批量请求。
     """
-    OAI_API_URL = await ConfigCenter.get("AI_EMBED_API_URL")
-    EMBED_MODEL = await ConfigCenter.get("AI_EMBED_MODEL")
-    API_KEY = await ConfigCenter.get("AI_EMBED_API_KEY")
-    payload = {
-        "model": EMBED_MODEL,
-        "input": text
-    }
-    headers = {
-        "Authorization": f"Bearer {API_KEY}",
-        "Content-Type": "application/json"
-    }
-    async with httpx.AsyncClient() as client:
-        if OAI_API_URL.endswith("chat/completions"):
-            url = OAI_API_URL.replace("chat/completions", "embeddings")
-        else:
-            url = OAI_API_URL
-        resp = await client.post(url, headers=headers, json=payload)
-        resp.raise_for_status()
-        result = resp.json()
-        return result["data"][0]["embedding"]
+    return await ai_client.embed(text)
+
+
+async def get_text_embeddings(texts: List[str]) -> List[List[float]]:
+    """
+    批量获取文本嵌入向量，返回顺序与输入一致。
+    """
+    return await ai_client.embed_many(texts)
@@ -0,0 +1,282 @@
+import asyncio
+import fnmatch
+import hashlib
+import json
+import time
+from typing import AsyncIterator, Any, Dict, List, Tuple
+
+from fastapi.responses import Response
+
+from models.database import BatchJob
+from services.logging import LogService
+from services.processors.registry import get as get_processor
+
+LIST_PAGE_SIZE = 500
+DEFAULT_CONCURRENCY = 4
+MAX_CONCURRENCY = 32
+BATCH_SIZE = 16
+CHECKPOINT_INTERVAL = 2.0
+
+
+async def iter_dir_files(path: str, pattern: str | None = None, recursive: bool = True,
+                         exts: set[str] | None = None) -> AsyncIterator[str]:
+    """按确定顺序（名称升序、深度优先）逐页遍历目录下的文件路径，不一次性加载整棵目录树"""
+    from services.virtual_fs import list_virtual_dir
+
+    base = path.rstrip('/') or '/'
+    stack = [base]
+    while stack:
+        current = stack.pop()
+        subdirs = []
+        page_num = 1
+        while True:
+            listing = await list_virtual_dir(current, page_num, LIST_PAGE_SIZE, "name", "asc")
+            for ent in listing["items"]:
+                full = current.rstrip('/') + '/' + ent["name"]
+                if ent.get("is_dir"):
+                    if recursive:
+                        subdirs.append(full)
+                    continue
+                if exts and ent["name"].rsplit('.', 1)[-1].lower() not in exts:
+                    continue
+                if pattern:
+                    target = full[len(base):].lstrip('/') if '/' in pattern else ent["name"]
+                    if not fnmatch.fnmatch(target, pattern):
+                        continue
+                yield full
+            if page_num >= listing["pages"]:
+                break
+            page_num += 1
+        stack.extend(reversed(subdirs))
+
+
+def _result_bytes(result: Any) -> bytes:
+    if isinstance(result, Response):
+        return result.body
+    return result
+
+
+class BatchJobService:
+    @staticmethod
+    def job_key(path: str, processor_type: str, config: Dict[str, Any], pattern: str | None,
+                recursive: bool, save_to_dir: str | None, overwrite: bool) -> str:
+        raw = json.dumps(
+            [path, processor_type, config, pattern, recursive, save_to_dir, overwrite],
+            sort_keys=True, ensure_ascii=False,
+        )
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    async def submit(self, path: str, processor_type: str, config: Dict[str, Any],
+                     pattern: str | None = None, recursive: bool = True,
+                     save_to_dir: str | None = None, overwrite: bool = False,
+                     concurrency: int = DEFAULT_CONCURRENCY):
+        """提交目录批处理任务；相同参数且未完成的任务会从上次的检查点继续"""
+        from services.task_queue import task_queue_service
+
+        if not get_processor(processor_type):
+            raise ValueError(f"Processor {processor_type} not found")
+        path = '/' + path.strip('/')
+        key = self.job_key(path, processor_type, config, pattern, recursive, save_to_dir, overwrite)
+        job = await BatchJob.filter(key=key).exclude(status="success").order_by("-id").first()
+        if not job:
+            job = await BatchJob.create(
+                key=key,
+                path=path,
+                pattern=pattern,
+                recursive=recursive,
+                processor_type=processor_type,
+                processor_config=config,
+                save_to_dir=save_to_dir,
+                overwrite=overwrite,
+                concurrency=max(1, min(concurrency, MAX_CONCURRENCY)),
+            )
+        existing = task_queue_service.get_active(f"process_directory:{job.id}")
+        if existing:
+            # 同一任务正在运行：返回它，不重复执行
+            return existing
+        job.status = "pending"
+        await job.save()
+        return await task_queue_service.add_task(
+            "process_directory", {"job_id": job.id, "path": path}, key=f"process_directory:{job.id}",
+        )
+
+    async def resume_pending(self):
+        """启动时重新排队中断的目录批处理任务"""
+        from services.task_queue import task_queue_service
+
+        jobs = await BatchJob.filter(status__in=["pending", "running"])
+        for job in jobs:
+            await task_queue_service.add_task(
+                "process_directory", {"job_id": job.id, "path": job.path}, key=f"process_directory:{job.id}",
+            )
+
+    def _save_target(self, job: BatchJob, path: str) -> str | None:
+        if job.overwrite:
+            return path
+        if job.save_to_dir:
+            rel = path[len(job.path.rstrip('/')):].lstrip('/')
+            return job.save_to_dir.rstrip('/') + '/' + rel
+        return None
+
+    async def _process_stream(self, processor, job: BatchJob, path: str) -> Tuple[bool, int]:
+        from services.virtual_fs import read_file_stream, run_processor
+
+        size = 0
+
+        async def counted():
+            nonlocal size
+            async for chunk in read_file_stream(path):
+                size += len(chunk)
+                yield chunk
+
+        try:
+            await run_processor(processor, path, job.processor_config, self._save_target(job, path), chunks=counted())
+            return True, size
+        except Exception as e:
+            await LogService.warning("batch_jobs", f"Processing failed for {path}: {e}", {"job_id": job.id})
+            return False, size
+
+    async def _process(self, processor, job: BatchJob, paths: List[str]) -> List[Tuple[bool, int]]:
+        from services.virtual_fs import read_file, write_file
+
+        if len(paths) == 1 and callable(getattr(processor, "process_stream", None)):
+            return [await self._process_stream(processor, job, paths[0])]
+
+        outcome: Dict[str, Tuple[bool, int]] = {}
+        items = []
+        for path in paths:
+            try:
+                items.append((await read_file(path), path))
+            except Exception as e:
+                outcome[path] = (False, 0)
+                await LogService.warning("batch_jobs", f"Read failed for {path}: {e}", {"job_id": job.id})
+
+        if items:
+            try:
+                if len(items) > 1:
+                    results = await processor.process_batch(items, job.processor_config)
+                else:
+                    results = [await processor.process(items[0][0], items[0][1], job.processor_config)]
+                for (data, path), result in zip(items, results):
+                    save_to = self._save_target(job, path)
+                    if save_to and getattr(processor, "produces_file", False):
+                        await write_file(save_to, _result_bytes(result))
+                    outcome[path] = (True, len(data))
+            except Exception as e:
+                for data, path in items:
+                    outcome.setdefault(path, (False, 0))
+                await LogService.warning(
+                    "batch_jobs", f"Processing failed for {len(items)} files: {e}",
+                    {"job_id": job.id, "paths": [p for _, p in items]},
+                )
+        return [outcome[p] for p in paths]
+
+    async def run(self, task) -> Dict[str, Any]:
+        job = await BatchJob.get(id=task.task_info["job_id"])
+        processor = get_processor(job.processor_type)
+        if not processor:
+            raise ValueError(f"Processor {job.processor_type} not found")
+
+        exts = {e.lower() for e in (getattr(processor, "supported_exts", None) or [])}
+        batch_size = BATCH_SIZE if callable(getattr(processor, "process_batch", None)) else 1
+        concurrency = max(1, min(job.concurrency, MAX_CONCURRENCY))
+        queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+        completed: set[int] = set(job.done_after or [])
+        skipped = set(completed)
+        state = {"watermark": job.done_count, "seen": 0, "files": 0, "bytes": 0, "saved_at": time.monotonic()}
+        started = time.monotonic()
+
+        def report():
+            elapsed = max(time.monotonic() - started, 1e-6)
+            task.progress = {
+                "job_id": job.id,
+                "processed": job.processed,
+                "failed": job.failed,
+                "done": state["watermark"],
+                "seen": state["seen"],
+                "elapsed": round(elapsed, 1),
+                "files_per_sec": round(state["files"] / elapsed, 2),
+                "bytes_per_sec": int(state["bytes"] / elapsed),
+            }
+
+        async def checkpoint(force: bool = False):
+            now = time.monotonic()
+            if not force and now - state["saved_at"] < CHECKPOINT_INTERVAL:
+                return
+            state["saved_at"] = now
+            job.done_count = state["watermark"]
+            job.done_after = sorted(completed) or None
+            await job.save()
+
+        async def producer():
+            batch = []
+            async for path in iter_dir_files(job.path, job.pattern, job.recursive, exts):
+                index = state["seen"]
+                state["seen"] += 1
+                if index < job.done_count or index in skipped:
+                    continue
+                batch.append((index, path))
+                if len(batch) >= batch_size:
+                    await queue.put(batch)
+                    batch = []
+            if batch:
+                await queue.put(batch)
+
+        async def worker():
+            while True:
+                batch = await queue.get()
+                if batch is None:
+                    return
+                outcomes = await self._process(processor, job, [p for _, p in batch])
+                for (index, _), (ok, size) in zip(batch, outcomes):
+                    if ok:
+                        job.processed += 1
+                    else:
+                        job.failed += 1
+                    job.bytes_processed += size
+                    state["files"] += 1
+                    state["bytes"] += size
+                    completed.add(index)
+                while state["watermark"] in completed:
+                    completed.remove(state["watermark"])
+                    state["watermark"] += 1
+                report()
+                await checkpoint()
+
+        job.status = "running"
+        job.error = None
+        await job.save()
+        await LogService.info(
+            "batch_jobs", f"Batch job {job.id} started on {job.path}",
+            {"job_id": job.id, "processor_type": job.processor_type, "resume_from": job.done_count},
+        )
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        try:
+            await producer()
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        except asyncio.CancelledError:
+            # 服务停止：保留 running 状态与检查点，下次启动时续跑
+            for w in workers:
+                w.cancel()
+            await checkpoint(force=True)
+            raise
+        except Exception as e:
+            for w in workers:
+                w.cancel()
+            job.status = "failed"
+            job.error = str(e) or e.__class__.__name__
+            await checkpoint(force=True)
+            raise
+
+        job.status = "success"
+        await checkpoint(force=True)
+        report()
+        await LogService.info(
+            "batch_jobs", f"Batch job {job.id} finished", {"job_id": job.id, **task.progress},
+        )
+        return task.progress
+
+
+batch_job_service = BatchJobService()
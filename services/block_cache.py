@@ -0,0 +1,213 @@
+import asyncio
+import hashlib
+import os
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict
+
+from services.range_fetch import RangeFetch
+
+CACHE_ROOT = Path(os.getenv("BLOCK_CACHE_DIR", "data/.block_cache"))
+BLOCK_SIZE = int(os.getenv("BLOCK_CACHE_BLOCK_MB", "2")) * 1024 * 1024
+# 缓存总容量，设为 0 时关闭块缓存，流式读取直接走上游
+MAX_BYTES = int(os.getenv("BLOCK_CACHE_MAX_MB", "2048")) * 1024 * 1024
+# 顺序读取时领先当前块预取的块数
+READ_AHEAD = int(os.getenv("BLOCK_CACHE_READ_AHEAD", "2"))
+# 记录最近读取位置的文件数，用于判断是否为顺序读取
+RECENT_SIZE = 1024
+
+
+class BlockCache:
+    """远端文件的磁盘块缓存：按固定大小分块，键为 适配器/路径/版本；LRU 淘汰，
+    同一块的并发请求合并为一次上游读取，顺序读取时预取后续块"""
+
+    def __init__(self, root: Path = CACHE_ROOT, block_size: int = BLOCK_SIZE, max_bytes: int = MAX_BYTES,
+                 read_ahead: int = READ_AHEAD):
+        self.root = root
+        self.block_size = block_size
+        self.max_bytes = max_bytes
+        self.read_ahead = max(0, read_ahead)
+        self._lru: "OrderedDict[str, int]" = OrderedDict()
+        self._total = 0
+        self._loaded = False
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._recent: "OrderedDict[str, int]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.prefetched = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 and self.block_size > 0
+
+    def wants(self, range_header: str | None) -> bool:
+        """只为客户端带 Range 的请求（播放器探测、拖动）走缓存；整文件读取（传输、校验、索引）
+        直接读上游，避免冲掉缓存里的热点块"""
+        return self.enabled and bool(range_header)
+
+    @staticmethod
+    def make_key(adapter_id: Any, path: str, version: Any) -> str:
+        """version 取 etag，没有时用 大小+修改时间 等能反映内容变化的值"""
+        return hashlib.sha1(f"{adapter_id}|{path}|{version}".encode()).hexdigest()
+
+    def _block_path(self, name: str) -> Path:
+        return self.root / name[:2] / name
+
+    def _load(self):
+        """首次使用时按修改时间恢复已有块的 LRU 顺序"""
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.root.exists():
+            return
+        blocks = []
+        for p in self.root.glob("*/*"):
+            if p.name.endswith(".tmp"):
+                p.unlink(missing_ok=True)
+                continue
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            blocks.append((st.st_mtime, p.name, st.st_size))
+        for _, name, size in sorted(blocks):
+            self._lru[name] = size
+            self._total += size
+        self._evict()
+
+    def _evict(self):
+        while self._total > self.max_bytes and self._lru:
+            name, size = self._lru.popitem(last=False)
+            self._total -= size
+            self.evictions += 1
+            self._block_path(name).unlink(missing_ok=True)
+
+    async def _read_cached(self, name: str) -> bytes | None:
+        if name not in self._lru:
+            return None
+        try:
+            data = await asyncio.to_thread(self._block_path(name).read_bytes)
+        except OSError:
+            # 块文件已被淘汰或外部删除
+            if name in self._lru:
+                self._total -= self._lru.pop(name)
+            return None
+        if name in self._lru:
+            self._lru.move_to_end(name)
+        return data
+
+    def _write_block(self, name: str, data: bytes):
+        path = self._block_path(name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+    async def _fill(self, name: str, index: int, size: int, fetch: RangeFetch) -> bytes:
+        start = index * self.block_size
+        end = min(start + self.block_size, size) - 1
+        data = await fetch(start, end)
+        if len(data) != end - start + 1:
+            raise IOError(f"Short block read {start}-{end}: got {len(data)} bytes")
+        await asyncio.to_thread(self._write_block, name, data)
+        if name in self._lru:
+            self._total -= self._lru[name]
+        self._lru[name] = len(data)
+        self._total += len(data)
+        self._evict()
+        return data
+
+    def _spawn(self, name: str, index: int, size: int, fetch: RangeFetch) -> asyncio.Task:
+        task = asyncio.create_task(self._fill(name, index, size, fetch))
+        self._inflight[name] = task
+
+        def done(t: asyncio.Task):
+            self._inflight.pop(name, None)
+            # 无人等待的预取失败时不报 "exception was never retrieved"
+            if not t.cancelled():
+                t.exception()
+
+        task.add_done_callback(done)
+        return task
+
+    async def _get_block(self, key: str, index: int, size: int, fetch: RangeFetch) -> bytes:
+        name = f"{key}_{index}"
+        task = self._inflight.get(name)
+        if task is None:
+            data = await self._read_cached(name)
+            if data is not None:
+                self.hits += 1
+                return data
+            task = self._inflight.get(name)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = self._spawn(name, index, size, fetch)
+        # 单个请求断开不取消共享的上游读取，读完的块仍会写入缓存
+        return await asyncio.shield(task)
+
+    def _prefetch(self, key: str, index: int, size: int, fetch: RangeFetch):
+        name = f"{key}_{index}"
+        if index * self.block_size >= size or name in self._inflight or name in self._lru:
+            return
+        self.prefetched += 1
+        self._spawn(name, index, size, fetch)
+
+    async def iter_range(self, key: str, size: int, start: int, end: int,
+                         fetch: RangeFetch) -> AsyncIterator[bytes]:
+        """按块产出 [start, end] 的字节。fetch 在本次迭代结束后仍可能被预取调用，
+        不能依赖调用方随迭代关闭的连接"""
+        self._load()
+        first = start // self.block_size
+        last = end // self.block_size
+        # 紧接上次读取位置的请求视为顺序播放，预取越过本次请求的末尾
+        previous = self._recent.get(key)
+        sequential = previous is not None and previous in (first - 1, first)
+        for index in range(first, last + 1):
+            ahead = index + self.read_ahead
+            for i in range(index + 1, (ahead if sequential else min(ahead, last)) + 1):
+                self._prefetch(key, i, size, fetch)
+            data = await self._get_block(key, index, size, fetch)
+            self._recent[key] = index
+            self._recent.move_to_end(key)
+            while len(self._recent) > RECENT_SIZE:
+                self._recent.popitem(last=False)
+            block_start = index * self.block_size
+            lo = max(start - block_start, 0)
+            hi = min(end - block_start + 1, len(data))
+            yield data[lo:hi] if lo or hi < len(data) else data
+
+    async def read(self, key: str, size: int, start: int, end: int, fetch: RangeFetch) -> bytes:
+        return b"".join([chunk async for chunk in self.iter_range(key, size, start, end, fetch)])
+
+    def clear(self):
+        self._load()
+        for name in list(self._lru):
+            self._block_path(name).unlink(missing_ok=True)
+        self._lru.clear()
+        self._total = 0
+        self._recent.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        self._load()
+        total = self.hits + self.misses + self.coalesced
+        return {
+            "enabled": self.enabled,
+            "block_size": self.block_size,
+            "max_bytes": self.max_bytes,
+            "bytes": self._total,
+            "blocks": len(self._lru),
+            "in_flight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "prefetched": self.prefetched,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.coalesced) / total, 4) if total else None,
+        }
+
+
+block_cache = BlockCache()
@@ -8,6 +8,8 @@ VERSION = "v1.2.3"
 
 class ConfigCenter:
     _cache: Dict[str, Any] = {}
+    # 每次写入或清空缓存时递增，供按配置推导的派生缓存判断是否过期
+    version = 0
     @classmethod
     async def get(cls, key: str, default: Optional[Any] = None) -> Any:
         if key in cls._cache:
@@ -43,6 +45,7 @@ class ConfigCenter:
         obj.value = value
         await obj.save()
         cls._cache[key] = value
+        cls.version += 1
 
     @classmethod
     async def get_all(cls) -> Dict[str, Any]:
@@ -59,3 +62,4 @@ class ConfigCenter:
     @classmethod
     def clear_cache(cls):
         cls._cache.clear()
+        cls.version += 1
@@ -0,0 +1,419 @@
+import asyncio
+import time
+from typing import Any, Dict, List, Tuple
+
+from tortoise import timezone
+from tortoise.expressions import Q
+
+from models.database import CatalogEntry, CrawlState, StorageAdapter
+from services.adapters.registry import runtime_registry
+from services.config import ConfigCenter
+from services.events import FileEvent, file_event_bus
+from services.filename_index import filename_index
+from services.logging import LogService
+
+LIST_PAGE_SIZE = 500
+APPLY_BATCH_SIZE = 500
+CHECKPOINT_INTERVAL = 2.0
+DEFAULT_INTERVAL = 3600
+DEFAULT_CONCURRENCY = 4
+POLL_INTERVAL = 60
+
+
+def _join(base: str, rel: str) -> str:
+    rel = rel.strip('/')
+    if not rel:
+        return base
+    return base.rstrip('/') + '/' + rel
+
+
+def _split(path: str) -> Tuple[str, str]:
+    parent, _, name = path.rpartition('/')
+    return parent or '/', name
+
+
+def _int_config(value: Any, default: int) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class _CrawlPass:
+    """单次遍历的上下文"""
+
+    def __init__(self, adapter_model: StorageAdapter, state: CrawlState, emit: bool):
+        self.adapter_id = adapter_model.id
+        self.mount = '/' + adapter_model.path.strip('/')
+        self.state = state
+        self.gen = state.gen
+        self.emit = emit
+        self.started = time.time()
+        self.saved_at = time.monotonic()
+        self.stats = {"entries": 0, "created": 0, "modified": 0, "deleted": 0, "errors": 0}
+
+
+class CrawlerService:
+    """后台增量遍历各挂载点，维护文件目录快照（catalog）并把检测到的变更作为文件事件发出"""
+
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+        self._active: Dict[int, asyncio.Task] = {}
+        # 经 Foxel 自身写入的路径及时间，遍历检测到这些变更时不再重复发出事件
+        self._local_changes: Dict[str, float] = {}
+        # 正在由遍历发出的事件路径，本地变更监听器据此忽略它们
+        self._emitting: set[str] = set()
+
+    # ---- 变更检测 ----
+
+    def _is_local(self, path: str) -> bool:
+        current = path
+        while current:
+            if current in self._local_changes:
+                return True
+            current = current.rpartition('/')[0]
+        return False
+
+    @staticmethod
+    def _modified(row: CatalogEntry, entry: Dict[str, Any]) -> bool:
+        if row.etag and entry.get("etag"):
+            return row.etag != entry["etag"]
+        return row.size != (entry.get("size") or 0) or row.mtime != (entry.get("mtime") or 0)
+
+    async def _emit(self, ctx: _CrawlPass, event: str, path: str, src: str | None = None):
+        if not ctx.emit or self._is_local(path):
+            return
+        self._emitting.add(path)
+        try:
+            await file_event_bus.emit(event, path, src=src)
+        finally:
+            self._emitting.discard(path)
+
+    async def _apply(self, ctx: _CrawlPass, entries: List[Dict[str, Any]]):
+        """与快照比对一批条目：新增、修改写入 catalog 并发出 file_written，未变化的只更新代数"""
+        if not entries:
+            return
+        by_path = {e["path"]: e for e in entries}
+        existing = {
+            row.path: row
+            for row in await CatalogEntry.filter(adapter_id=ctx.adapter_id, path__in=list(by_path))
+        }
+        created, changed, unchanged, written = [], [], [], []
+        for path, e in by_path.items():
+            row = existing.get(path)
+            size, mtime = e.get("size") or 0, e.get("mtime") or 0
+            if row is None:
+                parent, name = _split(path)
+                created.append(CatalogEntry(
+                    adapter_id=ctx.adapter_id, path=path, parent=parent, name=name, is_dir=bool(e["is_dir"]),
+                    size=size, mtime=mtime, etag=e.get("etag"), remote_id=e.get("remote_id"), gen=ctx.gen,
+                ))
+                if not e["is_dir"]:
+                    written.append(path)
+                continue
+            modified = not e["is_dir"] and self._modified(row, e)
+            if modified or row.is_dir != bool(e["is_dir"]) or row.remote_id != e.get("remote_id", row.remote_id):
+                row.is_dir = bool(e["is_dir"])
+                row.size, row.mtime, row.etag = size, mtime, e.get("etag")
+                row.remote_id = e.get("remote_id", row.remote_id)
+                row.gen = ctx.gen
+                changed.append(row)
+                if modified:
+                    written.append(path)
+            else:
+                unchanged.append(row.id)
+
+        if created:
+            await CatalogEntry.bulk_create(created)
+        if changed:
+            await CatalogEntry.bulk_update(changed, fields=["is_dir", "size", "mtime", "etag", "remote_id", "gen"])
+        if unchanged:
+            await CatalogEntry.filter(id__in=unchanged).update(gen=ctx.gen)
+        await filename_index.upsert([
+            {"path": p, "is_dir": e["is_dir"], "size": e.get("size"), "mtime": e.get("mtime")}
+            for p, e in by_path.items()
+        ])
+
+        ctx.stats["entries"] += len(by_path)
+        ctx.stats["created"] += len(created)
+        ctx.stats["modified"] += len(written) - sum(1 for r in created if not r.is_dir)
+        for path in written:
+            await self._emit(ctx, "file_written", path)
+
+    async def _remove(self, ctx: _CrawlPass, paths: List[str]):
+        """删除条目及其子项并发出 file_deleted（只针对最上层路径）"""
+        removed = set(paths)
+        for path in sorted(removed):
+            if _split(path)[0] in removed:
+                continue
+            await CatalogEntry.filter(
+                Q(adapter_id=ctx.adapter_id) & (Q(path=path) | Q(path__startswith=path.rstrip('/') + '/'))
+            ).delete()
+            await filename_index.delete(path)
+            ctx.stats["deleted"] += 1
+            await self._emit(ctx, "file_deleted", path)
+
+    async def _prune(self, ctx: _CrawlPass):
+        """完整遍历结束后，未再出现的条目视为已删除"""
+        stale = await CatalogEntry.filter(adapter_id=ctx.adapter_id, gen__lt=ctx.gen).values_list("path", flat=True)
+        if stale:
+            await self._remove(ctx, list(stale))
+
+    async def _checkpoint(self, ctx: _CrawlPass, cursor: Dict[str, Any] | None, force: bool = False):
+        now = time.monotonic()
+        if not force and now - ctx.saved_at < CHECKPOINT_INTERVAL:
+            return
+        ctx.saved_at = now
+        ctx.state.cursor = cursor
+        ctx.state.stats = ctx.stats
+        await ctx.state.save()
+
+    # ---- 遍历策略 ----
+
+    async def _crawl_tree(self, ctx: _CrawlPass, adapter, root: str, cursor: Dict[str, Any] | None):
+        """通用策略：逐目录分页列举，有界并发；断点为待遍历目录集合"""
+        concurrency = max(1, _int_config(await ConfigCenter.get("CRAWLER_CONCURRENCY"), DEFAULT_CONCURRENCY))
+        queue: asyncio.Queue = asyncio.Queue()
+        pending: set[str] = set()
+        for rel in (cursor or {}).get("pending") or [""]:
+            pending.add(rel)
+            queue.put_nowait(rel)
+
+        async def worker():
+            while True:
+                rel = await queue.get()
+                try:
+                    page_num = 1
+                    while True:
+                        items, total = await adapter.list_dir(root, rel, page_num, LIST_PAGE_SIZE, "name", "asc")
+                        entries = []
+                        for ent in items:
+                            child = f"{rel}/{ent['name']}".strip('/')
+                            entries.append({
+                                "path": _join(ctx.mount, child), "is_dir": bool(ent.get("is_dir")),
+                                "size": ent.get("size"), "mtime": ent.get("mtime"), "etag": ent.get("etag"),
+                            })
+                            if ent.get("is_dir"):
+                                pending.add(child)
+                                queue.put_nowait(child)
+                        await self._apply(ctx, entries)
+                        if page_num * LIST_PAGE_SIZE >= total or not items:
+                            break
+                        page_num += 1
+                except Exception as e:
+                    ctx.stats["errors"] += 1
+                    await LogService.warning(
+                        "crawler", f"Failed to list {_join(ctx.mount, rel)}: {e}", {"adapter_id": ctx.adapter_id},
+                    )
+                finally:
+                    pending.discard(rel)
+                    queue.task_done()
+                    await self._checkpoint(ctx, {"pending": sorted(pending)})
+
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        try:
+            await queue.join()
+        finally:
+            for w in workers:
+                w.cancel()
+            # 中断时保存仍待遍历的目录（含正在遍历的），恢复后重新列举它们
+            if pending:
+                await self._checkpoint(ctx, {"pending": sorted(pending)}, force=True)
+
+    async def _crawl_walk(self, ctx: _CrawlPass, adapter, root: str, cursor: Dict[str, Any] | None):
+        """平铺列举策略（如 S3 的 StartAfter 标记）：按 key 顺序遍历，断点为最后处理的 key"""
+        seen_dirs: set[str] = set()
+        batch: Dict[str, Dict[str, Any]] = {}
+        marker = (cursor or {}).get("marker")
+
+        async def flush(last_marker):
+            await self._apply(ctx, list(batch.values()))
+            batch.clear()
+            await self._checkpoint(ctx, {"marker": last_marker})
+
+        async for item in adapter.walk_files(root, marker):
+            parts = item["path"].split('/')
+            # 对象存储中目录是隐式的，由 key 前缀推出
+            for i in range(1, len(parts)):
+                rel_dir = '/'.join(parts[:i])
+                if rel_dir not in seen_dirs:
+                    seen_dirs.add(rel_dir)
+                    batch[rel_dir] = {"path": _join(ctx.mount, rel_dir), "is_dir": True}
+            if item["is_dir"]:
+                seen_dirs.add(item["path"])
+            batch[item["path"]] = {**item, "path": _join(ctx.mount, item["path"])}
+            if len(batch) >= APPLY_BATCH_SIZE:
+                marker = item["marker"]
+                await flush(marker)
+        if batch:
+            await flush(marker)
+
+    # ---- 调度 ----
+
+    async def crawl(self, adapter_id: int) -> Dict[str, Any]:
+        """遍历一个挂载点；上次中断的遍历从断点继续"""
+        adapter_model = await StorageAdapter.get_or_none(id=adapter_id, enabled=True)
+        if not adapter_model:
+            raise ValueError(f"Adapter {adapter_id} not found or disabled")
+        adapter = runtime_registry.get(adapter_id)
+        if not adapter:
+            await runtime_registry.refresh()
+            adapter = runtime_registry.get(adapter_id)
+            if not adapter:
+                raise ValueError(f"Adapter instance for ID {adapter_id} not loaded")
+        root = adapter.get_effective_root(adapter_model.sub_path)
+
+        state, _ = await CrawlState.get_or_create(adapter_id=adapter_id)
+        if callable(getattr(adapter, "walk_files", None)):
+            strategy = "walk"
+        else:
+            strategy = "tree"
+        resume = state.status == "running" and state.cursor and state.strategy == strategy
+        if not resume:
+            state.gen += 1
+            state.cursor = None
+        state.strategy = strategy
+        state.status = "running"
+        state.error = None
+        state.started_at = timezone.now()
+        await state.save()
+
+        # 首次遍历只建立快照；此后检测到的变更才作为文件事件发出，适配器自己发出变更事件时不再重复
+        emit = state.finished_at is not None and not getattr(adapter, "emits_changes", False)
+        ctx = _CrawlPass(adapter_model, state, emit=emit)
+        await LogService.info(
+            "crawler", f"Crawling {ctx.mount} ({strategy})",
+            {"adapter_id": adapter_id, "gen": ctx.gen, "resume": bool(resume)},
+        )
+        try:
+            if strategy == "walk":
+                await self._crawl_walk(ctx, adapter, root, state.cursor)
+            else:
+                await self._crawl_tree(ctx, adapter, root, state.cursor)
+            # 有目录列举失败时不清理，避免误判为删除
+            if not ctx.stats["errors"]:
+                await self._prune(ctx)
+        except asyncio.CancelledError:
+            state.stats = ctx.stats
+            await state.save()
+            raise
+        except Exception as e:
+            state.status = "failed"
+            state.error = str(e) or e.__class__.__name__
+            state.stats = ctx.stats
+            await state.save()
+            await LogService.error("crawler", f"Crawl of {ctx.mount} failed: {e}", {"adapter_id": adapter_id})
+            raise
+
+        state.status = "idle"
+        state.cursor = None
+        state.stats = ctx.stats
+        state.finished_at = timezone.now()
+        await state.save()
+        for path, at in list(self._local_changes.items()):
+            if at < ctx.started and (path == ctx.mount or path.startswith(ctx.mount.rstrip('/') + '/')):
+                self._local_changes.pop(path, None)
+        await LogService.info("crawler", f"Crawled {ctx.mount}", {"adapter_id": adapter_id, **ctx.stats})
+        return ctx.stats
+
+    async def _crawl_safe(self, adapter_id: int):
+        if adapter_id in self._active and not self._active[adapter_id].done():
+            return
+        task = asyncio.create_task(self.crawl(adapter_id))
+        self._active[adapter_id] = task
+        try:
+            await task
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            pass
+        finally:
+            self._active.pop(adapter_id, None)
+
+    async def enabled(self) -> bool:
+        return _int_config(await ConfigCenter.get("CRAWLER_INTERVAL", DEFAULT_INTERVAL), DEFAULT_INTERVAL) > 0
+
+    async def repopulate(self):
+        """文件名索引为空时由遍历填充：每次遍历都会重新写入全部条目，这里立即遍历全部挂载点"""
+        # 遍历只写入挂载点下的条目，挂载点目录本身在这里补上
+        await filename_index.upsert([
+            {"path": '/' + a.path.strip('/'), "is_dir": True} for a in await StorageAdapter.filter(enabled=True)
+        ])
+        self.run_now()
+
+    def run_now(self, adapter_id: int | None = None):
+        """立即在后台遍历指定挂载点（为空时遍历全部）"""
+
+        async def run():
+            ids = [adapter_id] if adapter_id else [a.id for a in await StorageAdapter.filter(enabled=True)]
+            for aid in ids:
+                await self._crawl_safe(aid)
+
+        asyncio.create_task(run())
+
+    async def status(self) -> List[Dict[str, Any]]:
+        states = {s.adapter_id: s for s in await CrawlState.all()}
+        result = []
+        for a in await StorageAdapter.all():
+            s = states.get(a.id)
+            result.append({
+                "adapter_id": a.id,
+                "path": a.path,
+                "status": s.status if s else "idle",
+                "strategy": s.strategy if s else None,
+                "running": a.id in self._active,
+                "stats": s.stats if s else None,
+                "error": s.error if s else None,
+                "finished_at": s.finished_at if s else None,
+            })
+        return result
+
+    async def _loop(self):
+        # 先续跑上次中断的遍历
+        for state in await CrawlState.filter(status="running"):
+            await self._crawl_safe(state.adapter_id)
+        while True:
+            interval = _int_config(await ConfigCenter.get("CRAWLER_INTERVAL", DEFAULT_INTERVAL), DEFAULT_INTERVAL)
+            if interval > 0:
+                now = timezone.now()
+                for a in await StorageAdapter.filter(enabled=True):
+                    state = await CrawlState.get_or_none(adapter_id=a.id)
+                    if state and state.finished_at and (now - state.finished_at).total_seconds() < interval:
+                        continue
+                    await self._crawl_safe(a.id)
+            await asyncio.sleep(POLL_INTERVAL)
+
+    async def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        tasks = [t for t in [self._task, *self._active.values()] if t and not t.done()]
+        for t in tasks:
+            t.cancel()
+        for t in tasks:
+            try:
+                await t
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._task = None
+        self._active.clear()
+
+    # ---- 本地变更 ----
+
+    async def _on_file_event(self, ev: FileEvent):
+        """Foxel 自身的删除、移动直接同步到 catalog，写入记为本地变更，避免下次遍历时重复发出事件"""
+        if ev.path in self._emitting:
+            return
+        removed = ev.src if ev.event == "file_moved" else ev.path if ev.event == "file_deleted" else None
+        if removed:
+            # 移动可能跨挂载点，源条目直接删除，目标由下次遍历作为本地变更补录
+            await CatalogEntry.filter(Q(path=removed) | Q(path__startswith=removed.rstrip('/') + '/')).delete()
+        if ev.event != "file_deleted":
+            self._local_changes[ev.path] = time.time()
+
+
+crawler_service = CrawlerService()
+
+for _event in ("file_written", "file_deleted", "file_moved", "file_copied"):
+    file_event_bus.subscribe(_event, crawler_service._on_file_event)
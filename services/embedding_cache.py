@@ -0,0 +1,53 @@
+import hashlib
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from models.database import EmbeddingCache
+
+
+class EmbeddingCacheService:
+    """按内容哈希 + 模型名缓存描述与嵌入向量，重复上传、复制的文件无需再次调用模型"""
+
+    @staticmethod
+    def content_hash(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    @staticmethod
+    def _pack(embedding: List[float]) -> bytes:
+        return array("f", embedding).tobytes()
+
+    @staticmethod
+    def _unpack(raw: bytes) -> List[float]:
+        values = array("f")
+        values.frombytes(raw)
+        return values.tolist()
+
+    async def get(self, content_hash: str, model: str) -> Optional[Tuple[str | None, List[float]]]:
+        entry = await EmbeddingCache.get_or_none(content_hash=content_hash, model=model)
+        if not entry:
+            return None
+        return entry.description, self._unpack(entry.embedding)
+
+    async def get_many(self, content_hashes: List[str], model: str) -> Dict[str, List[float]]:
+        """批量查询嵌入向量，返回命中的 {内容哈希: 向量}"""
+        if not content_hashes:
+            return {}
+        entries = await EmbeddingCache.filter(content_hash__in=list(set(content_hashes)), model=model)
+        return {e.content_hash: self._unpack(e.embedding) for e in entries}
+
+    async def get_description(self, content_hash: str, model_prefix: str) -> str | None:
+        """按视觉模型复用已有描述：仅更换嵌入模型时无需重新描述图片"""
+        entry = await EmbeddingCache.filter(
+            content_hash=content_hash, model__startswith=model_prefix, description__isnull=False,
+        ).first()
+        return entry.description if entry else None
+
+    async def put(self, content_hash: str, model: str, description: str | None, embedding: List[float]):
+        await EmbeddingCache.update_or_create(
+            content_hash=content_hash,
+            model=model,
+            defaults={"description": description, "embedding": self._pack(embedding)},
+        )
+
+
+embedding_cache = EmbeddingCacheService()
@@ -0,0 +1,112 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from pydantic import BaseModel
+
+from services.config import ConfigCenter
+from services.logging import LogService
+
+DEFAULT_DEBOUNCE_MS = 1500
+
+
+class FileEvent(BaseModel):
+    event: str
+    path: str
+    src: Optional[str] = None
+
+
+class FileEventBus:
+    """文件事件总线：按路径去抖、合并事件，并按批次投递给自动化任务"""
+
+    def __init__(self):
+        self._pending: Dict[str, FileEvent] = {}
+        self._deadlines: Dict[str, float] = {}
+        self._flusher: asyncio.Task | None = None
+        self._listeners: Dict[str, List[Callable[["FileEvent"], Awaitable[None]]]] = {}
+
+    def subscribe(self, event: str, callback: Callable[["FileEvent"], Awaitable[None]]):
+        """注册即时监听器：在事件发出时立即调用，不经过去抖与合并"""
+        self._listeners.setdefault(event, []).append(callback)
+
+    async def _notify(self, ev: "FileEvent"):
+        for callback in self._listeners.get(ev.event, []):
+            try:
+                await callback(ev)
+            except Exception as e:
+                await LogService.error(
+                    "file_events", f"File event listener failed: {e}",
+                    details={"event": ev.event, "path": ev.path, "src": ev.src},
+                )
+
+    async def _window(self) -> float:
+        value = await ConfigCenter.get("FILE_EVENT_DEBOUNCE_MS", DEFAULT_DEBOUNCE_MS)
+        try:
+            return max(0, int(value)) / 1000
+        except (TypeError, ValueError):
+            return DEFAULT_DEBOUNCE_MS / 1000
+
+    async def emit(self, event: str, path: str, src: str | None = None):
+        window = await self._window()
+        new = FileEvent(event=event, path=path, src=src)
+        await self._notify(new)
+        if event == "file_moved" and src:
+            # 典型的 WebDAV 上传：先写临时文件再改名，源路径上尚未投递的写入事件转移到目标路径
+            src_pending = self._pending.pop(src, None)
+            self._deadlines.pop(src, None)
+            if src_pending and src_pending.event == "file_written":
+                new = FileEvent(event="file_written", path=path)
+
+        # 同一路径在窗口内以最后一次事件为准：写入后删除只投递删除，删除后写入只投递写入
+        self._pending[path] = new
+        self._deadlines[path] = time.monotonic() + window
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while self._deadlines:
+            now = time.monotonic()
+            due = [p for p, d in self._deadlines.items() if d <= now]
+            if not due:
+                await asyncio.sleep(min(self._deadlines.values()) - now)
+                continue
+            events = []
+            for path in due:
+                self._deadlines.pop(path, None)
+                ev = self._pending.pop(path, None)
+                if ev:
+                    events.append(ev)
+            await self._dispatch(events)
+
+    async def _dispatch(self, events: List[FileEvent]):
+        from services.tasks import task_service
+
+        if not events:
+            return
+        try:
+            await task_service.dispatch_events(events)
+        except Exception as e:
+            await LogService.error(
+                "file_events", f"Failed to dispatch file events: {e}",
+                details={"count": len(events)},
+            )
+
+    async def flush(self):
+        """立即投递所有待处理事件"""
+        events = list(self._pending.values())
+        self._pending.clear()
+        self._deadlines.clear()
+        await self._dispatch(events)
+
+    async def stop(self):
+        if self._flusher and not self._flusher.done():
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+        self._flusher = None
+        await self.flush()
+
+
+file_event_bus = FileEventBus()
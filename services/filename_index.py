@@ -0,0 +1,391 @@
+import asyncio
+import difflib
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from services.events import FileEvent, file_event_bus
+from services.logging import LogService
+
+DB_PATH = "data/db/filename_index.db"
+CRAWL_CONCURRENCY = 4
+CRAWL_PAGE_SIZE = 500
+WRITE_BATCH_SIZE = 500
+FUZZY_CANDIDATES = 500
+FUZZY_MIN_SCORE = 0.3
+_MAX_CHAR = "\U0010ffff"
+
+_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS files (
+        id INTEGER PRIMARY KEY,
+        path TEXT NOT NULL UNIQUE,
+        name_lower TEXT NOT NULL,
+        is_dir INTEGER NOT NULL DEFAULT 0,
+        size INTEGER,
+        mtime INTEGER,
+        gen INTEGER NOT NULL DEFAULT 0
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_files_name ON files(name_lower)",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5(path, content='files', content_rowid='id', tokenize='trigram')",
+    """CREATE TRIGGER IF NOT EXISTS files_ai AFTER INSERT ON files BEGIN
+        INSERT INTO files_fts(rowid, path) VALUES (new.id, new.path);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS files_ad AFTER DELETE ON files BEGIN
+        INSERT INTO files_fts(files_fts, rowid, path) VALUES ('delete', old.id, old.path);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS files_au AFTER UPDATE OF path ON files BEGIN
+        INSERT INTO files_fts(files_fts, rowid, path) VALUES ('delete', old.id, old.path);
+        INSERT INTO files_fts(rowid, path) VALUES (new.id, new.path);
+    END""",
+]
+
+_COLUMNS = "f.id, f.path, f.is_dir, f.size, f.mtime"
+
+
+def _norm(path: str) -> str:
+    return '/' + path.strip('/')
+
+
+def _name(path: str) -> str:
+    return path.rstrip('/').rsplit('/', 1)[-1].lower()
+
+
+def _subtree(path: str) -> tuple[str, str]:
+    """path 下所有子项的主键范围 [lo, hi)"""
+    prefix = path.rstrip('/') + '/'
+    return prefix, prefix + _MAX_CHAR
+
+
+def _like_escape(text: str) -> str:
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _fts_phrase(text: str) -> str:
+    return '"' + text.replace('"', '""') + '"'
+
+
+class FilenameIndex:
+    """基于 SQLite FTS5 trigram 的全挂载点文件名索引，支持子串、前缀与模糊查询"""
+
+    def __init__(self, db_path: str = DB_PATH):
+        self.db_path = db_path
+        self._executor: ThreadPoolExecutor | None = None
+        self._conn: sqlite3.Connection | None = None
+        self._rebuilding = False
+        # 每次写入递增，供搜索结果缓存判断是否过期
+        self.version = 0
+
+    async def _run(self, fn, *args):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="filename-index")
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.db_path)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for stmt in _SCHEMA:
+                conn.execute(stmt)
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    async def aclose(self):
+        if self._executor is None:
+            return
+
+        def close():
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+        await self._run(close)
+        self._executor.shutdown(wait=True)
+        self._executor = None
+
+    # ---- 写入 ----
+
+    def _upsert_sync(self, entries: List[Dict[str, Any]], gen: int):
+        conn = self._db()
+        conn.executemany(
+            """INSERT INTO files(path, name_lower, is_dir, size, mtime, gen) VALUES (?, ?, ?, ?, ?, ?)
+               ON CONFLICT(path) DO UPDATE SET is_dir=excluded.is_dir,
+                   size=COALESCE(excluded.size, files.size), mtime=COALESCE(excluded.mtime, files.mtime),
+                   gen=MAX(files.gen, excluded.gen)""",
+            [
+                (_norm(e["path"]), _name(e["path"]), int(bool(e.get("is_dir"))), e.get("size"), e.get("mtime"), gen)
+                for e in entries
+            ],
+        )
+        conn.commit()
+
+    async def upsert(self, entries: List[Dict[str, Any]], gen: int | None = None):
+        """写入或更新条目，entries 中每项至少包含 path，可选 is_dir/size/mtime。
+        gen 默认取当前时间：重建期间由事件、遍历写入的条目不低于重建的代数，不会被其清理"""
+        if entries:
+            await self._run(self._upsert_sync, entries, int(time.time()) if gen is None else gen)
+            self.version += 1
+
+    def _delete_sync(self, path: str):
+        conn = self._db()
+        lo, hi = _subtree(path)
+        conn.execute("DELETE FROM files WHERE path = ? OR (path >= ? AND path < ?)", (path, lo, hi))
+        conn.commit()
+
+    async def delete(self, path: str):
+        """删除路径及其子项"""
+        await self._run(self._delete_sync, _norm(path))
+        self.version += 1
+
+    def _move_sync(self, src: str, dst: str, copy: bool):
+        if src == dst:
+            return
+        conn = self._db()
+        lo, hi = _subtree(src)
+        # 目标位置已有的旧条目先清除，避免唯一约束冲突
+        dlo, dhi = _subtree(dst)
+        conn.execute("DELETE FROM files WHERE path = ? OR (path >= ? AND path < ?)", (dst, dlo, dhi))
+        if copy:
+            conn.execute(
+                """INSERT INTO files(path, name_lower, is_dir, size, mtime, gen)
+                   SELECT ? || substr(path, ?), name_lower, is_dir, size, mtime, gen FROM files
+                   WHERE path = ? OR (path >= ? AND path < ?)""",
+                (dst, len(src) + 1, src, lo, hi),
+            )
+        else:
+            conn.execute(
+                "UPDATE files SET path = ? || substr(path, ?) WHERE path = ? OR (path >= ? AND path < ?)",
+                (dst, len(src) + 1, src, lo, hi),
+            )
+        cur = conn.execute("UPDATE files SET name_lower = ? WHERE path = ?", (_name(dst), dst))
+        if cur.rowcount == 0:
+            conn.execute(
+                "INSERT INTO files(path, name_lower, is_dir, gen) VALUES (?, ?, 0, ?)", (dst, _name(dst), int(time.time())),
+            )
+        conn.commit()
+
+    async def move(self, src: str, dst: str):
+        await self._run(self._move_sync, _norm(src), _norm(dst), False)
+        self.version += 1
+
+    async def copy(self, src: str, dst: str):
+        await self._run(self._move_sync, _norm(src), _norm(dst), True)
+        self.version += 1
+
+    def _prune_sync(self, gen: int, scope: str | None) -> int:
+        conn = self._db()
+        if scope and scope != '/':
+            lo, hi = _subtree(scope)
+            cur = conn.execute(
+                "DELETE FROM files WHERE gen < ? AND (path = ? OR (path >= ? AND path < ?))", (gen, scope, lo, hi),
+            )
+        else:
+            cur = conn.execute("DELETE FROM files WHERE gen < ?", (gen,))
+        conn.commit()
+        return cur.rowcount
+
+    def _count_sync(self) -> int:
+        return self._db().execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    async def count(self) -> int:
+        return await self._run(self._count_sync)
+
+    # ---- 查询 ----
+
+    def _search_sync(self, q: str, match: str, mount: str | None, offset: int, limit: int,
+                     filters: Dict[str, Any] | None = None) -> List[Dict[str, Any]]:
+        conn = self._db()
+        q_lower = q.lower()
+        scope_sql, scope_args = "", []
+        if mount and mount != '/':
+            lo, hi = _subtree(mount)
+            scope_sql = " AND (f.path = ? OR (f.path >= ? AND f.path < ?))"
+            scope_args = [mount, lo, hi]
+        filters = filters or {}
+        if filters.get("exts"):
+            scope_sql += " AND f.is_dir = 0 AND (" + " OR ".join("f.name_lower LIKE ? ESCAPE '\\'" for _ in filters["exts"]) + ")"
+            scope_args += ['%.' + _like_escape(e.lower()) for e in filters["exts"]]
+        # 大小或修改时间未知（NULL）的条目无法判断，保留在结果中而不是静默丢弃
+        for key, cond in (("min_size", "(f.size IS NULL OR f.size >= ?)"), ("max_size", "(f.size IS NULL OR f.size <= ?)"),
+                          ("mtime_from", "(f.mtime IS NULL OR f.mtime >= ?)"),
+                          ("mtime_to", "(f.mtime IS NULL OR f.mtime <= ?)")):
+            if filters.get(key) is not None:
+                scope_sql += f" AND {cond}"
+                scope_args.append(filters[key])
+
+        if match == "prefix":
+            rows = conn.execute(
+                f"SELECT {_COLUMNS}, 1.0 FROM files f WHERE f.name_lower >= ? AND f.name_lower < ?{scope_sql}"
+                " ORDER BY f.name_lower, f.path LIMIT ? OFFSET ?",
+                [q_lower, q_lower + _MAX_CHAR, *scope_args, limit, offset],
+            ).fetchall()
+        elif match == "fuzzy" and len(q_lower) >= 3:
+            grams = {q_lower[i:i + 3] for i in range(len(q_lower) - 2)}
+            expr = " OR ".join(_fts_phrase(g) for g in sorted(grams))
+            candidates = conn.execute(
+                f"SELECT {_COLUMNS}, f.name_lower FROM files_fts JOIN files f ON f.id = files_fts.rowid"
+                f" WHERE files_fts MATCH ?{scope_sql} ORDER BY files_fts.rank LIMIT ?",
+                [expr, *scope_args, FUZZY_CANDIDATES],
+            ).fetchall()
+            scored = []
+            for row in candidates:
+                score = difflib.SequenceMatcher(None, q_lower, row[5]).ratio()
+                if q_lower in row[5]:
+                    score = max(score, 0.9)
+                if score >= FUZZY_MIN_SCORE:
+                    scored.append((*row[:5], score))
+            scored.sort(key=lambda r: (-r[5], len(r[1])))
+            rows = scored[offset:offset + limit]
+        elif len(q_lower) >= 3:
+            # trigram 分词下的短语查询等价于大小写不敏感的子串匹配；文件名命中优先
+            rows = conn.execute(
+                f"SELECT {_COLUMNS}, CASE WHEN instr(f.name_lower, ?) > 0 THEN 1.0 ELSE 0.5 END AS score"
+                f" FROM files_fts JOIN files f ON f.id = files_fts.rowid WHERE files_fts MATCH ?{scope_sql}"
+                " ORDER BY score DESC, length(f.path) LIMIT ? OFFSET ?",
+                [q_lower, _fts_phrase(q), *scope_args, limit, offset],
+            ).fetchall()
+        else:
+            # 少于三个字符无法使用 trigram，退化为文件名扫描
+            pattern = '%' + _like_escape(q_lower) + '%'
+            rows = conn.execute(
+                f"SELECT {_COLUMNS}, 1.0 FROM files f WHERE f.name_lower LIKE ? ESCAPE '\\'{scope_sql}"
+                " ORDER BY length(f.path) LIMIT ? OFFSET ?",
+                [pattern, *scope_args, limit, offset],
+            ).fetchall()
+
+        return [
+            {"id": r[0], "path": r[1], "is_dir": bool(r[2]), "size": r[3], "mtime": r[4], "score": r[5]}
+            for r in rows
+        ]
+
+    async def search(self, q: str, match: str = "substring", mount: str | None = None,
+                     page: int = 1, page_size: int = 50, filters: Dict[str, Any] | None = None) -> Dict[str, Any]:
+        """filters 可含 exts / min_size / max_size / mtime_from / mtime_to，语义同向量检索的过滤条件"""
+        page = max(1, page)
+        page_size = max(1, page_size)
+        mount = _norm(mount) if mount else None
+        started = time.perf_counter()
+        rows = await self._run(self._search_sync, q, match, mount, (page - 1) * page_size, page_size + 1, filters)
+        return {
+            "items": rows[:page_size],
+            "page": page,
+            "page_size": page_size,
+            "has_more": len(rows) > page_size,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+
+    # ---- 全量重建 ----
+
+    async def rebuild(self, root: str = "/", concurrency: int = CRAWL_CONCURRENCY, progress: Dict | None = None) -> Dict[str, Any]:
+        """并发遍历挂载点，写入新一代条目后清除未再出现的旧条目"""
+        from services.virtual_fs import list_virtual_dir
+
+        if self._rebuilding:
+            raise RuntimeError("Filename index rebuild already running")
+        self._rebuilding = True
+        root = _norm(root)
+        gen = int(time.time())
+        stats = {"dirs": 0, "entries": 0, "errors": 0}
+        dirs: asyncio.Queue = asyncio.Queue()
+        buffer: List[Dict[str, Any]] = []
+        started = time.monotonic()
+
+        async def flush_buffer(force: bool = False):
+            nonlocal buffer
+            if buffer and (force or len(buffer) >= WRITE_BATCH_SIZE):
+                batch, buffer = buffer, []
+                await self.upsert(batch, gen)
+
+        async def worker():
+            while True:
+                current = await dirs.get()
+                try:
+                    page_num = 1
+                    while True:
+                        listing = await list_virtual_dir(current, page_num, CRAWL_PAGE_SIZE, "name", "asc")
+                        for ent in listing["items"]:
+                            full = current.rstrip('/') + '/' + ent["name"]
+                            buffer.append({
+                                "path": full, "is_dir": ent.get("is_dir"),
+                                "size": ent.get("size"), "mtime": ent.get("mtime"),
+                            })
+                            if ent.get("is_dir"):
+                                dirs.put_nowait(full)
+                        stats["entries"] += len(listing["items"])
+                        await flush_buffer()
+                        if page_num >= listing["pages"]:
+                            break
+                        page_num += 1
+                    stats["dirs"] += 1
+                except Exception as e:
+                    stats["errors"] += 1
+                    await LogService.warning("filename_index", f"Failed to crawl {current}: {e}", {"path": current})
+                finally:
+                    if progress is not None:
+                        progress.update(stats, elapsed=round(time.monotonic() - started, 1))
+                    dirs.task_done()
+
+        dirs.put_nowait(root)
+        workers = [asyncio.create_task(worker()) for _ in range(max(1, concurrency))]
+        try:
+            await dirs.join()
+            await flush_buffer(force=True)
+            # 有目录读取失败时保留旧条目，避免误删
+            if not stats["errors"]:
+                stats["pruned"] = await self._run(self._prune_sync, gen, root)
+                self.version += 1
+        finally:
+            for w in workers:
+                w.cancel()
+            self._rebuilding = False
+        stats["elapsed"] = round(time.monotonic() - started, 1)
+        await LogService.info("filename_index", f"Filename index rebuilt for {root}", stats)
+        return stats
+
+    async def ensure_built(self):
+        """索引为空时填充一次：后台遍历开启时由其全量遍历写入，否则排队一次全量重建，避免两者同时遍历全部挂载点"""
+        from services.crawler import crawler_service
+        from services.task_queue import task_queue_service
+
+        if await self.count() > 0:
+            return
+        if await crawler_service.enabled():
+            await crawler_service.repopulate()
+        else:
+            await task_queue_service.add_task("filename_index_rebuild", {"path": "/"})
+
+
+filename_index = FilenameIndex()
+
+
+async def _event_entry(path: str) -> Dict[str, Any]:
+    """事件只带路径：补上大小与修改时间，使按大小、时间过滤的查询能命中刚写入的文件"""
+    from services.virtual_fs import stat_file
+
+    try:
+        st = await stat_file(path) or {}
+    except Exception:
+        return {"path": path}
+    return {"path": path, "is_dir": bool(st.get("is_dir")), "size": st.get("size"), "mtime": st.get("mtime")}
+
+
+async def _on_file_event(ev: FileEvent):
+    if ev.event == "file_written":
+        await filename_index.upsert([await _event_entry(ev.path)])
+    elif ev.event == "file_deleted":
+        await filename_index.delete(ev.path)
+    elif ev.event == "file_moved" and ev.src:
+        await filename_index.move(ev.src, ev.path)
+    elif ev.event == "file_copied":
+        if ev.src:
+            await filename_index.copy(ev.src, ev.path)
+        else:
+            await filename_index.upsert([await _event_entry(ev.path)])
+
+
+for _event in ("file_written", "file_deleted", "file_moved", "file_copied"):
+    file_event_bus.subscribe(_event, _on_file_event)
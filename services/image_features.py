@@ -0,0 +1,87 @@
+import asyncio
+import io
+from typing import List
+
+import numpy as np
+
+from services.thumbnail import generate_thumb, is_raw_filename
+from services.vector_store import vector_store
+
+# 特征算法标识，写入集合元数据；算法调整时修改此值会触发集合重建
+FEATURE_MODEL = "local-image-v1"
+FEATURE_COLLECTION = "image_features"
+# 复用界面缩略图的默认尺寸，命中同一份缩略图缓存
+THUMB_SIZE = 256
+HASH_GRID = 32
+HASH_BITS = 8
+HIST_LEVELS = 4
+HIST_GRID = 64
+# 感知哈希与颜色直方图在余弦相似度中各占的权重
+HASH_WEIGHT = 0.5
+FEATURE_DIM = HASH_BITS * HASH_BITS + HIST_LEVELS ** 3
+# 特征集合重建时交给 vector_index 处理器的配置
+REBUILD_CONFIG = {"action": "create", "index_type": "image_local"}
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)[:, None]
+    x = np.arange(n)[None, :]
+    m = np.cos(np.pi * (2 * x + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    m[0] /= np.sqrt(2.0)
+    return m
+
+
+_DCT = _dct_matrix(HASH_GRID)
+
+
+def image_features(data: bytes) -> List[float]:
+    """由（缩略）图片计算特征向量：8x8 DCT 感知哈希（±1）与 4x4x4 RGB 颜色直方图（开方归一化），
+    两部分各自为单位长度后加权拼接，余弦相似度即两部分相似度的加权和"""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as im:
+        rgb = im.convert("RGB")
+    gray = np.asarray(rgb.convert("L").resize((HASH_GRID, HASH_GRID), Image.BILINEAR), dtype=np.float64)
+    dct = (_DCT @ gray @ _DCT.T)[:HASH_BITS, :HASH_BITS].ravel()
+    # 直流分量只反映整体亮度，不参与中位数
+    bits = np.where(dct > np.median(dct[1:]), 1.0, -1.0) / HASH_BITS
+
+    pixels = np.asarray(rgb.resize((HIST_GRID, HIST_GRID), Image.BILINEAR), dtype=np.int64)
+    q = pixels * HIST_LEVELS // 256
+    bins = (q[..., 0] * HIST_LEVELS + q[..., 1]) * HIST_LEVELS + q[..., 2]
+    hist = np.bincount(bins.ravel(), minlength=HIST_LEVELS ** 3).astype(np.float64)
+    hist = np.sqrt(hist / hist.sum())
+
+    vec = np.concatenate([bits * np.sqrt(HASH_WEIGHT), hist * np.sqrt(1.0 - HASH_WEIGHT)])
+    return vec.astype(np.float32).tolist()
+
+
+async def thumbnail_for(path: str) -> bytes | None:
+    """取文件的界面缩略图（命中 data/.thumb_cache 时不读取原图）；取不到时返回 None"""
+    from services.virtual_fs import resolve_adapter_and_rel
+    from services.thumbnail import get_or_create_thumb
+
+    try:
+        adapter, mount, root, rel = await resolve_adapter_and_rel(path)
+        data, _, _ = await get_or_create_thumb(adapter, mount.id, root, rel, THUMB_SIZE, THUMB_SIZE, "cover")
+        return data
+    except Exception:
+        return None
+
+
+async def features_for_path(path: str, data: bytes | None = None) -> List[float]:
+    """优先使用缓存的缩略图计算特征；缩略图不可用时由传入的原图字节生成"""
+    thumb = await thumbnail_for(path)
+    if thumb is None:
+        if data is None:
+            raise ValueError(f"无法读取图片: {path}")
+        thumb, _ = await asyncio.to_thread(
+            generate_thumb, data, THUMB_SIZE, THUMB_SIZE, "cover", is_raw_filename(path),
+        )
+    return await asyncio.to_thread(image_features, thumb)
+
+
+async def ensure_feature_collection():
+    await vector_store.ensure_collection(
+        FEATURE_COLLECTION, vector=True, dim=FEATURE_DIM, model=FEATURE_MODEL, rebuild_config=REBUILD_CONFIG,
+    )
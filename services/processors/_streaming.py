@@ -0,0 +1,34 @@
+import asyncio
+import tempfile
+from typing import AsyncIterator, BinaryIO
+
+SPOOL_MAX_MEMORY = 8 * 1024 * 1024
+CHUNK_SIZE = 1024 * 1024
+
+
+def new_spool() -> BinaryIO:
+    """超过阈值后自动落盘的临时文件，关闭即删除"""
+    return tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+
+
+async def spool(chunks: AsyncIterator[bytes]) -> BinaryIO:
+    """将输入流写入临时文件并回到文件开头，供需要随机访问的处理器使用"""
+    f = new_spool()
+    async for chunk in chunks:
+        if chunk:
+            await asyncio.to_thread(f.write, chunk)
+    f.seek(0)
+    return f
+
+
+async def iter_file(f: BinaryIO, chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """从头分块读出临时文件，读完后关闭"""
+    try:
+        f.seek(0)
+        while True:
+            chunk = await asyncio.to_thread(f.read, chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        f.close()
@@ -11,6 +11,16 @@ class BaseProcessor(Protocol):
         """处理文件内容并返回处理后的内容"""
         ...
 
+# 可选：实现 process_batch 的处理器可一次处理多个文件（自动化事件会合并投递）
+#   async def process_batch(self, items: List[Tuple[bytes, str]], config: Dict[str, Any]) -> List[Any]
+#   items 为 (input_bytes, path) 列表，返回值与 items 一一对应
+
+# 可选：实现 process_stream 的处理器以流的方式接收输入，不必把整个文件读入内存
+#   async def process_stream(self, chunks: AsyncIterator[bytes], path: str, config: Dict[str, Any]) -> Any
+#   produces_file 的处理器返回 AsyncIterator[bytes]，结果经 write_file_stream 直接写入目标路径；
+#   未指定保存路径时输出被读成 Response 返回，media_type 取处理器的 media_type 属性
+#   需要随机访问的处理器可用 services.processors._streaming.spool 落到临时文件
+
 # 约定：每个处理器需定义
 # PROCESSOR_TYPE: str
 # CONFIG_SCHEMA: list
@@ -1,9 +1,11 @@
 from .base import BaseProcessor
-from typing import Dict, Any
+import asyncio
+from typing import Dict, Any, AsyncIterator, BinaryIO
 from PIL import Image, ImageDraw, ImageFont
 from io import BytesIO
 from fastapi.responses import Response
 from services.logging import LogService
+from services.processors._streaming import spool, new_spool, iter_file
 
 class ImageWatermarkProcessor:
     name = "图片水印"
@@ -25,12 +27,13 @@ class ImageWatermarkProcessor:
         {"key": "font_size", "label": "字体大小", "type": "number", "required": False, "default": 24},
     ]
     produces_file = True
+    media_type = "image/jpeg"
 
-    async def process(self, input_bytes: bytes,path: str, config: Dict[str, Any]) -> Response:
+    def _render(self, src: BinaryIO, dst: BinaryIO, config: Dict[str, Any]):
         text = config.get("text", "")
         position = config.get("position", "bottom-right")
         font_size = int(config.get("font_size", 24))
-        img = Image.open(BytesIO(input_bytes)).convert("RGBA")
+        img = Image.open(src).convert("RGBA")
         watermark = Image.new("RGBA", img.size)
         draw = ImageDraw.Draw(watermark)
         try:
@@ -51,8 +54,11 @@ class ImageWatermarkProcessor:
             xy = (w // 2 - text_w // 2, h // 2 - text_h // 2)
         draw.text(xy, text, font=font, fill=(255, 255, 255, 128))
         out = Image.alpha_composite(img, watermark)
+        out.convert("RGB").save(dst, format="JPEG")
+
+    async def process(self, input_bytes: bytes,path: str, config: Dict[str, Any]) -> Response:
         buf = BytesIO()
-        out.convert("RGB").save(buf, format="JPEG")
+        self._render(BytesIO(input_bytes), buf, config)
         await LogService.info(
             "processor:image_watermark",
             f"Watermarked image {path}",
@@ -60,6 +66,23 @@ class ImageWatermarkProcessor:
         )
         return Response(content=buf.getvalue(), media_type="image/jpeg")
 
+    async def process_stream(self, chunks: AsyncIterator[bytes], path: str, config: Dict[str, Any]) -> AsyncIterator[bytes]:
+        src = await spool(chunks)
+        dst = new_spool()
+        try:
+            await asyncio.to_thread(self._render, src, dst, config)
+        except Exception:
+            dst.close()
+            raise
+        finally:
+            src.close()
+        await LogService.info(
+            "processor:image_watermark",
+            f"Watermarked image {path}",
+            details={"path": path, "config": config},
+        )
+        return iter_file(dst)
+
 PROCESSOR_TYPE = "image_watermark"
 PROCESSOR_NAME = ImageWatermarkProcessor.name
 SUPPORTED_EXTS = ImageWatermarkProcessor.supported_exts
@@ -1,9 +1,101 @@
-from typing import Dict, Any
+from typing import Dict, Any, List, Tuple, AsyncIterator
 from fastapi.responses import Response
+import asyncio
 import base64
-from services.ai import describe_image_base64, get_text_embedding
-from services.vector_db import VectorDBService
+import codecs
+from services.ai import (
+    describe_image_base64, embedding_model_key, get_text_embedding, get_text_embeddings, is_vision_error,
+)
+from services.config import ConfigCenter
+from services.embedding_cache import embedding_cache
+from services.events import FileEvent, file_event_bus
+from services.image_features import (
+    FEATURE_COLLECTION, ensure_feature_collection, features_for_path, image_features, thumbnail_for,
+)
+from services.vector_backends.base import chunk_id, path_ext
+from services.vector_store import vector_store
 from services.logging import LogService
+from services.thumbnail import generate_thumb, image_size
+
+IMAGE_EXTS = ["jpg", "jpeg", "png", "bmp"]
+IMAGE_MIME = {"jpg": "image/jpeg", "jpeg": "image/jpeg", "png": "image/png", "bmp": "image/bmp"}
+# 发送给视觉模型前把图片长边缩放到该尺寸以内；<= 0 表示发送原图
+DEFAULT_VISION_MAX_EDGE = 1024
+DEFAULT_VISION_QUALITY = 85
+DEFAULT_VISION_FORMAT = "JPEG"
+# 原图已在尺寸限制内且为这些格式时原样发送
+PASSTHROUGH_FORMATS = {"JPEG", "PNG", "WEBP"}
+TEXT_EXTS = ["txt", "md"]
+# 文本分块长度与相邻分块的重叠（字符）
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_CHUNK_OVERLAP = 200
+# 每攒够这么多分块就嵌入并写入一次，大文件不必整体留在内存
+EMBED_GROUP = 32
+
+
+def _collection_for(index_type: str) -> str:
+    return FEATURE_COLLECTION if index_type == "image_local" else "vector_collection"
+
+
+async def prepare_vision_image(data: bytes, ext: str) -> Tuple[bytes, str]:
+    """复用缩略图管线，把图片缩放并重新编码为 JPEG/WebP；返回 (图片数据, MIME)，解码失败时发送原图"""
+    max_edge = int(await ConfigCenter.get("AI_VISION_MAX_EDGE") or DEFAULT_VISION_MAX_EDGE)
+    quality = int(await ConfigCenter.get("AI_VISION_QUALITY") or DEFAULT_VISION_QUALITY)
+    fmt = (await ConfigCenter.get("AI_VISION_FORMAT") or DEFAULT_VISION_FORMAT).upper()
+    if fmt not in ("JPEG", "WEBP"):
+        fmt = DEFAULT_VISION_FORMAT
+    original = (data, IMAGE_MIME.get(ext, "image/jpeg"))
+    if max_edge <= 0:
+        return original
+    try:
+        width, height, source_format = await asyncio.to_thread(image_size, data)
+        if max(width, height) <= max_edge and source_format in PASSTHROUGH_FORMATS:
+            return data, f"image/{source_format.lower()}"
+        return await asyncio.to_thread(generate_thumb, data, max_edge, max_edge, 'contain', False, fmt, quality)
+    except Exception:
+        return original
+
+
+async def _single(data: bytes) -> AsyncIterator[bytes]:
+    yield data
+
+
+async def iter_text_chunks(chunks: AsyncIterator[bytes], size: int = DEFAULT_CHUNK_SIZE,
+                           overlap: int = DEFAULT_CHUNK_OVERLAP) -> AsyncIterator[Tuple[int, str]]:
+    """增量解码 UTF-8 字节流并切分为相互重叠的文本块，尽量在换行处断开；产出 (字符偏移, 文本)"""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    buf = ""
+    offset = 0
+    async for data in chunks:
+        buf += decoder.decode(data)
+        # 块内只移动起点，每个输入片段结束时再丢弃已消费的前缀，避免整段文本反复复制
+        pos = 0
+        while len(buf) - pos >= size:
+            cut = buf.rfind("\n", pos + size // 2, pos + size) + 1 - pos
+            if cut <= 0:
+                cut = size
+            yield offset, buf[pos:pos + cut]
+            advance = max(cut - overlap, 1)
+            pos += advance
+            offset += advance
+        buf = buf[pos:]
+    buf += decoder.decode(b"", final=True)
+    # 剩余部分若已完全落在上一块的重叠区内则不再单独成块
+    if buf.strip() and (offset == 0 or len(buf) > overlap):
+        yield offset, buf
+
+
+async def _file_metadata(path: str, size: int | None = None) -> Dict[str, Any]:
+    """随向量保存的过滤字段；size 缺省时取文件信息中的大小，取不到的字段记为 0"""
+    from services.virtual_fs import stat_file
+
+    st: Dict[str, Any] = {}
+    try:
+        st = await stat_file(path) or {}
+    except Exception:
+        pass
+    return {"ext": path_ext(path), "size": int(size if size is not None else st.get("size") or 0),
+            "mtime": int(st.get("mtime") or 0)}
 
 
 class VectorIndexProcessor:
@@ -22,6 +114,7 @@ class VectorIndexProcessor:
             "options": [
                 {"value": "vector", "label": "向量索引"},
                 {"value": "simple", "label": "普通索引"},
+                {"value": "image_local", "label": "本地图片特征"},
             ]
         }
     ]
@@ -30,10 +123,9 @@ class VectorIndexProcessor:
     async def process(self, input_bytes: bytes, path: str, config: Dict[str, Any]) -> Response:
         action = config.get("action", "create")
         index_type = config.get("index_type", "vector")
-        vector_db = VectorDBService()
-        collection_name = "vector_collection"
+        collection_name = _collection_for(index_type)
         if action == "destroy":
-            vector_db.delete_vector(collection_name, path)
+            await vector_store.delete(collection_name, [path])
             await LogService.info(
                 "processor:vector_index",
                 f"Destroyed {index_type} index for {path}",
@@ -42,8 +134,8 @@ class VectorIndexProcessor:
             return Response(content=f"文件 {path} 的 {index_type} 索引已销毁", media_type="text/plain")
 
         if index_type == 'simple':
-            vector_db.ensure_collection(collection_name, vector=False)
-            vector_db.upsert_vector(collection_name, {'path': path})
+            await vector_store.ensure_collection(collection_name, vector=False)
+            await vector_store.upsert(collection_name, {'path': path})
             await LogService.info(
                 "processor:vector_index",
                 f"Created simple index for {path}",
@@ -52,29 +144,47 @@ class VectorIndexProcessor:
             return Response(content=f"文件 {path} 的普通索引已创建", media_type="text/plain")
 
         file_ext = path.split('.')[-1].lower()
+        if index_type == "image_local":
+            if file_ext not in IMAGE_EXTS:
+                return Response(content="不支持的文件类型", status_code=400)
+            return await self._index_features(path, await features_for_path(path, input_bytes), len(input_bytes))
+        if file_ext in TEXT_EXTS:
+            return await self._index_text(_single(input_bytes), path, collection_name)
         description = ""
         embedding = None
+        cached = None
+        digest = embedding_cache.content_hash(input_bytes)
+        embed_model = await embedding_model_key()
 
-        if file_ext in ["jpg", "jpeg", "png", "bmp"]:
-            base64_image = base64.b64encode(input_bytes).decode("utf-8")
-            description = await describe_image_base64(base64_image)
-            embedding = await get_text_embedding(description)
+        if file_ext in IMAGE_EXTS:
+            vision_prefix = f"{await ConfigCenter.get('AI_VISION_MODEL') or ''}|"
+            model = vision_prefix + embed_model
+            cached = await embedding_cache.get(digest, model)
+            if cached:
+                description, embedding = cached
+            else:
+                description = await embedding_cache.get_description(digest, vision_prefix)
+                if not description:
+                    image, mime = await prepare_vision_image(input_bytes, file_ext)
+                    base64_image = base64.b64encode(image).decode("utf-8")
+                    description = await describe_image_base64(base64_image, mime=mime)
+                embedding = await get_text_embedding(description)
+                if not is_vision_error(description):
+                    await embedding_cache.put(digest, model, description, embedding)
             log_message = f"Indexed image {path}"
             response_message = f"图片已索引，描述：{description}"
-        elif file_ext in ["txt", "md"]:
-            text = input_bytes.decode("utf-8")
-            embedding = await get_text_embedding(text)
-            description = text[:100] + "..." if len(text) > 100 else text
-            log_message = f"Indexed text file {path}"
-            response_message = f"文本文件已索引"
-        
+
         if embedding is None:
             return Response(content="不支持的文件类型", status_code=400)
+        if cached:
+            log_message += " (cached)"
+
+        await vector_store.ensure_collection(collection_name, vector=True, dim=len(embedding))
+        metadata = await _file_metadata(path, len(input_bytes))
+        await vector_store.upsert(
+            collection_name, {'path': path, 'embedding': embedding, 'snippet': description, **metadata},
+        )
 
-        vector_db.ensure_collection(collection_name, vector=True)
-        vector_db.upsert_vector(
-            collection_name, {'path': path, 'embedding': embedding})
-        
         await LogService.info(
             "processor:vector_index",
             log_message,
@@ -82,6 +192,126 @@ class VectorIndexProcessor:
         )
         return Response(content=response_message, media_type="text/plain")
 
+    async def _index_features(self, path: str, features: List[float], size: int | None = None) -> Response:
+        await ensure_feature_collection()
+        metadata = await _file_metadata(path, size)
+        await vector_store.upsert(FEATURE_COLLECTION, {"path": path, "embedding": features, **metadata})
+        await LogService.info(
+            "processor:vector_index",
+            f"Indexed local image features for {path}",
+            details={"path": path, "action": "create", "index_type": "image_local"},
+        )
+        return Response(content="图片特征已索引", media_type="text/plain")
+
+    async def _index_text(self, chunks: AsyncIterator[bytes], path: str, collection_name: str) -> Response:
+        """流式读取文本，分块后按批嵌入；每个分块以 (path, offset) 单独存储，未变化的分块命中嵌入缓存"""
+        size = int(await ConfigCenter.get("AI_EMBED_CHUNK_SIZE") or DEFAULT_CHUNK_SIZE)
+        overlap = min(int(await ConfigCenter.get("AI_EMBED_CHUNK_OVERLAP") or DEFAULT_CHUNK_OVERLAP), size // 2)
+        embed_model = await embedding_model_key()
+        metadata = await _file_metadata(path)
+        stats = {"chunks": 0, "cached": 0}
+        description = ""
+        ids: List[str] = []
+
+        async def flush(group: List[Tuple[int, str]]):
+            digests = [embedding_cache.content_hash(text.encode("utf-8")) for _, text in group]
+            cached = await embedding_cache.get_many(digests, embed_model)
+            missing = [i for i, d in enumerate(digests) if d not in cached]
+            if missing:
+                embeddings = await get_text_embeddings([group[i][1] for i in missing])
+                for i, embedding in zip(missing, embeddings):
+                    cached[digests[i]] = embedding
+                    await embedding_cache.put(digests[i], embed_model, None, embedding)
+            stats["cached"] += len(group) - len(missing)
+            await vector_store.ensure_collection(collection_name, vector=True, dim=len(cached[digests[0]]))
+            await vector_store.upsert_many(collection_name, [
+                {"id": chunk_id(path, offset), "path": path, "offset": offset, "snippet": text,
+                 "embedding": cached[digest], **metadata}
+                for (offset, text), digest in zip(group, digests)
+            ])
+
+        group: List[Tuple[int, str]] = []
+        async for offset, text in iter_text_chunks(chunks, size, overlap):
+            if not description:
+                description = text[:100] + "..." if len(text) > 100 else text
+            group.append((offset, text))
+            ids.append(chunk_id(path, offset))
+            stats["chunks"] += 1
+            if len(group) >= EMBED_GROUP:
+                await flush(group)
+                group = []
+        if group:
+            await flush(group)
+        # 新分块写完后再删除旧分块中不再产生的部分（文件变短或分块边界变化），重新索引期间旧结果仍可检索
+        await vector_store.delete_stale_chunks(collection_name, path, ids)
+        if stats["chunks"] == 0:
+            return Response(content="文件内容为空", status_code=400)
+
+        log_message = f"Indexed text file {path} ({stats['chunks']} chunks"
+        log_message += f", {stats['cached']} cached)" if stats["cached"] else ")"
+        await LogService.info(
+            "processor:vector_index",
+            log_message,
+            details={"path": path, "description": description, "action": "create", "index_type": "vector",
+                     "chunks": stats["chunks"], "cached": stats["cached"]},
+        )
+        return Response(content=f"文本文件已索引（{stats['chunks']} 个分块）", media_type="text/plain")
+
+    async def process_stream(self, chunks: AsyncIterator[bytes], path: str, config: Dict[str, Any]) -> Response:
+        action = config.get("action", "create")
+        index_type = config.get("index_type", "vector")
+        if action == "destroy" or index_type == "simple":
+            # 销毁索引与普通索引只需要路径，不读取文件内容
+            return await self.process(b"", path, config)
+        file_ext = path.split('.')[-1].lower()
+        if index_type == "image_local" and file_ext in IMAGE_EXTS:
+            # 缩略图已缓存时直接由缩略图计算特征，不读取原图
+            thumb = await thumbnail_for(path)
+            if thumb is not None:
+                features = await asyncio.to_thread(image_features, thumb)
+                return await self._index_features(path, features)
+        elif file_ext in TEXT_EXTS:
+            return await self._index_text(chunks, path, "vector_collection")
+        data = b"".join([chunk async for chunk in chunks])
+        return await self.process(data, path, config)
+
+    async def process_batch(self, items: List[Tuple[bytes, str]], config: Dict[str, Any]) -> List[Response]:
+        action = config.get("action", "create")
+        if action != "destroy":
+            # 并发处理，文本嵌入请求会被 services.ai 合并为批量请求
+            return list(await asyncio.gather(*(self.process(data, path, config) for data, path in items)))
+
+        index_type = config.get("index_type", "vector")
+        paths = [path for _, path in items]
+        await vector_store.delete(_collection_for(index_type), paths)
+        await LogService.info(
+            "processor:vector_index",
+            f"Destroyed {index_type} index for {len(paths)} files",
+            details={"paths": paths, "action": "destroy", "index_type": index_type},
+        )
+        return [
+            Response(content=f"文件 {path} 的 {index_type} 索引已销毁", media_type="text/plain")
+            for path in paths
+        ]
+
+
+async def _move_index(ev: FileEvent):
+    """移动、重命名时直接改写索引主键，不重新描述和嵌入"""
+    if not ev.src:
+        return
+    moved = 0
+    for collection_name in ("vector_collection", FEATURE_COLLECTION):
+        moved += await vector_store.move_path(collection_name, ev.src, ev.path)
+    if moved:
+        await LogService.info(
+            "processor:vector_index",
+            f"Moved {moved} index entries from {ev.src} to {ev.path}",
+            details={"src": ev.src, "dst": ev.path, "count": moved},
+        )
+
+
+file_event_bus.subscribe("file_moved", _move_index)
+
 
 PROCESSOR_TYPE = "vector_index"
 PROCESSOR_NAME = VectorIndexProcessor.name
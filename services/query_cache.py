@@ -0,0 +1,78 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List
+
+from services.ai import embedding_model_key, get_text_embedding
+
+_MISSING = object()
+
+
+def normalize_query(q: str) -> str:
+    """缓存键使用的规范化查询：去除首尾空白、合并连续空白并转小写"""
+    return " ".join(q.split()).lower()
+
+
+class TTLCache:
+    """LRU + TTL 缓存：超过容量时淘汰最久未使用的条目，过期条目在读取时丢弃；统计命中率"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.get(key, _MISSING)
+        if item is not _MISSING and item[0] > time.monotonic():
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+        if item is not _MISSING:
+            del self._data[key]
+        self.misses += 1
+        return default
+
+    def set(self, key: Hashable, value: Any):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else None,
+        }
+
+
+# 查询向量只取决于查询文本与嵌入模型，可以缓存较久；检索结果键中带有索引版本，索引变化后自然失效
+query_embedding_cache = TTLCache(
+    int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "2048")), float(os.getenv("QUERY_EMBEDDING_CACHE_TTL", "3600")),
+)
+search_result_cache = TTLCache(
+    int(os.getenv("SEARCH_RESULT_CACHE_SIZE", "1024")), float(os.getenv("SEARCH_RESULT_CACHE_TTL", "300")),
+)
+
+
+async def get_query_embedding(q: str) -> List[float]:
+    """带缓存的查询向量；键为规范化查询与嵌入模型"""
+    key = (normalize_query(q), await embedding_model_key())
+    embedding = query_embedding_cache.get(key)
+    if embedding is None:
+        embedding = await get_text_embedding(q)
+        query_embedding_cache.set(key, embedding)
+    return embedding
+
+
+def cache_stats() -> Dict[str, Any]:
+    return {"embedding": query_embedding_cache.stats(), "result": search_result_cache.stats()}
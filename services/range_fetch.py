@@ -0,0 +1,115 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict
+
+# fetch(start, end) 返回闭区间 [start, end] 的字节
+RangeFetch = Callable[[int, int], Awaitable[bytes]]
+# stream(start, end) 边下载边产出闭区间 [start, end] 的字节
+RangeStream = Callable[[int, int], AsyncIterator[bytes]]
+
+DEFAULT_CONCURRENCY = 4
+MIN_SEGMENT = 1024 * 1024
+MAX_SEGMENT = 16 * 1024 * 1024
+# 自适应分段：按单连接实测吞吐让每个分段约耗时这么久，首段取最小值以尽快返回首字节
+TARGET_SEGMENT_SECONDS = 1.0
+# 小于该长度的范围单次请求即可，不值得拆分
+PARALLEL_THRESHOLD = 8 * 1024 * 1024
+SEGMENT_RETRIES = 3
+RETRY_DELAY = 0.5
+# 这些错误重试无意义，直接抛出
+FATAL_ERRORS = (FileNotFoundError, PermissionError)
+
+
+async def _fetch_segment(fetch: RangeFetch, start: int, end: int, stats: Dict[str, Any]):
+    for attempt in range(SEGMENT_RETRIES + 1):
+        t0 = time.monotonic()
+        try:
+            data = await fetch(start, end)
+            if len(data) != end - start + 1:
+                raise IOError(f"Short range read {start}-{end}: got {len(data)} bytes")
+            return data, time.monotonic() - t0
+        except FATAL_ERRORS:
+            raise
+        except Exception:
+            if attempt >= SEGMENT_RETRIES:
+                raise
+            stats["retries"] = stats.get("retries", 0) + 1
+            await asyncio.sleep(RETRY_DELAY * 2 ** attempt)
+
+
+async def fetch_ranges(fetch: RangeFetch, start: int, end: int, concurrency: int = DEFAULT_CONCURRENCY,
+                       min_segment: int = MIN_SEGMENT, max_segment: int = MAX_SEGMENT,
+                       stats: Dict[str, Any] | None = None,
+                       stream: RangeStream | None = None) -> AsyncIterator[bytes]:
+    """并发取回 [start, end] 的多个分段并按顺序产出；在途分段不超过 concurrency 个，
+    内存占用以 concurrency 个分段为上限。单个分段失败时单独重试。
+
+    给出 stream 时首段边下载边产出，首字节不必等整段到齐；之后在途分段从 1 个起、
+    每交出一段翻倍直到 concurrency，只探测开头就断开的请求（播放器的 bytes=0-）
+    不会一次发出多个分段请求"""
+    stats = stats if stats is not None else {}
+    stats.setdefault("segments", 0)
+    concurrency = max(1, concurrency)
+    window = concurrency
+    segment = min_segment
+    throughput = 0.0
+    next_start = start
+    pending: deque[asyncio.Task] = deque()
+
+    def schedule():
+        nonlocal next_start
+        while len(pending) < window and next_start <= end:
+            seg_end = min(next_start + segment - 1, end)
+            pending.append(asyncio.create_task(_fetch_segment(fetch, next_start, seg_end, stats)))
+            next_start = seg_end + 1
+
+    def measure(size: int, elapsed: float):
+        nonlocal throughput, segment
+        stats["segments"] += 1
+        rate = size / max(elapsed, 1e-6)
+        throughput = rate if not throughput else 0.7 * throughput + 0.3 * rate
+        segment = int(min(max_segment, max(min_segment, throughput * TARGET_SEGMENT_SECONDS)))
+        stats["segment_size"] = segment
+
+    if stream is not None:
+        window = 1
+        first_end = min(start + min_segment - 1, end)
+        t0 = time.monotonic()
+        body = stream(start, first_end)
+        try:
+            async for chunk in body:
+                chunk = chunk[:first_end - next_start + 1]
+                if chunk:
+                    next_start += len(chunk)
+                    yield chunk
+                if next_start > first_end:
+                    break
+        except FATAL_ERRORS:
+            raise
+        except Exception:
+            # 首段中途断开：已产出的部分保留，剩余部分交给分段读取重试
+            stats["retries"] = stats.get("retries", 0) + 1
+        finally:
+            await body.aclose()
+        if next_start > start:
+            measure(next_start - start, time.monotonic() - t0)
+
+    try:
+        schedule()
+        while pending:
+            data, elapsed = await pending.popleft()
+            measure(len(data), elapsed)
+            window = min(concurrency, window * 2)
+            # 先补足在途分段再交出数据，消费方处理期间下载不中断
+            schedule()
+            yield data
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def read_ranges(fetch: RangeFetch, start: int, end: int, concurrency: int = DEFAULT_CONCURRENCY,
+                      stats: Dict[str, Any] | None = None) -> bytes:
+    return b"".join([chunk async for chunk in fetch_ranges(fetch, start, end, concurrency, stats=stats)])
@@ -4,6 +4,10 @@ from pydantic import BaseModel, Field
 import uuid
 from services.logging import LogService
 from enum import Enum
+from fastapi.responses import Response
+
+# 可能运行很久的任务（目录批处理、传输）不占用串行工作协程，各自独立运行
+LONG_RUNNING_TASKS = {"process_directory", "transfer"}
 
 
 class TaskStatus(str, Enum):
@@ -20,6 +24,7 @@ class Task(BaseModel):
     result: Any = None
     error: str | None = None
     task_info: Dict[str, Any] = {}
+    progress: Dict[str, Any] | None = None
 
 
 class TaskQueueService:
@@ -27,20 +32,58 @@ class TaskQueueService:
         self._queue = asyncio.Queue()
         self._tasks: Dict[str, Task] = {}
         self._worker_task: asyncio.Task | None = None
-
-    async def add_task(self, name: str, task_info: Dict[str, Any]) -> Task:
+        self._detached: set[asyncio.Task] = set()
+        self._active: Dict[str, Task] = {}
+
+    async def add_task(self, name: str, task_info: Dict[str, Any], key: str | None = None) -> Task:
+        """key 相同且仍在排队或运行中的任务直接返回，不重复执行"""
+        existing = self.get_active(key) if key is not None else None
+        if existing:
+            return existing
         task = Task(name=name, task_info=task_info)
         self._tasks[task.id] = task
-        await self._queue.put(task)
+        if key is not None:
+            self._active[key] = task
+        if name in LONG_RUNNING_TASKS:
+            runner = asyncio.create_task(self._execute_task(task))
+            self._detached.add(runner)
+            runner.add_done_callback(self._detached.discard)
+        else:
+            await self._queue.put(task)
         await LogService.info("task_queue", f"Task {name} ({task.id}) enqueued", {"task_id": task.id, "name": name})
         return task
 
     def get_task(self, task_id: str) -> Task | None:
         return self._tasks.get(task_id)
 
+    def get_active(self, key: str) -> Task | None:
+        """按 key 查找仍在排队或运行中的任务"""
+        task = self._active.get(key)
+        if task and task.status in (TaskStatus.PENDING, TaskStatus.RUNNING):
+            return task
+        return None
+
     def get_all_tasks(self) -> list[Task]:
         return list(self._tasks.values())
 
+    async def _load_automation(self, task_id: int):
+        from models.database import AutomationTask
+        from services.processors.registry import get as get_processor
+
+        auto_task = await AutomationTask.get(id=task_id)
+        processor = get_processor(auto_task.processor_type)
+        if not processor:
+            raise ValueError(f"Processor {auto_task.processor_type} not found for task {auto_task.id}")
+        return auto_task, processor
+
+    async def _read_automation_input(self, auto_task, path: str) -> bytes:
+        from services.virtual_fs import read_file
+
+        # 文件已被删除时无内容可读，处理器只需要路径
+        if auto_task.event == "file_deleted":
+            return b""
+        return await read_file(path)
+
     async def _execute_task(self, task: Task):
         from services.virtual_fs import process_file
 
@@ -57,26 +100,62 @@ class TaskQueueService:
                     save_to=params["save_to"]
                 )
                 task.result = result
+            elif task.name == "process_directory":
+                from services.batch_jobs import batch_job_service
+
+                task.result = await batch_job_service.run(task)
+            elif task.name == "transfer":
+                from services.transfer import transfer_service
+
+                task.result = await transfer_service.run(task)
+            elif task.name == "vector_rebuild":
+                from services.vector_store import vector_store
+
+                task.result = await vector_store.run_rebuild(task)
+            elif task.name == "filename_index_rebuild":
+                from services.filename_index import filename_index
+
+                task.progress = {}
+                task.result = await filename_index.rebuild(task.task_info.get("path", "/"), progress=task.progress)
             elif task.name == "automation_task":
-                from models.database import AutomationTask
-                from services.processors.registry import get as get_processor
-                from services.virtual_fs import read_file, write_file
+                from services.virtual_fs import run_processor
 
                 params = task.task_info
-                auto_task = await AutomationTask.get(id=params["task_id"])
+                auto_task, processor = await self._load_automation(params["task_id"])
                 path = params["path"]
 
-                processor = get_processor(auto_task.processor_type)
-                if not processor:
-                    raise ValueError(f"Processor {auto_task.processor_type} not found for task {auto_task.id}")
-
-                file_content = await read_file(path)
-                result = await processor.process(file_content, path, auto_task.processor_config)
-                
                 save_to = auto_task.processor_config.get("save_to")
-                if save_to and getattr(processor, "produces_file", False):
-                    await write_file(save_to, result)
+                await run_processor(
+                    processor,
+                    path,
+                    auto_task.processor_config,
+                    save_to,
+                    read_input=auto_task.event != "file_deleted",
+                )
                 task.result = "Automation task completed"
+            elif task.name == "automation_batch":
+                from services.virtual_fs import run_processor, write_file
+
+                params = task.task_info
+                auto_task, processor = await self._load_automation(params["task_id"])
+                save_to = auto_task.processor_config.get("save_to")
+                if auto_task.event != "file_deleted" and callable(getattr(processor, "process_stream", None)):
+                    # 流式处理器逐个文件边读边处理，不把整批文件读入内存；并发执行时嵌入请求仍会合并
+                    await asyncio.gather(*(
+                        run_processor(processor, path, auto_task.processor_config, save_to)
+                        for path in params["paths"]
+                    ))
+                else:
+                    items = []
+                    for path in params["paths"]:
+                        items.append((await self._read_automation_input(auto_task, path), path))
+
+                    results = await processor.process_batch(items, auto_task.processor_config)
+
+                    if save_to and getattr(processor, "produces_file", False):
+                        for result in results:
+                            await write_file(save_to, result.body if isinstance(result, Response) else result)
+                task.result = f"Automation batch completed ({len(params['paths'])} files)"
             else:
                 raise ValueError(f"Unknown task name: {task.name}")
             
@@ -108,6 +187,11 @@ class TaskQueueService:
             await LogService.info("task_queue", "Task worker created.")
 
     async def stop_worker(self):
+        # 长任务在取消时保存检查点，下次启动时续跑
+        runners = list(self._detached)
+        for runner in runners:
+            runner.cancel()
+        await asyncio.gather(*runners, return_exceptions=True)
         if self._worker_task and not self._worker_task.done():
             self._worker_task.cancel()
             try:
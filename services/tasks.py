@@ -1,18 +1,35 @@
 import re
-from typing import List
+from typing import List, Dict
 from models.database import AutomationTask
 from services.processors.registry import get as get_processor
 from services.logging import LogService
+from services.events import FileEvent
 
 from services.task_queue import task_queue_service
 
+# 合并投递时每个任务最多包含的文件数，限制非流式处理器一次读入内存的数据量
+AUTOMATION_BATCH_SIZE = 16
+
 
 class TaskService:
-    async def trigger_tasks(self, event: str, path: str):
-        tasks = await AutomationTask.filter(event=event, enabled=True)
-        for task in tasks:
-            if self.match(task, path):
-                await self.execute(task, path)
+    async def dispatch_events(self, events: List[FileEvent]):
+        """按事件类型分组投递；支持 process_batch 的处理器一次接收同一任务的全部路径"""
+        by_event: Dict[str, List[FileEvent]] = {}
+        for ev in events:
+            by_event.setdefault(ev.event, []).append(ev)
+
+        for event, items in by_event.items():
+            tasks = await AutomationTask.filter(event=event, enabled=True)
+            for task in tasks:
+                matched = [ev for ev in items if self.match(task, ev.path)]
+                if not matched:
+                    continue
+                processor = get_processor(task.processor_type)
+                if len(matched) > 1 and callable(getattr(processor, "process_batch", None)):
+                    await self.execute_batch(task, matched)
+                    continue
+                for ev in matched:
+                    await self.execute(task, ev.path)
 
     def match(self, task: AutomationTask, path: str) -> bool:
         if task.path_pattern and not path.startswith(task.path_pattern):
@@ -24,12 +41,24 @@ class TaskService:
         return True
 
     async def execute(self, task: AutomationTask, path: str):
-        await task_queue_service.add_task(
-            "automation_task",
-            {
-                "task_id": task.id,
-                "path": path,
-            },
+        task_info = {
+            "task_id": task.id,
+            "path": path,
+        }
+        await task_queue_service.add_task("automation_task", task_info)
+
+    async def execute_batch(self, task: AutomationTask, events: List[FileEvent]):
+        for i in range(0, len(events), AUTOMATION_BATCH_SIZE):
+            await task_queue_service.add_task(
+                "automation_batch",
+                {
+                    "task_id": task.id,
+                    "paths": [ev.path for ev in events[i:i + AUTOMATION_BATCH_SIZE]],
+                },
+            )
+        await LogService.info(
+            "tasks", f"Batched {len(events)} {task.event} events for task {task.id}",
+            details={"task_id": task.id, "count": len(events)},
         )
 
-task_service = TaskService()
\ No newline at end of file
+task_service = TaskService()
@@ -40,7 +40,8 @@ def _ensure_cache_dir(p: Path):
     p.parent.mkdir(parents=True, exist_ok=True)
 
 
-def generate_thumb(data: bytes, w: int, h: int, fit: str, is_raw: bool = False) -> Tuple[bytes, str]:
+def generate_thumb(data: bytes, w: int, h: int, fit: str, is_raw: bool = False,
+                   fmt: str = 'WEBP', quality: int = 80) -> Tuple[bytes, str]:
     from PIL import Image
     if is_raw:
         try:
@@ -81,9 +82,19 @@ def generate_thumb(data: bytes, w: int, h: int, fit: str, is_raw: bool = False)
         im = im.crop((left, top, left + w, top + h))
     else:
         im.thumbnail((w, h))
+    fmt = fmt.upper()
+    if fmt == 'JPEG' and im.mode != 'RGB':
+        im = im.convert('RGB')
     buf = io.BytesIO()
-    im.save(buf, 'WEBP', quality=80)
-    return buf.getvalue(), 'image/webp'
+    im.save(buf, fmt, quality=quality)
+    return buf.getvalue(), f'image/{fmt.lower()}'
+
+
+def image_size(data: bytes) -> Tuple[int, int, str]:
+    """只读取文件头，返回 (宽, 高, 格式)"""
+    from PIL import Image
+    with Image.open(io.BytesIO(data)) as im:
+        return im.width, im.height, (im.format or '').upper()
 
 
 async def get_or_create_thumb(adapter, adapter_id: int, root: str, rel: str, w: int, h: int, fit: str = 'cover'):
@@ -0,0 +1,412 @@
+import asyncio
+import hashlib
+import json
+import time
+from typing import Any, AsyncIterator, Callable, Dict
+
+from fastapi import HTTPException
+
+from models.database import TransferJob
+from services.batch_jobs import LIST_PAGE_SIZE, iter_dir_files
+from services.events import file_event_bus
+from services.logging import LogService
+
+DEFAULT_CONCURRENCY = 4
+MAX_CONCURRENCY = 16
+# 读端最多领先写端的块数，单个文件占用的内存以此为上限
+BUFFER_CHUNKS = 8
+CHECKPOINT_INTERVAL = 2.0
+VERIFY_MODES = ("none", "size", "checksum")
+
+
+class TransferVerifyError(Exception):
+    pass
+
+
+async def _try_stat(path: str) -> Dict[str, Any] | None:
+    from services.virtual_fs import stat_file
+
+    try:
+        return await stat_file(path)
+    except Exception:
+        return None
+
+
+async def _sha256_of(path: str) -> str:
+    from services.virtual_fs import read_file_stream
+
+    digest = hashlib.sha256()
+    async for chunk in read_file_stream(path):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+async def _delete_source(path: str):
+    """移动完成后删除源文件；不发 file_deleted，索引由 file_moved 事件改挂到目标"""
+    from services.virtual_fs import resolve_adapter_and_rel
+
+    adapter, _, root, rel = await resolve_adapter_and_rel(path)
+    await adapter.delete(root, rel)
+
+
+async def _prune_empty_dirs(path: str) -> bool:
+    """目录移动完成后自底向上删除已清空的源目录；传输期间新出现的文件及其所在目录保留。
+    返回 path 本身是否已删除"""
+    from services.virtual_fs import list_virtual_dir
+
+    subdirs = []
+    has_files = False
+    page_num = 1
+    while True:
+        listing = await list_virtual_dir(path, page_num, LIST_PAGE_SIZE, "name", "asc")
+        for ent in listing["items"]:
+            if ent.get("is_dir"):
+                subdirs.append(path.rstrip('/') + '/' + ent["name"])
+            else:
+                has_files = True
+        if page_num >= listing["pages"]:
+            break
+        page_num += 1
+    removed_all = True
+    for sub in subdirs:
+        if not await _prune_empty_dirs(sub):
+            removed_all = False
+    if has_files or not removed_all:
+        return False
+    await _delete_source(path)
+    return True
+
+
+async def copy_file(src: str, dst: str, overwrite: bool = False, verify: str = "size",
+                    on_bytes: Callable[[int], None] | None = None, resume: bool = False) -> Dict[str, Any]:
+    """把源文件的字节流经有界队列写入目标适配器的 write_file_stream，读写并行。
+    目标已存在且不允许覆盖时：resume（目标由本任务上次中断前写入）且大小相同（checksum 模式下内容一致）
+    视为已传输，否则重写；
+    其他情况只有 checksum 校验下内容一致才跳过，不一致报 FileExistsError"""
+    from services.virtual_fs import read_file_stream, write_file_stream
+
+    src_stat = await _try_stat(src)
+    if src_stat is None:
+        raise FileNotFoundError(src)
+    expected = src_stat.get("size")
+    dst_stat = await _try_stat(dst)
+    if dst_stat is not None and not overwrite:
+        if dst_stat.get("is_dir"):
+            raise FileExistsError(dst)
+        same_size = expected is not None and dst_stat.get("size") == expected
+        if resume:
+            # 中断的写入可能已达到完整大小但内容未写完，checksum 模式下比对内容后才视为已传输
+            if same_size and (verify != "checksum" or await _sha256_of(dst) == await _sha256_of(src)):
+                return {"bytes": 0, "skipped": True}
+        elif same_size and verify == "checksum" and await _sha256_of(dst) == await _sha256_of(src):
+            return {"bytes": 0, "skipped": True}
+        else:
+            raise FileExistsError(dst)
+
+    queue: asyncio.Queue = asyncio.Queue(maxsize=BUFFER_CHUNKS)
+    digest = hashlib.sha256()
+    # 写入字节数以实际交给目标的数据为准，适配器 write_file_stream 的返回值不一定是字节数
+    sent = 0
+
+    async def pump():
+        try:
+            async for chunk in read_file_stream(src):
+                if chunk:
+                    digest.update(chunk)
+                    await queue.put(chunk)
+        except Exception as e:
+            await queue.put(e)
+            return
+        await queue.put(None)
+
+    async def drain() -> AsyncIterator[bytes]:
+        nonlocal sent
+        while True:
+            chunk = await queue.get()
+            if chunk is None:
+                return
+            if isinstance(chunk, Exception):
+                raise chunk
+            sent += len(chunk)
+            if on_bytes:
+                on_bytes(len(chunk))
+            yield chunk
+
+    # 源文件未变时续跑可接上目标适配器中断的分片上传
+    mtime = src_stat.get("mtime")
+    version = f"{src}|{mtime}" if mtime is not None else None
+    reader = asyncio.create_task(pump())
+    try:
+        await write_file_stream(dst, drain(), overwrite=True, size_hint=expected, version=version)
+    finally:
+        # 写端失败时读端可能阻塞在已满的队列上
+        reader.cancel()
+        await asyncio.gather(reader, return_exceptions=True)
+    transferred = sent
+
+    if verify != "none" and expected is not None and transferred != expected:
+        raise TransferVerifyError(f"大小不一致: 源 {expected} 字节，已写入 {transferred} 字节")
+    if verify in ("size", "checksum"):
+        written_stat = await _try_stat(dst)
+        if written_stat is not None and written_stat.get("size") not in (None, transferred):
+            raise TransferVerifyError(f"目标大小不一致: {written_stat.get('size')} != {transferred}")
+    checksum = digest.hexdigest()
+    if verify == "checksum" and await _sha256_of(dst) != checksum:
+        raise TransferVerifyError(f"校验和不一致: {dst}")
+    return {"bytes": transferred, "skipped": False, "sha256": checksum}
+
+
+class TransferService:
+    """跨挂载点的复制、移动：源文件流式写入目标，目录按并发工作者传输，以排队任务运行并可断点续跑"""
+
+    @staticmethod
+    def job_key(src: str, dst: str, operation: str, overwrite: bool, verify: str) -> str:
+        raw = json.dumps([src, dst, operation, overwrite, verify], ensure_ascii=False)
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    async def _get_job(self, src: str, dst: str, operation: str, overwrite: bool, verify: str,
+                       concurrency: int) -> TransferJob:
+        from services.task_queue import task_queue_service
+
+        if operation not in ("copy", "move"):
+            raise ValueError(f"Unknown transfer operation: {operation}")
+        if verify not in VERIFY_MODES:
+            raise ValueError(f"verify must be one of {', '.join(VERIFY_MODES)}")
+        src = '/' + src.strip('/')
+        dst = '/' + dst.strip('/')
+        if dst == src or dst.startswith(src + '/'):
+            raise ValueError("Destination is inside source")
+        key = self.job_key(src, dst, operation, overwrite, verify)
+        job = await TransferJob.filter(key=key).exclude(status="success").order_by("-id").first()
+        if not job:
+            job = await TransferJob.create(
+                key=key, src=src, dst=dst, operation=operation, overwrite=overwrite, verify=verify,
+                concurrency=max(1, min(concurrency, MAX_CONCURRENCY)),
+            )
+        if task_queue_service.get_active(f"transfer:{job.id}"):
+            # 同一任务正在运行，不改动它的状态
+            return job
+        if job.status == "failed":
+            # 重新提交失败的任务：检查点保留，只重试记录在 in_flight 中的失败文件与检查点之后的文件
+            job.failed = 0
+        job.status = "pending"
+        await job.save()
+        return job
+
+    async def submit(self, src: str, dst: str, operation: str = "copy", overwrite: bool = False,
+                     verify: str = "size", concurrency: int = DEFAULT_CONCURRENCY):
+        """提交传输任务；相同参数且未完成的任务会从上次的检查点继续"""
+        from services.task_queue import task_queue_service
+
+        job = await self._get_job(src, dst, operation, overwrite, verify, concurrency)
+        return await task_queue_service.add_task(
+            "transfer", {"job_id": job.id, "src": job.src, "dst": job.dst}, key=f"transfer:{job.id}",
+        )
+
+    async def transfer(self, src: str, dst: str, operation: str = "copy", overwrite: bool = False,
+                       verify: str = "size", concurrency: int = DEFAULT_CONCURRENCY) -> Dict[str, Any]:
+        """在当前请求内完成传输（WebDAV 等需要同步结果的调用方），有失败的文件时抛出异常"""
+        from services.task_queue import Task, task_queue_service
+
+        job = await self._get_job(src, dst, operation, overwrite, verify, concurrency)
+        if task_queue_service.get_active(f"transfer:{job.id}"):
+            raise HTTPException(409, detail="Transfer already running")
+        task = Task(name="transfer", task_info={"job_id": job.id})
+        progress = await self.run(task)
+        if progress["failed"]:
+            raise HTTPException(500, detail=f"Transfer failed for {progress['failed']} files")
+        return progress
+
+    async def resume_pending(self):
+        """启动时重新排队中断的传输任务"""
+        from services.task_queue import task_queue_service
+
+        for job in await TransferJob.filter(status__in=["pending", "running"]):
+            await task_queue_service.add_task(
+                "transfer", {"job_id": job.id, "src": job.src, "dst": job.dst}, key=f"transfer:{job.id}",
+            )
+
+    async def status(self, job_id: int) -> Dict[str, Any] | None:
+        job = await TransferJob.get_or_none(id=job_id)
+        if not job:
+            return None
+        return {
+            "id": job.id, "src": job.src, "dst": job.dst, "operation": job.operation,
+            "status": job.status, "processed": job.processed, "skipped": job.skipped, "failed": job.failed,
+            "bytes_transferred": job.bytes_transferred, "error": job.error,
+        }
+
+    async def _transfer_one(self, job: TransferJob, src: str, dst: str, resume: bool,
+                            on_bytes: Callable[[int], None], rewrite: bool = False) -> Dict[str, Any]:
+        move = job.operation == "move"
+        if move and resume and await _try_stat(src) is None and await _try_stat(dst) is not None:
+            # 上次中断前已移动完成但未来得及记录
+            return {"bytes": 0, "skipped": True}
+        result = await copy_file(src, dst, job.overwrite or rewrite, job.verify, on_bytes, resume=resume)
+        if move:
+            # 跳过只发生在目标由本任务写入（resume）或校验和一致时，此时删除源文件不会丢数据
+            await _delete_source(src)
+            await file_event_bus.emit("file_moved", dst, src=src)
+        return result
+
+    async def run(self, task) -> Dict[str, Any]:
+        job = await TransferJob.get(id=task.task_info["job_id"])
+        move = job.operation == "move"
+        concurrency = max(1, min(job.concurrency, MAX_CONCURRENCY))
+        queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+        completed: set[int] = set()
+        # 移动任务的源目录会随传输缩小，遍历序号不稳定，续跑时从头遍历剩余文件
+        resume_from = 0 if move else job.done_count
+        # 上次中断时正在写入、或写入失败的目标：由本任务写过，续跑时允许重写或按大小相同视为完成；
+        # 因目标已存在而失败的文件单独记录，续跑时重新尝试但不覆盖；
+        # 校验失败的目标内容已知有误，不能按大小视为完成，续跑时直接重写
+        saved = job.in_flight or []
+        if isinstance(saved, dict):
+            resumable = set(saved.get("writing") or [])
+            conflicts = set(saved.get("conflicts") or [])
+            corrupt = set(saved.get("corrupt") or [])
+        else:
+            resumable, conflicts, corrupt = set(saved), set(), set()
+        retry: set[str] = set()
+        new_conflicts: set[str] = set()
+        new_corrupt: set[str] = set()
+        in_flight: Dict[str, int] = {}
+        state = {"watermark": resume_from, "seen": 0, "bytes": 0, "saved_at": time.monotonic()}
+        started = time.monotonic()
+
+        def report():
+            elapsed = max(time.monotonic() - started, 1e-6)
+            task.progress = {
+                "job_id": job.id,
+                "processed": job.processed,
+                "skipped": job.skipped,
+                "failed": job.failed,
+                "done": state["watermark"],
+                "seen": state["seen"],
+                "bytes_transferred": job.bytes_transferred,
+                "bytes_per_sec": int(state["bytes"] / elapsed),
+                "elapsed": round(elapsed, 1),
+                "in_flight": dict(in_flight),
+            }
+
+        async def checkpoint(force: bool = False):
+            now = time.monotonic()
+            if not force and now - state["saved_at"] < CHECKPOINT_INTERVAL:
+                return
+            state["saved_at"] = now
+            job.done_count = state["watermark"]
+            # 尚未写出字节的目标可能是检查存在性前的他人文件，不记入
+            job.in_flight = {
+                "writing": sorted(retry | {d for d, n in in_flight.items() if n > 0}),
+                "conflicts": sorted(new_conflicts),
+                "corrupt": sorted(new_corrupt),
+            }
+            await job.save()
+
+        src_stat = await _try_stat(job.src)
+        if src_stat is None and not (move and job.processed):
+            raise HTTPException(404, detail="Source not found")
+        is_dir = bool(src_stat and src_stat.get("is_dir"))
+
+        async def producer():
+            if not is_dir:
+                if src_stat is not None:
+                    state["seen"] = 1
+                    if resume_from == 0 or job.dst in resumable or job.dst in conflicts or job.dst in corrupt:
+                        await queue.put((0, job.src, job.dst))
+                return
+            base = job.src.rstrip('/')
+            async for path in iter_dir_files(job.src):
+                index = state["seen"]
+                state["seen"] += 1
+                dst = job.dst.rstrip('/') + path[len(base):]
+                if index < resume_from and dst not in resumable and dst not in conflicts and dst not in corrupt:
+                    continue
+                await queue.put((index, path, dst))
+
+        async def worker():
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                index, src, dst = item
+                in_flight[dst] = 0
+
+                def on_bytes(n: int):
+                    in_flight[dst] += n
+                    job.bytes_transferred += n
+                    state["bytes"] += n
+
+                try:
+                    result = await self._transfer_one(
+                        job, src, dst, dst in resumable, on_bytes, rewrite=dst in corrupt,
+                    )
+                    if result["skipped"]:
+                        job.skipped += 1
+                    else:
+                        job.processed += 1
+                except Exception as e:
+                    job.failed += 1
+                    if isinstance(e, FileExistsError):
+                        new_conflicts.add(dst)
+                    elif isinstance(e, TransferVerifyError):
+                        new_corrupt.add(dst)
+                    elif not isinstance(e, FileNotFoundError):
+                        retry.add(dst)
+                    await LogService.warning(
+                        "transfer", f"Transfer failed for {src}: {e}", {"job_id": job.id, "src": src, "dst": dst},
+                    )
+                in_flight.pop(dst, None)
+                completed.add(index)
+                while state["watermark"] in completed:
+                    completed.remove(state["watermark"])
+                    state["watermark"] += 1
+                report()
+                await checkpoint()
+
+        job.status = "running"
+        job.error = None
+        await job.save()
+        await LogService.info(
+            "transfer", f"Transfer job {job.id} started: {job.src} -> {job.dst}",
+            {"job_id": job.id, "operation": job.operation, "resume_from": resume_from},
+        )
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        try:
+            await producer()
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        except asyncio.CancelledError:
+            # 服务停止：保留 running 状态与检查点，下次启动时续跑
+            for w in workers:
+                w.cancel()
+            await checkpoint(force=True)
+            raise
+        except Exception as e:
+            for w in workers:
+                w.cancel()
+            job.status = "failed"
+            job.error = str(e) or e.__class__.__name__
+            await checkpoint(force=True)
+            raise
+
+        if move and is_dir and not job.failed:
+            # 文件已逐个删除，这里只清理空目录，不能整体删除源目录以免带走传输期间新写入的文件
+            try:
+                await _prune_empty_dirs(job.src)
+            except Exception as e:
+                await LogService.warning("transfer", f"Failed to remove {job.src} after move: {e}", {"job_id": job.id})
+        job.status = "failed" if job.failed else "success"
+        job.in_flight = {
+            "writing": sorted(retry), "conflicts": sorted(new_conflicts), "corrupt": sorted(new_corrupt),
+        }
+        await checkpoint(force=True)
+        report()
+        await LogService.action(
+            "transfer", f"Transfer job {job.id} finished: {job.src} -> {job.dst}", {"job_id": job.id, **task.progress},
+        )
+        return task.progress
+
+
+transfer_service = TransferService()
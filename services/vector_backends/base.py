@@ -0,0 +1,80 @@
+from typing import Any, Dict, Iterator, List, Protocol, Tuple
+
+DEFAULT_DIM = 4096
+DEFAULT_INDEX_TYPE = "IVF_FLAT"
+EXT_MAX_LENGTH = 32
+SNIPPET_MAX_LENGTH = 256
+# 与向量一同保存的元数据字段，供检索时过滤
+METADATA_FIELDS = ("ext", "size", "mtime")
+# 向量集合的结构版本：1 增加元数据字段；2 以 id 为主键，一个文件可有多条分块记录（path、offset、snippet）
+SCHEMA_VERSION = 2
+CHUNK_FIELDS = ("path", "offset", "snippet")
+
+
+def chunk_id(path: str, offset: int) -> str:
+    return f"{path}#{offset}"
+
+
+def path_ext(path: str) -> str:
+    name = path.rsplit('/', 1)[-1]
+    return name.rsplit('.', 1)[-1].lower()[:EXT_MAX_LENGTH] if '.' in name else ""
+
+
+def match_filters(entity: Dict[str, Any], filters: Dict[str, Any] | None) -> bool:
+    """判断一条记录是否满足过滤条件，filters 可含
+    path_prefix / exts / min_size / max_size / mtime_from / mtime_to"""
+    if not filters:
+        return True
+    path = entity.get("path") or ""
+    prefix = filters.get("path_prefix")
+    if prefix and prefix != '/' and path != prefix and not path.startswith(prefix.rstrip('/') + '/'):
+        return False
+    exts = filters.get("exts")
+    if exts and (entity.get("ext") or path_ext(path)) not in exts:
+        return False
+    size = entity.get("size") or 0
+    mtime = entity.get("mtime") or 0
+    if filters.get("min_size") is not None and size < filters["min_size"]:
+        return False
+    if filters.get("max_size") is not None and size > filters["max_size"]:
+        return False
+    if filters.get("mtime_from") is not None and mtime < filters["mtime_from"]:
+        return False
+    if filters.get("mtime_to") is not None and mtime > filters["mtime_to"]:
+        return False
+    return True
+
+
+class VectorBackend(Protocol):
+    """向量后端接口；所有方法均为同步调用，由 services.vector_store 在专用线程中执行"""
+
+    is_local: bool
+
+    def resolve_index(self, index_type: str | None, dim: int,
+                      params: Dict[str, Any] | None = None) -> Tuple[str, Dict[str, Any], Dict[str, Any]]: ...
+    def ensure_collection(self, collection_name: str, vector: bool = True, dim: int = DEFAULT_DIM,
+                          index_type: str | None = None, index_params: Dict[str, Any] | None = None,
+                          model: str | None = None): ...
+    def collection_info(self, collection_name: str) -> Dict[str, Any] | None: ...
+    def rebuild_index(self, collection_name: str, index_type: str | None, index_params: Dict[str, Any] | None = None): ...
+    def iter_paths(self, collection_name: str, batch_size: int = 1000) -> Iterator[List[str]]: ...
+    def drop_collection(self, collection_name: str): ...
+    def upsert_vector(self, collection_name: str, data): ...
+    def delete_vector(self, collection_name: str, path: str): ...
+    def delete_vectors(self, collection_name: str, paths: List[str]): ...
+    def delete_stale_chunks(self, collection_name: str, path: str, keep_ids: List[str]) -> int: ...
+    def move_path(self, collection_name: str, src: str, dst: str) -> int: ...
+    def search_vectors(self, collection_name: str, query_embedding, top_k: int = 5,
+                       filters: Dict[str, Any] | None = None): ...
+    def search_by_path(self, collection_name: str, query_path: str, top_k: int = 20): ...
+    def clear_all_data(self): ...
+    def close(self): ...
+
+# 约定：每个后端模块需定义
+# BACKEND_TYPE: str
+# BACKEND_FACTORY: Callable[[], VectorBackend]
+# upsert_vector 的每行含 path、embedding，可选 id（缺省为 path）、offset、snippet 与元数据字段
+# delete_vectors / move_path / iter_paths 以文件路径为单位，作用于该文件的全部分块
+# search_vectors 返回与 MilvusClient.search 相同的结构：
+#   [[{"id", "distance", "entity": {"path", "offset", "snippet", "ext", "size", "mtime"}}]]
+# filters 在近邻检索时预过滤（语义同 match_filters）；collection_info 的 schema 为集合的结构版本
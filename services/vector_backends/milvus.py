@@ -0,0 +1,348 @@
+import json
+import os
+from typing import Any, Dict, Iterator, List, Tuple
+
+from pymilvus import CollectionSchema, DataType, FieldSchema, MilvusClient
+
+from services.vector_backends.base import (
+    CHUNK_FIELDS, DEFAULT_DIM, DEFAULT_INDEX_TYPE, EXT_MAX_LENGTH, METADATA_FIELDS, SCHEMA_VERSION,
+    SNIPPET_MAX_LENGTH, path_ext,
+)
+
+DEFAULT_URI = "data/db/milvus.db"
+PATH_MAX_LENGTH = 2048
+# 分块主键为 "路径#偏移"
+ID_MAX_LENGTH = PATH_MAX_LENGTH + 32
+# 每个结构版本在 path、embedding 之外的标量字段
+SCHEMA_FIELDS = {0: (), 1: METADATA_FIELDS, 2: ("id", *CHUNK_FIELDS[1:], *METADATA_FIELDS)}
+# 索引类型 -> (建索引参数, 检索参数)
+INDEX_TYPES: Dict[str, Tuple[Dict[str, Any], Dict[str, Any]]] = {
+    "FLAT": ({}, {}),
+    "IVF_FLAT": ({"nlist": 128}, {"nprobe": 16}),
+    "IVF_SQ8": ({"nlist": 128}, {"nprobe": 16}),
+    "IVF_PQ": ({"nlist": 128, "nbits": 8}, {"nprobe": 16}),
+    "HNSW": ({"M": 16, "efConstruction": 200}, {"ef": 64}),
+    "AUTOINDEX": ({}, {}),
+}
+# Milvus Lite（本地 .db 文件）只支持这几种索引
+LOCAL_INDEX_TYPES = {"FLAT", "IVF_FLAT", "AUTOINDEX"}
+# 按路径子串查询时多取的候选倍数
+PATH_SEARCH_OVERFETCH = 4
+
+
+def _pq_segments(dim: int) -> int:
+    """IVF_PQ 的子向量数须整除维度，取不超过 dim/4 的最大候选值"""
+    for m in (64, 32, 16, 8, 4, 2):
+        if m <= max(dim // 4, 1) and dim % m == 0:
+            return m
+    return 1
+
+
+def _complete_row(r: Dict[str, Any], fields) -> Dict[str, Any]:
+    """Milvus Lite 不支持字段默认值：补齐缺省字段，并丢弃旧结构集合不认识的字段"""
+    path = r["path"]
+    defaults = {"id": path, "offset": 0, "snippet": "", "ext": path_ext(path), "size": 0, "mtime": 0}
+    row = {"path": path, "embedding": r["embedding"]}
+    for field in fields:
+        value = r.get(field)
+        row[field] = defaults[field] if value is None else value
+    if "snippet" in row:
+        row["snippet"] = row["snippet"][:SNIPPET_MAX_LENGTH]
+    return row
+
+
+def _quote(value: str) -> str:
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def _prefix_expr(prefix: str) -> str:
+    """路径等于 prefix 或位于其下。用字符串区间比较而不是 LIKE，路径中的 % 与 _ 不会被当作通配符
+    （'0' 是 '/' 的下一个字符）"""
+    return (f"(path == {_quote(prefix)} or "
+            f"(path >= {_quote(prefix + '/')} and path < {_quote(prefix + '0')}))")
+
+
+def _filter_expr(filters: Dict[str, Any] | None) -> str:
+    """把过滤条件转换为 Milvus 布尔表达式，检索时在近邻搜索内部预过滤"""
+    if not filters:
+        return ""
+    clauses = []
+    prefix = (filters.get("path_prefix") or "").rstrip('/')
+    if prefix:
+        clauses.append(_prefix_expr(prefix))
+    if filters.get("exts"):
+        clauses.append(f"ext in [{', '.join(_quote(e) for e in filters['exts'])}]")
+    for key, field, op in (("min_size", "size", ">="), ("max_size", "size", "<="),
+                           ("mtime_from", "mtime", ">="), ("mtime_to", "mtime", "<=")):
+        if filters.get(key) is not None:
+            clauses.append(f"{field} {op} {int(filters[key])}")
+    return " and ".join(clauses)
+
+
+class MilvusBackend:
+    """Milvus / Milvus Lite 向量后端"""
+
+    def __init__(self, uri: str | None = None):
+        # 设置 MILVUS_URI 可连接独立部署的 Milvus，以使用 HNSW、IVF_SQ8、IVF_PQ 等索引
+        self.uri = uri or os.getenv("MILVUS_URI", DEFAULT_URI)
+        self.client = MilvusClient(self.uri, token=os.getenv("MILVUS_TOKEN", ""))
+        self._search_params: Dict[str, Dict[str, Any]] = {}
+        self._schemas: Dict[str, int] = {}
+
+    @property
+    def is_local(self) -> bool:
+        return self.uri.endswith(".db")
+
+    def resolve_index(self, index_type: str | None, dim: int,
+                      params: Dict[str, Any] | None = None) -> Tuple[str, Dict[str, Any], Dict[str, Any]]:
+        """返回 (实际索引类型, 建索引参数, 检索参数)；本地模式下不支持的类型退回 IVF_FLAT"""
+        index_type = (index_type or DEFAULT_INDEX_TYPE).upper()
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unsupported vector index type: {index_type}")
+        if self.is_local and index_type not in LOCAL_INDEX_TYPES:
+            index_type = "IVF_FLAT"
+        build, search = INDEX_TYPES[index_type]
+        build = dict(build)
+        if index_type == "IVF_PQ":
+            build["m"] = _pq_segments(dim)
+        build.update((params or {}).get("build", {}))
+        search = {**search, **(params or {}).get("search", {})}
+        return index_type, build, search
+
+    def _create_index(self, collection_name, index_type: str, build: Dict[str, Any]):
+        index_params = MilvusClient.prepare_index_params()
+        index_params.add_index(
+            field_name="embedding",
+            index_type=index_type,
+            index_name="vector_index",
+            metric_type="COSINE",
+            params=build,
+        )
+        self.client.create_index(collection_name, index_params=index_params)
+
+    def ensure_collection(self, collection_name, vector: bool = True, dim: int = DEFAULT_DIM,
+                          index_type: str | None = None, index_params: Dict[str, Any] | None = None,
+                          model: str | None = None):
+        if self.client.has_collection(collection_name):
+            return
+        if vector:
+            fields = [
+                FieldSchema(name="id", dtype=DataType.VARCHAR,
+                            max_length=ID_MAX_LENGTH, is_primary=True, auto_id=False),
+                FieldSchema(name="path", dtype=DataType.VARCHAR, max_length=PATH_MAX_LENGTH),
+                FieldSchema(name="offset", dtype=DataType.INT64),
+                FieldSchema(name="snippet", dtype=DataType.VARCHAR, max_length=SNIPPET_MAX_LENGTH),
+                FieldSchema(name="embedding",
+                            dtype=DataType.FLOAT_VECTOR, dim=dim),
+                FieldSchema(name="ext", dtype=DataType.VARCHAR, max_length=EXT_MAX_LENGTH),
+                FieldSchema(name="size", dtype=DataType.INT64),
+                FieldSchema(name="mtime", dtype=DataType.INT64),
+            ]
+            # 集合描述中记录嵌入模型与结构版本，变更时据此触发重建
+            schema = CollectionSchema(
+                fields, description=json.dumps({"model": model, "dim": dim, "schema": SCHEMA_VERSION}))
+            self.client.create_collection(collection_name, schema=schema)
+            resolved, build, search = self.resolve_index(index_type, dim, index_params)
+            self._create_index(collection_name, resolved, build)
+            self._search_params[collection_name] = search
+        else:
+            fields = [
+                FieldSchema(name="path", dtype=DataType.VARCHAR,
+                            max_length=PATH_MAX_LENGTH, is_primary=True, auto_id=False),
+            ]
+            schema = CollectionSchema(fields, description="Simple file index")
+            self.client.create_collection(collection_name, schema=schema)
+
+    def collection_info(self, collection_name) -> Dict[str, Any] | None:
+        """返回集合的维度、嵌入模型与索引类型，集合不存在时返回 None"""
+        if not self.client.has_collection(collection_name):
+            return None
+        desc = self.client.describe_collection(collection_name)
+        info: Dict[str, Any] = {"vector": False, "dim": None, "model": None, "index_type": None, "schema": 0}
+        for field in desc.get("fields", []):
+            if field.get("name") == "embedding":
+                info["vector"] = True
+                info["dim"] = int(field.get("params", {}).get("dim", 0)) or None
+            elif field.get("name") == "ext":
+                info["schema"] = max(info["schema"], 1)
+        try:
+            meta = json.loads(desc.get("description") or "{}")
+            if isinstance(meta, dict):
+                info["model"] = meta.get("model")
+                info["schema"] = meta.get("schema", info["schema"])
+        except ValueError:
+            pass
+        if info["vector"]:
+            try:
+                info["index_type"] = self.client.describe_index(collection_name, "vector_index").get("index_type")
+            except Exception:
+                pass
+        return info
+
+    def rebuild_index(self, collection_name, index_type: str | None, index_params: Dict[str, Any] | None = None):
+        """就地替换向量索引类型，数据不动"""
+        info = self.collection_info(collection_name)
+        if not info or not info["vector"]:
+            return
+        resolved, build, search = self.resolve_index(index_type, info["dim"], index_params)
+        self.client.release_collection(collection_name)
+        self.client.drop_index(collection_name, "vector_index")
+        self._create_index(collection_name, resolved, build)
+        self.client.load_collection(collection_name)
+        self._search_params[collection_name] = search
+
+    def iter_paths(self, collection_name, batch_size: int = 1000) -> Iterator[List[str]]:
+        if not self.client.has_collection(collection_name):
+            return
+        iterator = self.client.query_iterator(
+            collection_name, batch_size=batch_size, filter='path != ""', output_fields=["path"],
+        )
+        seen = set()
+        try:
+            while True:
+                rows = iterator.next()
+                if not rows:
+                    return
+                # 同一文件的多个分块只返回一次
+                batch = [p for p in dict.fromkeys(r["path"] for r in rows) if p not in seen]
+                seen.update(batch)
+                if batch:
+                    yield batch
+        finally:
+            iterator.close()
+
+    def drop_collection(self, collection_name):
+        self._search_params.pop(collection_name, None)
+        self._schemas.pop(collection_name, None)
+        if self.client.has_collection(collection_name):
+            self.client.drop_collection(collection_name)
+
+    def _schema(self, collection_name) -> int:
+        """集合结构版本；-1 表示普通（无向量）集合"""
+        if collection_name not in self._schemas:
+            info = self.collection_info(collection_name)
+            if info is None:
+                return SCHEMA_VERSION
+            self._schemas[collection_name] = info["schema"] if info["vector"] else -1
+        return self._schemas[collection_name]
+
+    def upsert_vector(self, collection_name, data):
+        rows = data if isinstance(data, list) else [data]
+        schema = self._schema(collection_name)
+        if schema >= 0:
+            fields = SCHEMA_FIELDS[min(schema, SCHEMA_VERSION)]
+            rows = [_complete_row(r, fields) for r in rows]
+        self.client.upsert(collection_name, rows)
+
+    def _path_expr(self, paths: List[str]) -> str:
+        return f"path in [{', '.join(_quote(p) for p in paths)}]"
+
+    def delete_vector(self, collection_name, path: str):
+        self.delete_vectors(collection_name, [path])
+
+    def delete_vectors(self, collection_name, paths: list[str]):
+        if not paths or not self.client.has_collection(collection_name):
+            return
+        if self._schema(collection_name) < 2:
+            self.client.delete(collection_name, ids=paths)
+            return
+        for i in range(0, len(paths), 256):
+            self.client.delete(collection_name, filter=self._path_expr(paths[i:i + 256]))
+
+    def delete_stale_chunks(self, collection_name, path: str, keep_ids: List[str], page_size: int = 1000) -> int:
+        """删除文件中 id 不在 keep_ids 里的分块（重新索引后不再产生的旧分块）"""
+        if not self.client.has_collection(collection_name) or self._schema(collection_name) < 2:
+            return 0
+        keep = set(keep_ids)
+        iterator = self.client.query_iterator(
+            collection_name, batch_size=page_size, filter=self._path_expr([path]), output_fields=["id"],
+        )
+        stale = []
+        try:
+            while True:
+                rows = iterator.next()
+                if not rows:
+                    break
+                stale.extend(r["id"] for r in rows if r["id"] not in keep)
+        finally:
+            iterator.close()
+        for i in range(0, len(stale), 256):
+            self.client.delete(collection_name, ids=stale[i:i + 256])
+        return len(stale)
+
+    def move_path(self, collection_name, src: str, dst: str, page_size: int = 1000) -> int:
+        """将 src（文件或目录）下的索引记录改挂到 dst，沿用已有向量，无需重新嵌入"""
+        if not self.client.has_collection(collection_name):
+            return 0
+        src = src.rstrip('/')
+        dst = dst.rstrip('/')
+        expr = _prefix_expr(src)
+        moved = 0
+        while True:
+            rows = self.client.query(collection_name, filter=expr, limit=page_size, output_fields=["*"])
+            if not rows:
+                return moved
+            # 主键不可修改：先写入新路径，再删除旧路径
+            pk = "id" if "id" in rows[0] else "path"
+            moved_rows = []
+            for r in rows:
+                new = dst + r["path"][len(src):]
+                row = {**r, "path": new}
+                if "ext" in r:
+                    row["ext"] = path_ext(new)
+                if "id" in r:
+                    row["id"] = new + r["id"][len(r["path"]):]
+                moved_rows.append(row)
+            self.client.upsert(collection_name, moved_rows)
+            self.client.delete(collection_name, ids=[r[pk] for r in rows])
+            moved += len(rows)
+            if len(rows) < page_size:
+                return moved
+
+    def _get_search_params(self, collection_name) -> Dict[str, Any]:
+        if collection_name not in self._search_params:
+            info = self.collection_info(collection_name) or {}
+            index_type = info.get("index_type")
+            self._search_params[collection_name] = dict(INDEX_TYPES.get(index_type, ({}, {}))[1])
+        return self._search_params[collection_name]
+
+    def search_vectors(self, collection_name, query_embedding, top_k=5, filters: Dict[str, Any] | None = None):
+        search_params = {"metric_type": "COSINE", "params": self._get_search_params(collection_name)}
+        schema = self._schema(collection_name)
+        results = self.client.search(
+            collection_name,
+            data=[query_embedding],
+            anns_field="embedding",
+            search_params=search_params,
+            limit=top_k,
+            filter=_filter_expr(filters) if schema >= 1 else _filter_expr({"path_prefix": (filters or {}).get("path_prefix")}),
+            output_fields=["path", *[f for f in SCHEMA_FIELDS.get(schema, ()) if f != "id"]]
+        )
+        return results
+
+    def search_by_path(self, collection_name, query_path, top_k=20):
+        # 查询中的通配符与转义符换成单字符通配 _，再在本地按子串过滤掉因此多匹配的行
+        pattern = query_path.replace('\\', '_').replace('%', '_')
+        results = self.client.query(
+            collection_name,
+            filter=f"path like {_quote('%' + pattern + '%')}",
+            limit=top_k * PATH_SEARCH_OVERFETCH,
+            output_fields=["path"]
+        )
+        paths = list(dict.fromkeys(r['path'] for r in results if query_path in r['path']))[:top_k]
+        return [[{'id': p, 'distance': 1.0, 'entity': {'path': p}} for p in paths]]
+
+    def clear_all_data(self):
+        """清空所有集合的内容"""
+        collections = self.client.list_collections()
+        for collection_name in collections:
+            self.client.drop_collection(collection_name)
+        self._search_params.clear()
+        self._schemas.clear()
+
+    def close(self):
+        self.client.close()
+
+
+BACKEND_TYPE = "milvus"
+BACKEND_FACTORY = MilvusBackend
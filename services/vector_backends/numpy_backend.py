@@ -0,0 +1,499 @@
+import json
+import os
+import shutil
+from typing import Any, Dict, Iterator, List, Set, Tuple
+
+import numpy as np
+
+from services.vector_backends.base import DEFAULT_DIM, SCHEMA_VERSION, SNIPPET_MAX_LENGTH, path_ext
+
+DEFAULT_ROOT = "data/db/vectors"
+DEFAULT_DTYPE = "float16"
+INITIAL_CAPACITY = 1024
+# 分块做矩阵乘法，避免把整个矩阵转换为 float32
+SEARCH_BLOCK = 65536
+COMPACT_MIN = 1024
+COMPACT_RATIO = 0.25
+# 压缩写好全部新文件后落下该标记，之后逐个替换；加载时有标记则继续替换，没有则丢弃残留的新文件
+COMPACT_MARKER = "compact.pending"
+COMPACT_FILES = ("vectors.npy", "scales.npy", "paths.log")
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _set_line(row: int, record: List[Any]) -> str:
+    return f"S\t{row}\t{json.dumps(record, ensure_ascii=False)}\n"
+
+
+class _Collection:
+    """单个集合：归一化向量保存在内存映射的 .npy 矩阵中；每行的 id、文件路径、分块偏移、摘要、
+    大小、修改时间与删除标记记录在追加日志里，加载时重放"""
+
+    def __init__(self, directory: str):
+        self.dir = directory
+        with open(self._file("meta.json"), "r", encoding="utf-8") as f:
+            self.meta: Dict[str, Any] = json.load(f)
+        self.vector: bool = self.meta["vector"]
+        self.dim: int = self.meta.get("dim") or 0
+        self.dtype: str = self.meta.get("dtype", DEFAULT_DTYPE)
+        self.schema: int = self.meta.get("schema", 1 if self.meta.get("metadata") else 0)
+        self.ids: List[str | None] = []
+        self.files: List[str | None] = []
+        self.offsets: List[int] = []
+        self.snippets: List[str] = []
+        self.rows: Dict[str, int] = {}
+        self.by_path: Dict[str, Set[int]] = {}
+        self.tombstones = 0
+        self.vectors = self.scales = None
+        self._reset_rows(INITIAL_CAPACITY)
+        self._recover()
+        self._replay()
+        if self.vector:
+            self.vectors = np.load(self._file("vectors.npy"), mmap_mode="r+")
+            if self.dtype == "int8":
+                self.scales = np.load(self._file("scales.npy"), mmap_mode="r+")
+        self._log = open(self._file("paths.log"), "a", encoding="utf-8")
+
+    @classmethod
+    def create(cls, directory: str, vector: bool, dim: int, dtype: str, model: str | None) -> "_Collection":
+        os.makedirs(directory, exist_ok=True)
+        meta = {"vector": vector, "dim": dim if vector else None, "dtype": dtype, "model": model, "schema": SCHEMA_VERSION}
+        if vector:
+            np.lib.format.open_memmap(
+                os.path.join(directory, "vectors.npy"), mode="w+",
+                dtype=np.int8 if dtype == "int8" else np.float16, shape=(INITIAL_CAPACITY, dim),
+            ).flush()
+            if dtype == "int8":
+                np.lib.format.open_memmap(
+                    os.path.join(directory, "scales.npy"), mode="w+", dtype=np.float32, shape=(INITIAL_CAPACITY,),
+                ).flush()
+        open(os.path.join(directory, "paths.log"), "w").close()
+        with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        return cls(directory)
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.dir, name)
+
+    def _recover(self):
+        """收尾上次中断的压缩：矩阵与日志要么都是压缩前的，要么都是压缩后的"""
+        if os.path.exists(self._file(COMPACT_MARKER)):
+            self._swap_compacted()
+            return
+        for name in COMPACT_FILES:
+            if os.path.exists(self._file(name + ".tmp")):
+                os.remove(self._file(name + ".tmp"))
+
+    def _swap_compacted(self):
+        for name in COMPACT_FILES:
+            if os.path.exists(self._file(name + ".tmp")):
+                os.replace(self._file(name + ".tmp"), self._file(name))
+        os.remove(self._file(COMPACT_MARKER))
+
+    def _reset_rows(self, capacity: int):
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.sizes = np.zeros(capacity, dtype=np.int64)
+        self.mtimes = np.zeros(capacity, dtype=np.int64)
+
+    def _replay(self):
+        with open(self._file("paths.log"), "r", encoding="utf-8") as f:
+            for line in f:
+                op, _, rest = line.rstrip("\n").partition("\t")
+                if op == "S":
+                    row_s, payload, *legacy = rest.split("\t")
+                    record = json.loads(payload)
+                    if not isinstance(record, list):
+                        # 旧格式：S 行号 路径 [大小 修改时间]
+                        size, mtime = (int(legacy[0]), int(legacy[1])) if len(legacy) == 2 else (0, 0)
+                        record = [record, record, 0, size, mtime, ""]
+                    self._set_row(int(row_s), record)
+                elif op == "D":
+                    self._clear_row(int(rest))
+
+    def _record(self, row: int) -> List[Any]:
+        return [self.ids[row], self.files[row], self.offsets[row],
+                int(self.sizes[row]), int(self.mtimes[row]), self.snippets[row]]
+
+    def _set_row(self, row: int, record: List[Any]):
+        id_, path, offset, size, mtime, snippet = record
+        if row >= len(self.ids):
+            extra = row + 1 - len(self.ids)
+            self.ids += [None] * extra
+            self.files += [None] * extra
+            self.offsets += [0] * extra
+            self.snippets += [""] * extra
+            self.tombstones += extra
+            self._grow(row + 1)
+        if self.ids[row] is None:
+            self.tombstones -= 1
+        else:
+            self._unlink(row)
+        self.ids[row], self.files[row], self.offsets[row], self.snippets[row] = id_, path, offset, snippet
+        self.sizes[row], self.mtimes[row] = size, mtime
+        self.alive[row] = True
+        self.rows[id_] = row
+        self.by_path.setdefault(path, set()).add(row)
+
+    def _unlink(self, row: int):
+        id_, path = self.ids[row], self.files[row]
+        if self.rows.get(id_) == row:
+            del self.rows[id_]
+        rows = self.by_path.get(path)
+        if rows is not None:
+            rows.discard(row)
+            if not rows:
+                del self.by_path[path]
+
+    def _clear_row(self, row: int):
+        if row >= len(self.ids) or self.ids[row] is None:
+            return
+        self._unlink(row)
+        self.ids[row] = self.files[row] = None
+        self.snippets[row] = ""
+        self.alive[row] = False
+        self.tombstones += 1
+
+    def close(self):
+        self._log.close()
+        if self.vectors is not None:
+            self.vectors.flush()
+        if self.scales is not None:
+            self.scales.flush()
+
+    # ---- 写入 ----
+
+    def _grow(self, needed: int):
+        if self.alive.shape[0] < needed:
+            old = (self.alive, self.sizes, self.mtimes)
+            self._reset_rows(max(needed, self.alive.shape[0] * 2))
+            for new, arr in zip((self.alive, self.sizes, self.mtimes), old):
+                new[:arr.shape[0]] = arr
+        if not self.vector or self.vectors is None or self.vectors.shape[0] >= needed:
+            return
+        capacity = max(needed, self.vectors.shape[0] * 2)
+        self.vectors = self._regrow("vectors.npy", self.vectors, (capacity, self.dim))
+        if self.scales is not None:
+            self.scales = self._regrow("scales.npy", self.scales, (capacity,))
+
+    def _regrow(self, name: str, old: np.memmap, shape: Tuple[int, ...]) -> np.memmap:
+        tmp = self._file(name + ".tmp")
+        new = np.lib.format.open_memmap(tmp, mode="w+", dtype=old.dtype, shape=shape)
+        new[:old.shape[0]] = old
+        new.flush()
+        del new, old
+        os.replace(tmp, self._file(name))
+        return np.load(self._file(name), mmap_mode="r+")
+
+    def _store(self, targets: List[int], vectors: np.ndarray):
+        if self.dtype == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            self.vectors[targets] = np.round(vectors / scales[:, None]).astype(np.int8)
+            self.scales[targets] = scales
+            self.scales.flush()
+        else:
+            self.vectors[targets] = vectors.astype(np.float16)
+        self.vectors.flush()
+
+    def upsert(self, rows: List[Dict[str, Any]]):
+        targets, records = [], []
+        next_row = len(self.ids)
+        for r in rows:
+            id_ = r.get("id") or r["path"]
+            row = self.rows.get(id_)
+            if row is None:
+                row = next_row
+                next_row += 1
+            targets.append(row)
+            records.append([id_, r["path"], int(r.get("offset") or 0), int(r.get("size") or 0),
+                            int(r.get("mtime") or 0), (r.get("snippet") or "")[:SNIPPET_MAX_LENGTH]])
+        self._grow(next_row)
+        if self.vector:
+            vectors = np.asarray([r["embedding"] for r in rows], dtype=np.float32)
+            if vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match collection dimension {self.dim}")
+            # 先写向量再写日志，崩溃时日志不会指向未写入的行
+            self._store(targets, _normalize(vectors))
+        for row, record in zip(targets, records):
+            self._set_row(row, record)
+        self._log.writelines(_set_line(row, record) for row, record in zip(targets, records))
+        self._log.flush()
+
+    def delete(self, paths: List[str], compact: bool = True):
+        """删除文件的全部分块；compact 为 False 时不触发压缩（压缩会重排行号）"""
+        lines = []
+        for path in paths:
+            for row in list(self.by_path.get(path, ())):
+                self._clear_row(row)
+                lines.append(f"D\t{row}\n")
+        self._log.writelines(lines)
+        self._log.flush()
+        if compact:
+            self._maybe_compact()
+
+    def delete_stale(self, path: str, keep_ids: Set[str]) -> int:
+        """删除文件中 id 不在 keep_ids 里的分块（重新索引后不再产生的旧分块）"""
+        stale = [row for row in self.by_path.get(path, ()) if self.ids[row] not in keep_ids]
+        for row in stale:
+            self._clear_row(row)
+        self._log.writelines(f"D\t{row}\n" for row in stale)
+        self._log.flush()
+        self._maybe_compact()
+        return len(stale)
+
+    def _maybe_compact(self):
+        if self.tombstones >= COMPACT_MIN and self.tombstones > COMPACT_RATIO * len(self.ids):
+            self.compact()
+
+    def move(self, src: str, dst: str) -> int:
+        prefix = src + '/'
+        moved = [p for p in self.by_path if p == src or p.startswith(prefix)]
+        renames = [(old, dst + old[len(src):]) for old in moved]
+        # 先删除会被覆盖的目标且不压缩，移动过程中行号保持不变
+        sources = set(moved)
+        self.delete([new for _, new in renames if new in self.by_path and new not in sources], compact=False)
+        lines = []
+        for old, new in renames:
+            for row in list(self.by_path.get(old, ())):
+                record = self._record(row)
+                record[0] = new + record[0][len(old):]
+                record[1] = new
+                self._set_row(row, record)
+                lines.append(_set_line(row, record))
+        self._log.writelines(lines)
+        self._log.flush()
+        self._maybe_compact()
+        return len(moved)
+
+    def compact(self):
+        """清除删除标记：存活行前移，重写矩阵与日志。新文件全部写好后落下标记再逐个替换，
+        中途崩溃时加载阶段会据标记完成替换或丢弃新文件"""
+        keep = [row for row, id_ in enumerate(self.ids) if id_ is not None]
+        records = [self._record(row) for row in keep]
+        if self.vector:
+            capacity = max(len(keep), INITIAL_CAPACITY)
+            for name, arr in (("vectors.npy", self.vectors), ("scales.npy", self.scales)):
+                if arr is None:
+                    continue
+                tmp = self._file(name + ".tmp")
+                shape = (capacity, self.dim) if arr.ndim == 2 else (capacity,)
+                new = np.lib.format.open_memmap(tmp, mode="w+", dtype=arr.dtype, shape=shape)
+                for start in range(0, len(keep), SEARCH_BLOCK):
+                    idx = keep[start:start + SEARCH_BLOCK]
+                    new[start:start + len(idx)] = arr[idx]
+                new.flush()
+                del new
+        with open(self._file("paths.log.tmp"), "w", encoding="utf-8") as f:
+            f.writelines(_set_line(row, record) for row, record in enumerate(records))
+            f.flush()
+            os.fsync(f.fileno())
+        marker = self._file(COMPACT_MARKER)
+        with open(marker + ".tmp", "w") as f:
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(marker + ".tmp", marker)
+
+        self._log.close()
+        self.vectors = self.scales = None
+        self._swap_compacted()
+        if self.vector:
+            self.vectors = np.load(self._file("vectors.npy"), mmap_mode="r+")
+            if self.dtype == "int8":
+                self.scales = np.load(self._file("scales.npy"), mmap_mode="r+")
+        self._log = open(self._file("paths.log"), "a", encoding="utf-8")
+        self.ids, self.files, self.offsets, self.snippets = [], [], [], []
+        self.rows, self.by_path = {}, {}
+        self.tombstones = 0
+        self._reset_rows(max(len(records), INITIAL_CAPACITY))
+        for row, record in enumerate(records):
+            self._set_row(row, record)
+
+    # ---- 查询 ----
+
+    def filter_mask(self, filters: Dict[str, Any] | None) -> np.ndarray:
+        """存活且满足过滤条件的行"""
+        n = len(self.ids)
+        mask = self.alive[:n].copy()
+        if not filters:
+            return mask
+        prefix = (filters.get("path_prefix") or "").rstrip('/')
+        exts = set(filters.get("exts") or ())
+        if prefix or exts:
+            sub = prefix + '/'
+            for row in np.flatnonzero(mask):
+                path = self.files[row]
+                if (prefix and path != prefix and not path.startswith(sub)) or (exts and path_ext(path) not in exts):
+                    mask[row] = False
+        for key, arr, lower in (("min_size", self.sizes, True), ("max_size", self.sizes, False),
+                                ("mtime_from", self.mtimes, True), ("mtime_to", self.mtimes, False)):
+            if filters.get(key) is not None:
+                mask &= (arr[:n] >= filters[key]) if lower else (arr[:n] <= filters[key])
+        return mask
+
+    def search(self, queries: np.ndarray, top_k: int, mask: np.ndarray | None = None) -> List[List[Tuple[int, float]]]:
+        """分块矩阵乘法一次计算多个查询的余弦相似度，再用 argpartition 取 top-k；返回 (行号, 相似度)"""
+        n = len(self.ids)
+        queries = _normalize(np.asarray(queries, dtype=np.float32))
+        mask = self.alive[:n] if mask is None else mask
+        candidates = int(mask.sum())
+        if n == 0 or candidates == 0:
+            return [[] for _ in range(queries.shape[0])]
+        scores = np.empty((n, queries.shape[0]), dtype=np.float32)
+        for start in range(0, n, SEARCH_BLOCK):
+            end = min(start + SEARCH_BLOCK, n)
+            block = self.vectors[start:end].astype(np.float32)
+            scores[start:end] = block @ queries.T
+            if self.scales is not None:
+                scores[start:end] *= self.scales[start:end, None]
+        scores[~mask] = -np.inf
+        k = min(top_k, candidates)
+        results = []
+        for column in scores.T:
+            idx = np.argpartition(-column, k - 1)[:k]
+            idx = idx[np.argsort(-column[idx])]
+            results.append([(int(i), float(column[i])) for i in idx])
+        return results
+
+
+class NumpyBackend:
+    """纯 NumPy 向量后端：启动快、内存占用低，适合中小规模的文件库；检索为精确的暴力搜索"""
+
+    is_local = True
+
+    def __init__(self, root: str | None = None, dtype: str | None = None):
+        self.root = root or os.getenv("VECTOR_NUMPY_ROOT", DEFAULT_ROOT)
+        self.dtype = (dtype or os.getenv("VECTOR_NUMPY_DTYPE", DEFAULT_DTYPE)).lower()
+        if self.dtype not in ("float16", "int8"):
+            raise ValueError(f"Unsupported numpy vector dtype: {self.dtype}")
+        self._collections: Dict[str, _Collection] = {}
+
+    def _get(self, collection_name: str) -> _Collection | None:
+        col = self._collections.get(collection_name)
+        if col is None:
+            directory = os.path.join(self.root, collection_name)
+            if not os.path.exists(os.path.join(directory, "meta.json")):
+                return None
+            col = self._collections[collection_name] = _Collection(directory)
+        return col
+
+    def resolve_index(self, index_type: str | None, dim: int,
+                      params: Dict[str, Any] | None = None) -> Tuple[str, Dict[str, Any], Dict[str, Any]]:
+        return "FLAT", {}, {}
+
+    def ensure_collection(self, collection_name, vector: bool = True, dim: int = DEFAULT_DIM,
+                          index_type: str | None = None, index_params: Dict[str, Any] | None = None,
+                          model: str | None = None):
+        if self._get(collection_name) is not None:
+            return
+        self._collections[collection_name] = _Collection.create(
+            os.path.join(self.root, collection_name), vector, dim, self.dtype, model,
+        )
+
+    def collection_info(self, collection_name) -> Dict[str, Any] | None:
+        col = self._get(collection_name)
+        if col is None:
+            return None
+        return {
+            "vector": col.vector,
+            "dim": col.dim if col.vector else None,
+            "model": col.meta.get("model"),
+            "index_type": "FLAT" if col.vector else None,
+            "schema": col.schema,
+            "count": len(col.rows),
+            "files": len(col.by_path),
+            "dtype": col.dtype,
+        }
+
+    def rebuild_index(self, collection_name, index_type: str | None, index_params: Dict[str, Any] | None = None):
+        return
+
+    def iter_paths(self, collection_name, batch_size: int = 1000) -> Iterator[List[str]]:
+        col = self._get(collection_name)
+        if col is None:
+            return
+        paths = list(col.by_path)
+        for i in range(0, len(paths), batch_size):
+            yield paths[i:i + batch_size]
+
+    def drop_collection(self, collection_name):
+        col = self._collections.pop(collection_name, None)
+        if col is not None:
+            col.close()
+        shutil.rmtree(os.path.join(self.root, collection_name), ignore_errors=True)
+
+    def upsert_vector(self, collection_name, data):
+        col = self._get(collection_name)
+        if col is None:
+            raise ValueError(f"Collection {collection_name} does not exist")
+        col.upsert(data if isinstance(data, list) else [data])
+
+    def delete_vector(self, collection_name, path: str):
+        self.delete_vectors(collection_name, [path])
+
+    def delete_vectors(self, collection_name, paths: list[str]):
+        col = self._get(collection_name)
+        if col is not None and paths:
+            col.delete(paths)
+
+    def delete_stale_chunks(self, collection_name, path: str, keep_ids: List[str]) -> int:
+        col = self._get(collection_name)
+        if col is None:
+            return 0
+        return col.delete_stale(path, set(keep_ids))
+
+    def move_path(self, collection_name, src: str, dst: str) -> int:
+        col = self._get(collection_name)
+        if col is None:
+            return 0
+        return col.move(src.rstrip('/'), dst.rstrip('/'))
+
+    def search_many(self, collection_name, queries, top_k: int = 5,
+                    filters: Dict[str, Any] | None = None) -> List[List[Dict[str, Any]]]:
+        """批量查询：所有查询共用一次分块矩阵乘法；过滤条件先转换为行掩码再取 top-k"""
+        col = self._get(collection_name)
+        if col is None or not col.vector:
+            return [[] for _ in queries]
+        hits = col.search(np.asarray(queries, dtype=np.float32), top_k, col.filter_mask(filters) if filters else None)
+        return [[
+            {
+                "id": col.ids[row], "distance": score,
+                "entity": {
+                    "path": col.files[row], "offset": col.offsets[row], "snippet": col.snippets[row],
+                    "ext": path_ext(col.files[row]),
+                    "size": int(col.sizes[row]), "mtime": int(col.mtimes[row]),
+                },
+            }
+            for row, score in query_hits
+        ] for query_hits in hits]
+
+    def search_vectors(self, collection_name, query_embedding, top_k=5, filters: Dict[str, Any] | None = None):
+        return self.search_many(collection_name, [query_embedding], top_k, filters)
+
+    def search_by_path(self, collection_name, query_path, top_k=20):
+        col = self._get(collection_name)
+        found = []
+        if col is not None:
+            for path in col.by_path:
+                if query_path in path:
+                    found.append(path)
+                    if len(found) >= top_k:
+                        break
+        return [[{'id': p, 'distance': 1.0, 'entity': {'path': p}} for p in found]]
+
+    def clear_all_data(self):
+        for name in list(self._collections):
+            self.drop_collection(name)
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def close(self):
+        for col in self._collections.values():
+            col.close()
+        self._collections.clear()
+
+
+BACKEND_TYPE = "numpy"
+BACKEND_FACTORY = NumpyBackend
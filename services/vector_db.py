@@ -1,7 +1,26 @@
-from pymilvus import CollectionSchema, DataType, FieldSchema, MilvusClient
+import importlib
+import os
+
+from services.vector_backends.base import DEFAULT_DIM, DEFAULT_INDEX_TYPE, VectorBackend
+
+DEFAULT_BACKEND = "milvus"
+# 后端类型 -> 模块；按需导入，未使用的后端不要求安装其依赖
+BACKEND_MODULES = {
+    "milvus": "services.vector_backends.milvus",
+    "numpy": "services.vector_backends.numpy_backend",
+}
+
+
+def create_backend(backend_type: str, *args, **kwargs) -> VectorBackend:
+    backend_type = backend_type.lower()
+    if backend_type not in BACKEND_MODULES:
+        raise ValueError(f"Unsupported vector backend: {backend_type}")
+    module = importlib.import_module(BACKEND_MODULES[backend_type])
+    return module.BACKEND_FACTORY(*args, **kwargs)
 
 
 class VectorDBService:
+    """向量库单例：由 VECTOR_BACKEND 环境变量选择后端（milvus / numpy），方法调用转发给后端"""
     _instance = None
 
     def __new__(cls, *args, **kwargs):
@@ -10,74 +29,14 @@ class VectorDBService:
         return cls._instance
 
     def __init__(self):
-        if not hasattr(self, 'client'):
-            self.client = MilvusClient("data/db/milvus.db")
-
-    def ensure_collection(self, collection_name, vector: bool = True):
-        if self.client.has_collection(collection_name):
-            return
-        if vector:
-            fields = [
-                FieldSchema(name="path", dtype=DataType.VARCHAR,
-                            max_length=512, is_primary=True, auto_id=False),
-                FieldSchema(name="embedding",
-                            dtype=DataType.FLOAT_VECTOR, dim=4096)
-            ]
-            schema = CollectionSchema(
-                fields, description="Image vector collection")
-            self.client.create_collection(collection_name, schema=schema)
-            index_params = MilvusClient.prepare_index_params()
-            index_params.add_index(
-                field_name="embedding",
-                index_type="IVF_FLAT",
-                index_name="vector_index",
-                metric_type="COSINE",
-                params={
-                    "nlist": 64,
-                }
-            )
-            self.client.create_index(
-                collection_name,
-                index_params=index_params
-            )
-        else:
-            fields = [
-                FieldSchema(name="path", dtype=DataType.VARCHAR,
-                            max_length=512, is_primary=True, auto_id=False),
-            ]
-            schema = CollectionSchema(fields, description="Simple file index")
-            self.client.create_collection(collection_name, schema=schema)
-
-    def upsert_vector(self, collection_name, data):
-        self.client.upsert(collection_name, data)
-
-    def delete_vector(self, collection_name, path: str):
-        self.client.delete(collection_name, ids=[path])
+        if 'backend' not in self.__dict__:
+            self.backend_type = os.getenv("VECTOR_BACKEND", DEFAULT_BACKEND).lower()
+            self.backend: VectorBackend = create_backend(self.backend_type)
 
-    def search_vectors(self, collection_name, query_embedding, top_k=5):
-        search_params = {"metric_type": "COSINE"}
-        results = self.client.search(
-            collection_name,
-            data=[query_embedding],
-            anns_field="embedding",
-            search_params=search_params,
-            limit=top_k,
-            output_fields=["path"]
-        )
-        print(results)
-        return results
+    def __getattr__(self, name):
+        if name == 'backend':
+            raise AttributeError(name)
+        return getattr(self.backend, name)
 
-    def search_by_path(self, collection_name, query_path, top_k=20):
-        results = self.client.query(
-            collection_name,
-            filter=f"path like '%{query_path}%'",
-            limit=top_k,
-            output_fields=["path"]
-        )
-        return [[{'id': r['path'], 'distance': 1.0, 'entity': {'path': r['path']}} for r in results]]
 
-    def clear_all_data(self):
-        """清空所有集合的内容"""
-        collections = self.client.list_collections()
-        for collection_name in collections:
-            self.client.drop_collection(collection_name)
+__all__ = ["DEFAULT_DIM", "DEFAULT_INDEX_TYPE", "VectorDBService", "create_backend"]
@@ -0,0 +1,395 @@
+import asyncio
+import glob
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+from services.ai import embedding_model_key, get_text_embedding
+from services.config import ConfigCenter
+from services.logging import LogService
+from services.vector_backends.base import SCHEMA_VERSION, match_filters
+from services.vector_db import DEFAULT_INDEX_TYPE, VectorDBService
+
+DEFAULT_COLLECTION = "vector_collection"
+# 缓冲窗口内的写入合并为一次 upsert
+UPSERT_WINDOW = 0.05
+UPSERT_BATCH_SIZE = 256
+REBUILD_STATE_PATH = "data/db/vector_rebuild.json"
+REBUILD_CHUNK = 32
+# 后过滤时多取的候选倍数
+POST_FILTER_OVERFETCH = 4
+# 按文件聚合分块结果时多取的候选倍数
+CHUNK_OVERFETCH = 4
+
+
+class AsyncVectorStore:
+    """向量库后端的异步门面：所有调用在专用线程中串行执行，写入按批合并，集合存在性在内存中缓存"""
+
+    def __init__(self):
+        self._executor: ThreadPoolExecutor | None = None
+        self._collections: Dict[str, Tuple] = {}
+        self._pending: Dict[str, List[Tuple[Dict[str, Any], asyncio.Future]]] = {}
+        self._flushers: Dict[str, asyncio.Task] = {}
+        self._lock = asyncio.Lock()
+        # (配置版本, 配置推导出的默认规格)，配置写入后失效
+        self._spec: Tuple[int, Dict[str, Any]] | None = None
+        # 集合内容每次变化时递增，供查询结果缓存判断是否过期
+        self.version = 0
+
+    async def _run(self, fn, *args, **kwargs):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vector-store")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: fn(*args, **kwargs))
+
+    @property
+    def _db(self) -> VectorDBService:
+        return VectorDBService()
+
+    async def _default_spec(self) -> Dict[str, Any]:
+        if self._spec is not None and self._spec[0] == ConfigCenter.version:
+            return self._spec[1]
+        version = ConfigCenter.version
+        params = await ConfigCenter.get("VECTOR_INDEX_PARAMS")
+        if isinstance(params, str):
+            params = json.loads(params) if params.strip() else {}
+        configured_dim = await ConfigCenter.get("AI_EMBED_DIM")
+        try:
+            configured_dim = int(configured_dim)
+        except (TypeError, ValueError):
+            configured_dim = 0
+        spec = {
+            "model": await embedding_model_key(),
+            "dim": configured_dim or None,
+            "index_type": (await ConfigCenter.get("VECTOR_INDEX_TYPE") or DEFAULT_INDEX_TYPE).upper(),
+            "params": params or {},
+        }
+        self._spec = (version, spec)
+        return spec
+
+    async def index_spec(self, dim: int | None = None, model: str | None = None) -> Dict[str, Any]:
+        """当前配置下向量集合应有的模型、维度与索引类型；model 用于不走嵌入模型的集合（如本地图片特征）"""
+        spec = await self._default_spec()
+        return {
+            "model": model or spec["model"],
+            "dim": dim or (None if model else spec["dim"]) or None,
+            "index_type": spec["index_type"],
+            "params": dict(spec["params"]),
+        }
+
+    @staticmethod
+    def _spec_key(spec: Dict[str, Any]) -> Tuple:
+        return spec["model"], spec["dim"], spec["index_type"], json.dumps(spec["params"], sort_keys=True)
+
+    async def matches(self, collection_name: str, dim: int, model: str | None = None) -> bool:
+        """查询前检查集合是否存在且与当前嵌入模型（或给定的 model）和查询向量维度一致；只读，不触发重建"""
+        spec = await self.index_spec(dim, model)
+        if self._collections.get(collection_name) == self._spec_key(spec):
+            return True
+        info = await self._run(self._db.collection_info, collection_name)
+        return bool(info and info["vector"] and info["dim"] == dim
+                    and (not info["model"] or info["model"] == spec["model"]))
+
+    async def ensure_collection(self, collection_name: str, vector: bool = True, dim: int | None = None,
+                                model: str | None = None, rebuild_config: Dict[str, Any] | None = None):
+        """确保集合存在且与当前嵌入模型、维度、索引类型一致：
+        仅索引类型变化时就地重建索引；模型或维度变化时重建集合并排队重新嵌入。
+        rebuild_config 为重建时传给 vector_index 处理器的配置"""
+        if not vector:
+            if collection_name not in self._collections:
+                await self._run(self._db.ensure_collection, collection_name, False)
+                self._collections[collection_name] = ("simple",)
+            return
+        spec = await self.index_spec(dim, model)
+        if rebuild_config:
+            spec["rebuild_config"] = rebuild_config
+        key = self._spec_key(spec)
+        if self._collections.get(collection_name) == key:
+            return
+        async with self._lock:
+            if self._collections.get(collection_name) == key:
+                return
+            info = await self._run(self._db.collection_info, collection_name)
+            if info is None:
+                await self._create(collection_name, spec)
+            elif info["vector"] and spec["dim"] and (
+                info["dim"] != spec["dim"] or (info["model"] and info["model"] != spec["model"])
+            ):
+                await self._start_rebuild(collection_name, spec, reason=f"{info['model']}/{info['dim']}")
+            elif info["vector"] and info.get("schema", 0) < SCHEMA_VERSION:
+                # 旧结构的集合（缺少元数据或分块字段）；嵌入缓存命中，重建时无需重新调用模型
+                await self._start_rebuild(
+                    collection_name, {**spec, "dim": spec["dim"] or info["dim"]}, reason=f"schema {info.get('schema', 0)}",
+                )
+            elif info["vector"] and info["index_type"]:
+                resolved = self._db.resolve_index(spec["index_type"], info["dim"], spec["params"])[0]
+                if resolved != info["index_type"]:
+                    await self.flush(collection_name)
+                    await self._run(self._db.rebuild_index, collection_name, spec["index_type"], spec["params"])
+                    self.version += 1
+                    await LogService.info(
+                        "vector_store", f"Rebuilt index of {collection_name} as {resolved}",
+                        {"collection": collection_name, "from": info["index_type"], "to": resolved},
+                    )
+            self._collections[collection_name] = key
+
+    async def _create(self, collection_name: str, spec: Dict[str, Any]):
+        await self._run(
+            self._db.ensure_collection, collection_name, True,
+            dim=spec["dim"] or 4096, index_type=spec["index_type"],
+            index_params=spec["params"], model=spec["model"],
+        )
+
+    # ---- 模型变更后的重建 ----
+
+    @staticmethod
+    def _rebuild_state_path(collection_name: str) -> str:
+        """每个集合各自记录重建进度，默认集合沿用原有文件名"""
+        if collection_name == DEFAULT_COLLECTION:
+            return REBUILD_STATE_PATH
+        root, ext = os.path.splitext(REBUILD_STATE_PATH)
+        return f"{root}.{collection_name}{ext}"
+
+    def _load_rebuild(self, collection_name: str = DEFAULT_COLLECTION) -> Dict[str, Any] | None:
+        path = self._rebuild_state_path(collection_name)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_rebuild(self, collection_name: str, state: Dict[str, Any] | None):
+        path = self._rebuild_state_path(collection_name)
+        if state is None:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def _pending_rebuilds(self) -> List[str]:
+        root, ext = os.path.splitext(REBUILD_STATE_PATH)
+        names = []
+        for path in glob.glob(f"{root}*{ext}"):
+            with open(path, "r", encoding="utf-8") as f:
+                names.append(json.load(f)["collection"])
+        return names
+
+    def _collect_paths(self, collection_name: str) -> List[str]:
+        return [p for batch in self._db.iter_paths(collection_name) for p in batch]
+
+    async def _start_rebuild(self, collection_name: str, spec: Dict[str, Any], reason: str = ""):
+        """记录已索引路径，按新配置重建空集合，并排队重新嵌入这些文件"""
+        from services.task_queue import task_queue_service
+
+        await self.flush(collection_name)
+        paths = await self._run(self._collect_paths, collection_name)
+        state = await self._run(self._load_rebuild, collection_name)
+        if state:
+            # 上一次重建未完成：合并尚未处理的路径
+            paths = list(dict.fromkeys(state["paths"][state["done"]:] + paths))
+        # 先落盘待重建的路径再删除集合，中途崩溃时路径清单不会丢失
+        await self._run(self._save_rebuild, collection_name, {
+            "collection": collection_name, "paths": paths, "done": 0, "failed": 0, "model": spec["model"],
+            "config": spec.get("rebuild_config") or {"action": "create", "index_type": "vector"},
+        })
+        await self._run(self._db.drop_collection, collection_name)
+        await self._create(collection_name, spec)
+        self.version += 1
+        await LogService.info(
+            "vector_store", f"Rebuilding {collection_name} for {spec['model']}/{spec['dim']}",
+            {"collection": collection_name, "previous": reason, "paths": len(paths)},
+        )
+        await task_queue_service.add_task("vector_rebuild", {"collection": collection_name})
+
+    async def rebuild(self, collection_name: str = DEFAULT_COLLECTION):
+        """按当前配置强制重建集合并重新嵌入全部已索引文件"""
+        self._collections.pop(collection_name, None)
+        spec = await self.index_spec()
+        if not spec["dim"]:
+            # 未配置维度时用一次嵌入请求探测当前模型的输出维度
+            spec["dim"] = len(await get_text_embedding("dimension probe"))
+        async with self._lock:
+            await self._start_rebuild(collection_name, spec)
+
+    async def resume_rebuild(self):
+        """启动时续跑未完成的重建"""
+        from services.task_queue import task_queue_service
+
+        for collection_name in await self._run(self._pending_rebuilds):
+            await task_queue_service.add_task("vector_rebuild", {"collection": collection_name})
+
+    async def run_rebuild(self, task) -> Dict[str, Any]:
+        from services.virtual_fs import process_file
+
+        collection_name = (task.task_info or {}).get("collection", DEFAULT_COLLECTION)
+        state = await self._run(self._load_rebuild, collection_name)
+        if not state:
+            return {}
+        paths = state["paths"]
+        config = state.get("config") or {"action": "create", "index_type": "vector"}
+        started = time.monotonic()
+        for i in range(state["done"], len(paths), REBUILD_CHUNK):
+            chunk = paths[i:i + REBUILD_CHUNK]
+            results = await asyncio.gather(
+                *(process_file(p, "vector_index", config) for p in chunk), return_exceptions=True,
+            )
+            state["failed"] += sum(1 for r in results if isinstance(r, Exception))
+            state["done"] = i + len(chunk)
+            await self._run(self._save_rebuild, collection_name, state)
+            task.progress = {
+                "processed": state["done"], "seen": len(paths), "failed": state["failed"],
+                "files_per_sec": round((state["done"]) / max(time.monotonic() - started, 1e-6), 2),
+            }
+        await self._run(self._save_rebuild, collection_name, None)
+        await LogService.info(
+            "vector_store", f"Rebuild of {state['collection']} finished",
+            {"collection": state["collection"], "total": len(paths), "failed": state["failed"]},
+        )
+        return task.progress or {}
+
+    async def status(self, collection_name: str = DEFAULT_COLLECTION) -> Dict[str, Any]:
+        info = await self._run(self._db.collection_info, collection_name)
+        rebuild = await self._run(self._load_rebuild, collection_name)
+        return {
+            "collection": info,
+            "config": await self.index_spec(),
+            "backend": self._db.backend_type,
+            "local": self._db.is_local,
+            "rebuild": {"done": rebuild["done"], "total": len(rebuild["paths"]), "failed": rebuild["failed"]}
+            if rebuild else None,
+        }
+
+    async def upsert(self, collection_name: str, row: Dict[str, Any]):
+        """缓冲写入，等待所在批次落库后返回"""
+        fut = asyncio.get_running_loop().create_future()
+        pending = self._pending.setdefault(collection_name, [])
+        pending.append((row, fut))
+        if len(pending) >= UPSERT_BATCH_SIZE:
+            await self._flush(collection_name)
+        else:
+            flusher = self._flushers.get(collection_name)
+            if flusher is None or flusher.done():
+                self._flushers[collection_name] = asyncio.create_task(self._flush_after_window(collection_name))
+        await fut
+
+    async def upsert_many(self, collection_name: str, rows: List[Dict[str, Any]]):
+        await asyncio.gather(*(self.upsert(collection_name, row) for row in rows))
+
+    async def _flush_after_window(self, collection_name: str):
+        await asyncio.sleep(UPSERT_WINDOW)
+        await self._flush(collection_name)
+
+    async def _flush(self, collection_name: str):
+        batch = self._pending.pop(collection_name, [])
+        if not batch:
+            return
+        # 同一批次内相同主键以最后一次写入为准
+        rows = list({row.get("id") or row["path"]: row for row, _ in batch}.values())
+        try:
+            await self._run(self._db.upsert_vector, collection_name, rows)
+            self.version += 1
+        except Exception as e:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        for _, fut in batch:
+            if not fut.done():
+                fut.set_result(None)
+
+    async def flush(self, collection_name: str | None = None):
+        """写出缓冲区；读取、删除前调用以保证读到自己的写入"""
+        names = [collection_name] if collection_name else list(self._pending)
+        for name in names:
+            await self._flush(name)
+
+    async def delete(self, collection_name: str, paths: List[str]):
+        if not paths:
+            return
+        await self.flush(collection_name)
+        await self._run(self._db.delete_vectors, collection_name, paths)
+        self.version += 1
+
+    async def delete_stale_chunks(self, collection_name: str, path: str, keep_ids: List[str]) -> int:
+        """重新索引文件后删除不再产生的旧分块；新分块已写入，检索期间文件不会暂时查不到"""
+        await self.flush(collection_name)
+        removed = await self._run(self._db.delete_stale_chunks, collection_name, path, keep_ids)
+        if removed:
+            self.version += 1
+        return removed
+
+    async def move_path(self, collection_name: str, src: str, dst: str) -> int:
+        await self.flush(collection_name)
+        moved = await self._run(self._db.move_path, collection_name, src, dst)
+        if moved:
+            self.version += 1
+        return moved
+
+    async def search(self, collection_name: str, query_embedding: List[float], top_k: int = 5,
+                     filters: Dict[str, Any] | None = None, filter_mode: str = "pre"):
+        """filter_mode=pre 时过滤条件下推到近邻检索内部；post 时先多取候选再在结果上过滤"""
+        await self.flush(collection_name)
+        if not filters or filter_mode == "pre":
+            return await self._run(self._db.search_vectors, collection_name, query_embedding, top_k, filters)
+        results = await self._run(
+            self._db.search_vectors, collection_name, query_embedding, top_k * POST_FILTER_OVERFETCH,
+        )
+        return [[r for r in results[0] if match_filters(r["entity"], filters)][:top_k]]
+
+    async def search_files(self, collection_name: str, query_embedding: List[float], top_k: int = 5,
+                           filters: Dict[str, Any] | None = None, filter_mode: str = "pre") -> List[Dict[str, Any]]:
+        """检索分块并按文件聚合：每个文件取得分最高的分块作为摘要"""
+        results = await self.search(
+            collection_name, query_embedding, top_k * CHUNK_OVERFETCH, filters, filter_mode,
+        )
+        files: Dict[str, Dict[str, Any]] = {}
+        for r in results[0]:
+            entity = r["entity"]
+            path = entity["path"]
+            if path not in files:
+                files[path] = {
+                    "path": path, "score": r["distance"], "chunks": 0,
+                    "offset": entity.get("offset", 0), "snippet": entity.get("snippet") or None,
+                }
+            files[path]["chunks"] += 1
+        return sorted(files.values(), key=lambda f: -f["score"])[:top_k]
+
+    async def search_by_path(self, collection_name: str, query_path: str, top_k: int = 20):
+        await self.flush(collection_name)
+        return await self._run(self._db.search_by_path, collection_name, query_path, top_k)
+
+    def _discard(self, collection_name: str):
+        """丢弃集合尚未落库的缓冲写入：取消定时写出，等待中的 upsert 以异常结束而不是永远挂起"""
+        flusher = self._flushers.pop(collection_name, None)
+        if flusher is not None and not flusher.done():
+            flusher.cancel()
+        for _, fut in self._pending.pop(collection_name, []):
+            if not fut.done():
+                fut.set_exception(RuntimeError(f"Collection {collection_name} was dropped before the write was flushed"))
+
+    async def drop_collection(self, collection_name: str):
+        self._discard(collection_name)
+        self._collections.pop(collection_name, None)
+        await self._run(self._db.drop_collection, collection_name)
+        self.version += 1
+
+    async def clear_all(self):
+        for name in set(self._pending) | set(self._flushers):
+            self._discard(name)
+        self._collections.clear()
+        await self._run(self._db.clear_all_data)
+        self.version += 1
+
+    async def aclose(self):
+        await self.flush()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+vector_store = AsyncVectorStore()
@@ -1,7 +1,8 @@
 from typing import Dict, Tuple, Any, Union, AsyncIterator
 from fastapi import HTTPException
+import inspect
 import mimetypes
-from fastapi.responses import Response
+from fastapi.responses import Response, StreamingResponse
 import time
 import hmac
 import hashlib
@@ -12,7 +13,8 @@ from .adapters.registry import runtime_registry
 from api.response import page
 from .thumbnail import is_image_filename, is_raw_filename
 from services.processors.registry import get as get_processor
-from services.tasks import task_service
+from services.processors._streaming import spool, iter_file
+from services.events import file_event_bus
 from services.logging import LogService
 from services.config import ConfigCenter
 
@@ -154,19 +156,42 @@ async def read_file(path: str) -> Union[bytes, Any]:
     return await read_func(root, rel)
 
 
+async def read_file_stream(path: str) -> AsyncIterator[bytes]:
+    """以流的方式读取文件，优先使用适配器的 stream_file，避免整文件进入内存"""
+    adapter_instance, _, root, rel = await resolve_adapter_and_rel(path)
+    if rel.endswith('/') or rel == '':
+        raise HTTPException(400, detail="Path is a directory")
+    stream_impl = getattr(adapter_instance, "stream_file", None)
+    if callable(stream_impl):
+        resp = await stream_impl(root, rel, None)
+        if isinstance(resp, StreamingResponse):
+            async for chunk in resp.body_iterator:
+                if chunk:
+                    yield chunk
+            return
+        if isinstance(resp, Response):
+            yield resp.body
+            return
+    read_func = await _ensure_method(adapter_instance, "read_file")
+    yield await read_func(root, rel)
+
+
 async def write_file(path: str, data: bytes):
     adapter_instance, _, root, rel = await resolve_adapter_and_rel(path)
     if rel.endswith('/'):
         raise HTTPException(400, detail="Invalid file path")
     write_func = await _ensure_method(adapter_instance, "write_file")
     await write_func(root, rel, data)
-    await task_service.trigger_tasks("file_written", path)
+    await file_event_bus.emit("file_written", path)
     await LogService.action(
         "virtual_fs", f"Wrote file to {path}", details={"path": path, "size": len(data)}
     )
 
 
-async def write_file_stream(path: str, data_iter: AsyncIterator[bytes], overwrite: bool = True):
+async def write_file_stream(path: str, data_iter: AsyncIterator[bytes], overwrite: bool = True,
+                            size_hint: int | None = None, version: str | None = None):
+    """size_hint 为调用方已知的总字节数，传给支持该参数的适配器（如需预先声明大小的分片上传）；
+    version 标识源内容的版本（如源路径与修改时间），支持续传的适配器据此判断中断的上传能否接续"""
     adapter_instance, _, root, rel = await resolve_adapter_and_rel(path)
     if rel.endswith('/'):
         raise HTTPException(400, detail="Invalid file path")
@@ -183,7 +208,12 @@ async def write_file_stream(path: str, data_iter: AsyncIterator[bytes], overwrit
     size = 0
     stream_func = getattr(adapter_instance, "write_file_stream", None)
     if callable(stream_func):
-        size = await stream_func(root, rel, data_iter)
+        params = inspect.signature(stream_func).parameters
+        extra = {
+            name: value for name, value in (("size_hint", size_hint), ("version", version))
+            if value is not None and name in params
+        }
+        size = await stream_func(root, rel, data_iter, **extra)
     else:
         buf = bytearray()
         async for chunk in data_iter:
@@ -193,7 +223,7 @@ async def write_file_stream(path: str, data_iter: AsyncIterator[bytes], overwrit
         await write_func(root, rel, bytes(buf))
         size = len(buf)
 
-    await task_service.trigger_tasks("file_written", path)
+    await file_event_bus.emit("file_written", path)
     await LogService.action(
         "virtual_fs",
         f"Wrote file stream to {path}",
@@ -217,7 +247,7 @@ async def delete_path(path: str):
         raise HTTPException(400, detail="Cannot delete root")
     delete_func = await _ensure_method(adapter_instance, "delete")
     await delete_func(root, rel)
-    await task_service.trigger_tasks("file_deleted", path)
+    await file_event_bus.emit("file_deleted", path)
     await LogService.action("virtual_fs", f"Deleted {path}", details={"path": path})
 
 
@@ -230,12 +260,14 @@ async def move_path(src: str, dst: str, overwrite: bool = False, return_debug: b
         "root_s": root_s, "root_d": root_d,
         "overwrite": overwrite
     }
-    if adapter_model_s.id != adapter_model_d.id:
-        raise HTTPException(400, detail="Cross-adapter move not supported")
     if not rel_s:
         raise HTTPException(400, detail="Cannot move or rename mount root")
     if not rel_d:
         raise HTTPException(400, detail="Invalid destination")
+    if adapter_model_s.id != adapter_model_d.id:
+        # 跨挂载点：流式复制到目标挂载点后删除源
+        debug_info["transfer"] = await _cross_mount_transfer(src, dst, "move", overwrite)
+        return debug_info if return_debug else None
 
     exists_func = getattr(adapter_s, "exists", None)
     stat_func = getattr(adapter_s, "stat_path", None)
@@ -287,6 +319,7 @@ async def move_path(src: str, dst: str, overwrite: bool = False, return_debug: b
     except Exception as e:
         raise HTTPException(500, detail=f"Move failed: {e}")
 
+    await file_event_bus.emit("file_moved", dst, src=src)
     await LogService.action(
         "virtual_fs", f"Moved {src} to {dst}", details=debug_info
     )
@@ -359,6 +392,7 @@ async def rename_path(src: str, dst: str, overwrite: bool = False, return_debug:
     except Exception as e:
         raise HTTPException(500, detail=f"Rename failed: {e}")
 
+    await file_event_bus.emit("file_moved", dst, src=src)
     await LogService.action(
         "virtual_fs", f"Renamed {src} to {dst}", details=debug_info
     )
@@ -407,6 +441,28 @@ async def stream_file(path: str, range_header: str | None):
     return Response(content=data, media_type=mime or "application/octet-stream")
 
 
+async def is_cross_mount(src: str, dst: str) -> bool:
+    src_model, _ = await resolve_adapter_by_path(src)
+    dst_model, _ = await resolve_adapter_by_path(dst)
+    return src_model.id != dst_model.id
+
+
+async def _cross_mount_transfer(src: str, dst: str, operation: str, overwrite: bool) -> Dict:
+    from services.transfer import transfer_service
+
+    if not overwrite:
+        try:
+            await stat_file(dst)
+        except Exception:
+            pass
+        else:
+            raise HTTPException(409, detail="Destination already exists")
+    try:
+        return await transfer_service.transfer(src, dst, operation, overwrite=overwrite)
+    except ValueError as e:
+        raise HTTPException(400, detail=str(e))
+
+
 async def stat_file(path: str):
     adapter_instance, _, root, rel = await resolve_adapter_and_rel(path)
     stat_func = getattr(adapter_instance, "stat_file", None)
@@ -424,12 +480,13 @@ async def copy_path(src: str, dst: str, overwrite: bool = False, return_debug: b
         "root_s": root_s, "root_d": root_d,
         "overwrite": overwrite
     }
-    if adapter_model_s.id != adapter_model_d.id:
-        raise HTTPException(400, detail="Cross-adapter copy not supported")
     if not rel_s:
         raise HTTPException(400, detail="Cannot copy mount root")
     if not rel_d:
         raise HTTPException(400, detail="Invalid destination")
+    if adapter_model_s.id != adapter_model_d.id:
+        debug_info["transfer"] = await _cross_mount_transfer(src, dst, "copy", overwrite)
+        return debug_info if return_debug else None
 
     exists_func = getattr(adapter_s, "exists", None)
     stat_func = getattr(adapter_s, "stat_path", None)
@@ -470,12 +527,80 @@ async def copy_path(src: str, dst: str, overwrite: bool = False, return_debug: b
     except Exception as e:
         raise HTTPException(500, detail=f"Copy failed: {e}")
 
+    await file_event_bus.emit("file_copied", dst, src=src)
     await LogService.action(
         "virtual_fs", f"Copied {src} to {dst}", details=debug_info
     )
     return debug_info if return_debug else None
 
 
+async def _empty_stream() -> AsyncIterator[bytes]:
+    return
+    yield
+
+
+async def _aclose(stream):
+    close = getattr(stream, "aclose", None)
+    if callable(close):
+        await close()
+
+
+async def run_processor(processor, path: str, config: dict, save_to: str = None, read_input: bool = True,
+                        chunks: AsyncIterator[bytes] | None = None):
+    """
+    调用处理器处理文件；实现了 process_stream 的处理器走流式输入/输出
+    :param read_input: 为 False 时不读取源文件（如文件已删除）
+    :param chunks: 可选，替代源文件的输入流
+    """
+    produces_file = getattr(processor, "produces_file", False)
+    stream_impl = getattr(processor, "process_stream", None)
+    if callable(stream_impl):
+        if chunks is None:
+            chunks = read_file_stream(path) if read_input else _empty_stream()
+        result = await stream_impl(chunks, path, config)
+        if save_to and produces_file:
+            if isinstance(result, Response):
+                await write_file(save_to, result.body)
+            elif isinstance(result, (bytes, bytearray)):
+                await write_file(save_to, bytes(result))
+            else:
+                try:
+                    if save_to == path:
+                        # 原地覆盖时先落到临时文件，避免边读边写同一文件
+                        try:
+                            spooled = await spool(result)
+                        finally:
+                            await _aclose(result)
+                        result = iter_file(spooled)
+                    await write_file_stream(save_to, result)
+                finally:
+                    # 写入中途失败时也要关闭处理器输出背后的临时文件
+                    await _aclose(result)
+            return {"saved_to": save_to}
+        if hasattr(result, "__aiter__"):
+            # 不保存时与 process 一样返回 Response，输出流在这里读完并释放
+            try:
+                body = b"".join([c async for c in result])
+            finally:
+                await _aclose(result)
+            return Response(content=body, media_type=getattr(processor, "media_type", None) or "application/octet-stream")
+        return result
+
+    if chunks is not None:
+        data = b"".join([c async for c in chunks])
+    else:
+        data = await read_file(path) if read_input else b""
+    result = await processor.process(data, path, config)
+    if save_to and produces_file:
+        if isinstance(result, Response):
+            result_bytes = result.body
+        else:
+            result_bytes = result
+        await write_file(save_to, result_bytes)
+        return {"saved_to": save_to}
+    return result
+
+
 async def process_file(path: str, processor_type: str, config: dict, save_to: str = None):
     """
     使用指定处理器处理文件，并可选择保存到新路径
@@ -485,20 +610,11 @@ async def process_file(path: str, processor_type: str, config: dict, save_to: st
     :param save_to: 保存路径（可选），不指定则只返回处理结果
     :return: 处理后的文件内容或保存结果
     """
-    data = await read_file(path)
     processor = get_processor(processor_type)
     if not processor:
         raise HTTPException(
             400, detail=f"Processor {processor_type} not found")
-    result = await processor.process(data, path, config)
-    if save_to and getattr(processor, "produces_file", False):
-        if isinstance(result, Response):
-            result_bytes = result.body
-        else:
-            result_bytes = result
-        await write_file(save_to, result_bytes)
-        return {"saved_to": save_to}
-    return result
+    return await run_processor(processor, path, config, save_to)
 
 
 async def get_temp_link_secret_key() -> bytes:
@@ -0,0 +1,208 @@
+"""测试与基准脚本共用的本地替身服务：监听 127.0.0.1 的随机端口，只实现被测代码用到的最小 HTTP/1.1 子集"""
+import asyncio
+import json
+import random
+from typing import Any, Dict, List, Tuple
+
+from services.adapters._onedrive_upload import FRAGMENT_ALIGN
+
+
+async def read_request(reader: asyncio.StreamReader) -> Tuple[str, str, Dict[str, str], bytes]:
+    """读取一个请求，返回 (方法, 路径, 小写请求头, 请求体)；连接关闭时抛出 IncompleteReadError"""
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    method, path, _ = lines[0].split(" ", 2)
+    headers = {k.strip().lower(): v.strip() for k, _, v in (l.partition(":") for l in lines[1:] if l)}
+    body = await reader.readexactly(int(headers.get("content-length", 0)))
+    return method, path, headers, body
+
+
+def write_json(writer: asyncio.StreamWriter, status: int, payload: Any, headers: Dict[str, str] | None = None):
+    out = json.dumps(payload).encode()
+    extra = "".join(f"{k}: {v}\r\n" for k, v in (headers or {}).items())
+    writer.write(
+        f"HTTP/1.1 {status} X\r\nContent-Type: application/json\r\nContent-Length: {len(out)}\r\n{extra}\r\n"
+        .encode() + out
+    )
+
+
+async def serve_embeddings(latency: float = 0.0, dim: int = 8, stats: Dict[str, Any] | None = None,
+                           statuses: List[int] | None = None):
+    """OpenAI 兼容的嵌入接口：POST 任意路径按 input 返回伪嵌入向量（首个分量为文本长度），
+    每个请求先等待 latency 秒。statuses 依次作为前几个请求的错误状态码返回。
+    stats 记录请求数、最大同时处理数、各请求到达时间与 input"""
+    stats = stats if stats is not None else {}
+    stats.update(requests=0, active=0, max_active=0, arrivals=[], inputs=[])
+    statuses = list(statuses or [])
+    loop = asyncio.get_running_loop()
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                _, _, _, body = await read_request(reader)
+                texts = json.loads(body or b"{}").get("input", [])
+                stats["requests"] += 1
+                stats["arrivals"].append(loop.time())
+                stats["inputs"].append(texts)
+                stats["active"] += 1
+                stats["max_active"] = max(stats["max_active"], stats["active"])
+                try:
+                    await asyncio.sleep(latency)
+                finally:
+                    stats["active"] -= 1
+                if statuses:
+                    write_json(writer, statuses.pop(0), {"error": "stand-in failure"}, {"Retry-After": "0"})
+                else:
+                    if isinstance(texts, str):
+                        texts = [texts]
+                    # 倒序返回，调用方应按 index 还原顺序
+                    data = [
+                        {"index": i, "embedding": [float(len(t))] + [float(j % 7) for j in range(1, dim)]}
+                        for i, t in reversed(list(enumerate(texts)))
+                    ]
+                    write_json(writer, 200, {"data": data})
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, "127.0.0.1", 0)
+
+
+async def serve_ranges(data: bytes, latency: float = 0.0, bandwidth: int = 0, stats: Dict[str, Any] | None = None,
+                       failures: int = 0):
+    """支持 Range 与 keep-alive 的静态文件服务：每个请求先等待 latency 秒，bandwidth > 0 时每个连接
+    限速 bandwidth 字节/秒。前 failures 个请求返回 500。stats 记录收到的 Range 与最大同时处理数"""
+    stats = stats if stats is not None else {}
+    stats.update(requests=0, active=0, max_active=0, ranges=[])
+    remaining = {"failures": failures}
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                _, _, headers, _ = await read_request(reader)
+                start, end = 0, len(data) - 1
+                status = "200 OK"
+                extra = ""
+                rng = headers.get("range", "")
+                if rng.startswith("bytes="):
+                    s, _, e = rng[6:].partition("-")
+                    start, end = int(s or 0), min(int(e) if e else len(data) - 1, len(data) - 1)
+                    status = "206 Partial Content"
+                    extra = f"Content-Range: bytes {start}-{end}/{len(data)}\r\n"
+                stats["requests"] += 1
+                stats["ranges"].append((start, end))
+                stats["active"] += 1
+                stats["max_active"] = max(stats["max_active"], stats["active"])
+                try:
+                    await asyncio.sleep(latency)
+                    if remaining["failures"] > 0:
+                        remaining["failures"] -= 1
+                        writer.write(b"HTTP/1.1 500 Internal Server Error\r\nContent-Length: 0\r\n\r\n")
+                        await writer.drain()
+                        continue
+                    writer.write(
+                        f"HTTP/1.1 {status}\r\nContent-Length: {end - start + 1}\r\n"
+                        f"Accept-Ranges: bytes\r\n{extra}\r\n".encode()
+                    )
+                    if bandwidth <= 0:
+                        writer.write(data[start:end + 1])
+                        await writer.drain()
+                        continue
+                    step = max(1, bandwidth // 20)
+                    for i in range(start, end + 1, step):
+                        writer.write(data[i:min(i + step, end + 1)])
+                        await writer.drain()
+                        await asyncio.sleep(min(step, end + 1 - i) / bandwidth)
+                finally:
+                    stats["active"] -= 1
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, "127.0.0.1", 0)
+
+
+class MockGraph:
+    """Graph 上传会话替身：POST 创建会话，PUT 分片校验 320 KiB 对齐与顺序，GET 返回 nextExpectedRanges。
+    前 failures 个分片以及按 failure_rate 抽中的分片只接收前一半并返回 503，模拟连接中断"""
+
+    def __init__(self, latency: float = 0.0, bandwidth: int = 0, failure_rate: float = 0.0, seed: int = 0,
+                 failures: int = 0):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.pending_failures = failures
+        self.sessions: Dict[str, Dict[str, Any]] = {}
+        self.failures = 0
+        self.puts = 0
+        self.server: asyncio.AbstractServer | None = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                method, path, headers, body = await read_request(reader)
+                await asyncio.sleep(self.latency)
+                if body and self.bandwidth:
+                    await asyncio.sleep(len(body) / self.bandwidth)
+                if method == "POST":
+                    sid = str(len(self.sessions) + 1)
+                    port = writer.get_extra_info("sockname")[1]
+                    self.sessions[sid] = {"received": 0, "data": bytearray()}
+                    write_json(writer, 200, {
+                        "uploadUrl": f"http://127.0.0.1:{port}/upload/{sid}",
+                        "expirationDateTime": "2999-01-01T00:00:00Z", "nextExpectedRanges": ["0-"],
+                    })
+                    await writer.drain()
+                    continue
+                session = self.sessions.get(path.rsplit("/", 1)[-1])
+                if session is None:
+                    write_json(writer, 404, {})
+                elif method == "GET":
+                    write_json(writer, 200, {"nextExpectedRanges": [f"{session['received']}-"]})
+                else:
+                    self._put(writer, session, headers, body)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def _put(self, writer: asyncio.StreamWriter, session: Dict[str, Any], headers: Dict[str, str], body: bytes):
+        self.puts += 1
+        rng, _, total = headers["content-range"].removeprefix("bytes ").partition("/")
+        start, end = (int(x) for x in rng.split("-"))
+        total = int(total)
+        if start != session["received"] or (end + 1 < total and len(body) % FRAGMENT_ALIGN):
+            write_json(writer, 416, {})
+            return
+        if self.pending_failures > 0 or (self.failure_rate and self.random.random() < self.failure_rate):
+            self.pending_failures = max(0, self.pending_failures - 1)
+            self.failures += 1
+            keep = len(body) // 2 // FRAGMENT_ALIGN * FRAGMENT_ALIGN
+            session["data"].extend(body[:keep])
+            session["received"] += keep
+            write_json(writer, 503, {})
+            return
+        session["data"].extend(body)
+        session["received"] = end + 1
+        if session["received"] >= total:
+            write_json(writer, 201, {"id": "item", "size": total})
+        else:
+            write_json(writer, 202, {"nextExpectedRanges": [f"{end + 1}-"]})
+
+    async def start(self) -> str:
+        """启动服务，返回 createUploadSession 地址"""
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return server_url(self.server, "/createUploadSession")
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+def server_url(server, path: str = "/") -> str:
+    return f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}{path}"
@@ -0,0 +1,108 @@
+import asyncio
+
+import httpx
+import pytest
+
+from services import ai
+from services.ai import AIClient, _RateLimiter
+from tests.servers import serve_embeddings, server_url
+
+
+def _config(server, **overrides):
+    cfg = {
+        "url": server_url(server, "/v1/embeddings"), "model": "test", "api_key": "test",
+        "batch_size": 16, "concurrency": 4, "rpm": 0, "dimensions": 0,
+    }
+    cfg.update(overrides)
+    return cfg
+
+
+async def _embed(texts, latency=0.0, statuses=None, **overrides):
+    stats = {}
+    server = await serve_embeddings(latency, 4, stats, statuses)
+    client = AIClient(_config(server, **overrides))
+    try:
+        vectors = await client.embed_many(texts)
+    finally:
+        await client.aclose()
+        server.close()
+        await server.wait_closed()
+    return vectors, stats
+
+
+@pytest.fixture
+def fast_retry(monkeypatch):
+    monkeypatch.setattr(ai, "RETRY_BASE_DELAY", 0.01)
+
+
+def test_concurrent_embeds_are_batched_in_order():
+    texts = ["x" * (i + 1) for i in range(40)]
+    vectors, stats = asyncio.run(_embed(texts, batch_size=16))
+    assert stats["requests"] == 3
+    assert sorted(len(batch) for batch in stats["inputs"]) == [8, 16, 16]
+    # 服务端倒序返回，结果仍按输入顺序对应
+    assert [v[0] for v in vectors] == [float(len(t)) for t in texts]
+
+
+def test_single_text_sent_as_string():
+    vectors, stats = asyncio.run(_embed(["abc"]))
+    assert stats["inputs"] == ["abc"]
+    assert vectors[0][0] == 3.0
+
+
+def test_in_flight_requests_bounded_by_concurrency():
+    _, stats = asyncio.run(_embed([str(i) for i in range(12)], latency=0.05, batch_size=1, concurrency=3))
+    assert stats["requests"] == 12
+    assert stats["max_active"] == 3
+
+
+def test_retries_rate_limit_and_server_errors(fast_retry):
+    vectors, stats = asyncio.run(_embed(["a", "bb"], statuses=[429, 503]))
+    assert stats["requests"] == 3
+    assert [v[0] for v in vectors] == [1.0, 2.0]
+
+
+@pytest.mark.parametrize("status", [400, 409])
+def test_client_errors_are_not_retried(fast_retry, status):
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(_embed(["a"], statuses=[status]))
+
+
+def test_retries_give_up_after_max_retries(fast_retry, monkeypatch):
+    monkeypatch.setattr(ai, "MAX_RETRIES", 2)
+    stats = {}
+
+    async def run():
+        server = await serve_embeddings(0.0, 4, stats, [503] * 5)
+        client = AIClient(_config(server))
+        try:
+            await client.embed("a")
+        finally:
+            await client.aclose()
+            server.close()
+            await server.wait_closed()
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(run())
+    assert stats["requests"] == 3
+
+
+def test_rpm_spaces_out_requests():
+    _, stats = asyncio.run(_embed([str(i) for i in range(5)], batch_size=1, rpm=1200))
+    # 首个请求还要建立连接池，到达时间偏晚，从第二个请求起比较间隔
+    gaps = [b - a for a, b in zip(stats["arrivals"][1:], stats["arrivals"][2:])]
+    assert len(gaps) == 3
+    # 1200 rpm 即每 50ms 一个请求，留出计时误差
+    assert min(gaps) >= 0.04
+
+
+def test_rate_limiter_disabled_when_rpm_not_positive():
+    async def run():
+        limiter = _RateLimiter()
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        for _ in range(100):
+            await limiter.wait(0)
+        return loop.time() - started
+
+    assert asyncio.run(run()) < 0.05
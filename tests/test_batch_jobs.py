@@ -0,0 +1,63 @@
+import asyncio
+from types import SimpleNamespace
+
+from tortoise import Tortoise
+
+from models.database import BatchJob
+from services import batch_jobs
+from services.batch_jobs import BatchJobService
+
+PATHS = [f"/data/{i}.txt" for i in range(6)]
+
+
+async def _files(path, pattern=None, recursive=True, exts=None):
+    for p in PATHS:
+        yield p
+
+
+def test_resume_skips_files_completed_past_the_watermark(monkeypatch):
+    monkeypatch.setattr(batch_jobs, "iter_dir_files", _files)
+    monkeypatch.setattr(batch_jobs, "get_processor", lambda name: SimpleNamespace())
+    service = BatchJobService()
+    calls = []
+
+    async def main():
+        await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["models.database"]})
+        await Tortoise.generate_schemas()
+        try:
+            job = await BatchJob.create(key="k", path="/data", processor_type="p", processor_config={},
+                                        concurrency=4)
+            task = SimpleNamespace(task_info={"job_id": job.id}, progress=None)
+            blocked = asyncio.Event()
+
+            async def process(processor, job, paths):
+                calls.append(paths[0])
+                if paths[0] == PATHS[0]:
+                    # 第一个文件迟迟不完成，其余文件先于它完成
+                    await blocked.wait()
+                return [(True, 1)]
+
+            monkeypatch.setattr(service, "_process", process)
+            run = asyncio.create_task(service.run(task))
+            while len(calls) < len(PATHS):
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.05)
+            run.cancel()
+            await asyncio.gather(run, return_exceptions=True)
+            interrupted = await BatchJob.get(id=job.id)
+
+            calls.clear()
+            blocked.set()
+            await service.run(task)
+            return interrupted, await BatchJob.get(id=job.id)
+        finally:
+            await Tortoise.close_connections()
+
+    interrupted, finished = asyncio.run(main())
+    assert interrupted.done_count == 0
+    assert interrupted.done_after == [1, 2, 3, 4, 5]
+    assert interrupted.processed == 5
+    # 续跑只处理水位处未完成的文件，计数不重复
+    assert calls == [PATHS[0]]
+    assert finished.processed == 6 and finished.done_count == 6 and not finished.done_after
+    assert finished.status == "success"
@@ -0,0 +1,157 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from tortoise import Tortoise
+
+from models.database import CatalogEntry, OneDriveMirrorState, StorageAdapter
+from services import crawler as crawler_module
+from services import filename_index as filename_index_module
+from services.adapters.onedrive import OneDriveAdapter
+from services.adapters.registry import runtime_registry
+from services.crawler import crawler_service
+from services.events import FileEvent, file_event_bus
+from services.filename_index import FilenameIndex
+
+
+class FakeDrive:
+    """按 Graph /delta 语义分页返回变更：nextLink 续传同一次枚举，deltaLink 记录变更序号"""
+
+    def __init__(self, page_size: int = 2):
+        self.page_size = page_size
+        self.seq = 0
+        self.log = {}
+        self.requests = []
+        self.fail_at: int | None = None
+        self._change({"id": "root", "name": "root", "root": {}, "folder": {}})
+
+    def _change(self, item):
+        self.seq += 1
+        self.log[item["id"]] = (self.seq, item)
+
+    def put(self, item_id: str, name: str, parent: str = "root", folder: bool = False, ctag: str = "c1"):
+        item = {"id": item_id, "name": name, "parentReference": {"id": parent},
+                "lastModifiedDateTime": "2024-01-01T00:00:00Z", "cTag": ctag}
+        if folder:
+            item["folder"] = {}
+        else:
+            item["size"] = 10
+        self._change(item)
+
+    def delete(self, item_id: str):
+        self._change({"id": item_id, "deleted": {}})
+
+    def _page(self, since: int, offset: int, upto: int):
+        changes = sorted((seq, item) for seq, item in self.log.values() if since < seq <= upto)
+        page = [item for _, item in changes[offset:offset + self.page_size]]
+        if offset + self.page_size < len(changes):
+            return {"value": page, "@odata.nextLink": f"next:{since}:{offset + self.page_size}:{upto}"}
+        return {"value": page, "@odata.deltaLink": f"delta:{upto}"}
+
+    async def request(self, method, api_path_segment=None, full_url=None, **kwargs):
+        self.requests.append(full_url or api_path_segment)
+        if self.fail_at is not None and len(self.requests) == self.fail_at:
+            raise httpx.ConnectError("connection reset")
+        if full_url and full_url.startswith("next:"):
+            since, offset, upto = map(int, full_url.split(":")[1:])
+            data = self._page(since, offset, upto)
+        else:
+            since = int(full_url.split(":")[1]) if full_url else 0
+            data = self._page(since, 0, self.seq)
+        return httpx.Response(200, json=data, request=httpx.Request(method, "https://graph.test/"))
+
+
+async def _root_id(root: str) -> str:
+    return "root"
+
+
+@pytest.fixture
+def env(tmp_path, monkeypatch):
+    index = FilenameIndex(str(tmp_path / "filename_index.db"))
+    monkeypatch.setattr(crawler_module, "filename_index", index)
+    monkeypatch.setattr(filename_index_module, "filename_index", index)
+    events = []
+
+    async def emit(event, path, src=None):
+        events.append((event, path, src))
+        await file_event_bus._notify(FileEvent(event=event, path=path, src=src))
+
+    monkeypatch.setattr(file_event_bus, "emit", emit)
+    return SimpleNamespace(index=index, events=events)
+
+
+def _run(env, steps):
+    async def main():
+        await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["models.database"]})
+        await Tortoise.generate_schemas()
+        record = await StorageAdapter.create(
+            name="od", type="onedrive", path="/od",
+            config={"client_id": "id", "client_secret": "secret", "refresh_token": "token", "delta_poll_interval": 0},
+        )
+        adapter = OneDriveAdapter(record)
+        drive = FakeDrive()
+        adapter._request = drive.request
+        adapter.delta_root_id = _root_id
+        runtime_registry._instances[record.id] = adapter
+        try:
+            return await steps(drive, adapter)
+        finally:
+            runtime_registry._instances.pop(record.id, None)
+            await adapter.aclose()
+            await env.index.aclose()
+            await Tortoise.close_connections()
+
+    return asyncio.run(main())
+
+
+async def _catalog(adapter_id: int):
+    return sorted(await CatalogEntry.filter(adapter_id=adapter_id).values_list("path", "remote_id"))
+
+
+def test_interrupted_enumeration_resumes_from_next_link(env):
+    async def steps(drive, adapter):
+        for i in range(5):
+            drive.put(f"f{i}", f"file{i}.txt")
+        drive.fail_at = 3
+        with pytest.raises(httpx.ConnectError):
+            await adapter.mirror.sync()
+        state = await OneDriveMirrorState.get(adapter_id=adapter.record.id)
+        assert not state.ready and state.cursor == "next:0:4:6"
+        drive.fail_at = None
+        await adapter.mirror.sync()
+        return drive.requests, [e["path"] async for e in adapter.mirror.walk()]
+
+    requests, paths = _run(env, steps)
+    # 断点之前的页不再重复请求
+    assert requests == ["/delta", "next:0:2:6", "next:0:4:6", "next:0:4:6"]
+    assert sorted(paths) == [f"file{i}.txt" for i in range(5)]
+
+
+def test_crawl_reads_mirror_and_changes_are_emitted_once(env):
+    async def steps(drive, adapter):
+        adapter_id = adapter.record.id
+        drive.put("d", "docs", folder=True)
+        drive.put("a", "a.txt")
+        drive.put("b", "b.txt")
+        drive.put("c", "c.txt")
+        await crawler_service.crawl(adapter_id)
+        first = (await _catalog(adapter_id), list(env.events))
+
+        drive.put("a", "a.txt", ctag="c2")
+        drive.delete("b")
+        drive.put("c", "c.txt", parent="d")
+        stats = await crawler_service.crawl(adapter_id)
+        return first, await _catalog(adapter_id), env.events, stats
+
+    (catalog, events), after, all_events, stats = _run(env, steps)
+    assert catalog == [("/od/a.txt", "a"), ("/od/b.txt", "b"), ("/od/c.txt", "c"), ("/od/docs", "d")]
+    assert events == []
+    assert after == [("/od/a.txt", "a"), ("/od/docs", "d"), ("/od/docs/c.txt", "c")]
+    # 变更只由镜像发出一次，遍历不再重复发出
+    assert sorted(all_events) == [
+        ("file_deleted", "/od/b.txt", None),
+        ("file_moved", "/od/docs/c.txt", "/od/c.txt"),
+        ("file_written", "/od/a.txt", None),
+    ]
+    assert stats["errors"] == 0
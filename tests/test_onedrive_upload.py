@@ -0,0 +1,121 @@
+import asyncio
+import os
+
+import httpx
+import pytest
+
+from services.adapters import _onedrive_upload
+from services.adapters._onedrive_upload import FRAGMENT_ALIGN, upload
+from tests.servers import MockGraph
+
+
+@pytest.fixture(autouse=True)
+def sessions_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(_onedrive_upload, "SESSIONS_PATH", str(tmp_path / "sessions.json"))
+
+
+async def _upload(url: str, data: bytes, key: str, fragment_size: int = FRAGMENT_ALIGN,
+                  stats=None, fail_at: int | None = None):
+    """fail_at 给出时输入流读到该偏移处中断，模拟上传过程中源端出错"""
+    async def create_session():
+        async with httpx.AsyncClient() as c:
+            return (await c.post(url)).json()
+
+    async def source():
+        step = 100 * 1024
+        for i in range(0, len(data), step):
+            if fail_at is not None and i >= fail_at:
+                raise ConnectionError("source interrupted")
+            yield data[i:i + step]
+
+    return await upload(create_session, source(), len(data), key, fragment_size, stats, retry_delay=0.01)
+
+
+def _run(graph: MockGraph, steps):
+    """在同一个替身服务上依次执行 steps(url)，中断后的续传需要访问同一服务"""
+    async def main():
+        url = await graph.start()
+        try:
+            return await steps(url)
+        finally:
+            await graph.stop()
+
+    return asyncio.run(main())
+
+
+def test_upload_in_aligned_fragments():
+    data = os.urandom(5 * FRAGMENT_ALIGN + 1000)
+    graph = MockGraph()
+    stats = {}
+    item = _run(graph, lambda url: _upload(url, data, "k", stats=stats))
+    assert item["size"] == len(data)
+    assert bytes(graph.sessions["1"]["data"]) == data
+    assert graph.puts == stats["fragments"] == 6
+
+
+def test_failed_fragment_resends_only_unconfirmed_bytes():
+    data = os.urandom(8 * FRAGMENT_ALIGN)
+    graph = MockGraph(failures=1)
+    stats = {}
+    _run(graph, lambda url: _upload(url, data, "k", 4 * FRAGMENT_ALIGN, stats))
+    assert bytes(graph.sessions["1"]["data"]) == data
+    assert stats["retries"] == 1
+    # 失败的分片已接收一半，重试只补发剩余部分
+    assert graph.puts == 3
+
+
+def test_interrupted_upload_resumes_from_confirmed_bytes():
+    data = os.urandom(6 * FRAGMENT_ALIGN)
+    graph = MockGraph()
+    stats = {}
+
+    async def steps(url):
+        with pytest.raises(ConnectionError):
+            await _upload(url, data, "k|v1", fail_at=3 * FRAGMENT_ALIGN)
+        await _upload(url, data, "k|v1", stats=stats)
+
+    _run(graph, steps)
+    assert len(graph.sessions) == 1
+    assert stats["resumed_from"] > 0
+    assert bytes(graph.sessions["1"]["data"]) == data
+
+
+def test_new_source_version_starts_new_session():
+    data = os.urandom(6 * FRAGMENT_ALIGN)
+    # 只有开头之后的内容不同，仅凭首个分片无法区分
+    other = data[:3 * FRAGMENT_ALIGN] + os.urandom(3 * FRAGMENT_ALIGN)
+    graph = MockGraph()
+    stats = {}
+
+    async def steps(url):
+        with pytest.raises(ConnectionError):
+            await _upload(url, data, "k|v1", fail_at=4 * FRAGMENT_ALIGN)
+        await _upload(url, other, "k|v2", stats=stats)
+
+    _run(graph, steps)
+    assert len(graph.sessions) == 2
+    assert stats["resumed_from"] == 0
+    assert bytes(graph.sessions["2"]["data"]) == other
+
+
+def test_uploads_without_key_are_not_resumed():
+    data = os.urandom(6 * FRAGMENT_ALIGN)
+    graph = MockGraph()
+    stats = {}
+
+    async def steps(url):
+        with pytest.raises(ConnectionError):
+            await _upload(url, data, None, fail_at=3 * FRAGMENT_ALIGN)
+        assert _onedrive_upload._load_sessions() == {}
+        await _upload(url, data, None, stats=stats)
+
+    _run(graph, steps)
+    assert len(graph.sessions) == 2
+    assert stats["resumed_from"] == 0
+    assert bytes(graph.sessions["2"]["data"]) == data
+
+
+def test_session_cleared_after_success():
+    data = os.urandom(2 * FRAGMENT_ALIGN)
+    _run(MockGraph(), lambda url: _upload(url, data, "k"))
+    assert _onedrive_upload._load_sessions() == {}
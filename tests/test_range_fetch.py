@@ -0,0 +1,123 @@
+import asyncio
+import os
+
+import httpx
+import pytest
+
+from services import range_fetch
+from services.range_fetch import fetch_ranges
+from tests.servers import serve_ranges, server_url
+
+SEGMENT = 64 * 1024
+
+
+@pytest.fixture
+def fast_retry(monkeypatch):
+    monkeypatch.setattr(range_fetch, "RETRY_DELAY", 0.01)
+
+
+async def _with_server(data: bytes, run, **kwargs):
+    """启动替身 Range 服务，run(fetch, stream) 的返回值与服务端统计一并返回"""
+    stats = {}
+    server = await serve_ranges(data, stats=stats, **kwargs)
+    url = server_url(server, "/file")
+    try:
+        async with httpx.AsyncClient(timeout=10) as client:
+            async def fetch(start: int, end: int) -> bytes:
+                resp = await client.get(url, headers={"Range": f"bytes={start}-{end}"})
+                resp.raise_for_status()
+                return resp.content
+
+            async def stream(start: int, end: int):
+                async with client.stream("GET", url, headers={"Range": f"bytes={start}-{end}"}) as resp:
+                    resp.raise_for_status()
+                    async for chunk in resp.aiter_bytes():
+                        yield chunk
+
+            result = await run(fetch, stream)
+    finally:
+        server.close()
+        await server.wait_closed()
+    return result, stats
+
+
+async def _read_all(fetch, size: int, concurrency: int, stream=None):
+    seg_stats = {}
+    chunks = [
+        c async for c in fetch_ranges(fetch, 0, size - 1, concurrency, SEGMENT, SEGMENT, seg_stats, stream)
+    ]
+    return b"".join(chunks), seg_stats
+
+
+@pytest.mark.parametrize("concurrency", [1, 4])
+def test_segments_reassembled_in_order(concurrency):
+    data = os.urandom(20 * SEGMENT + 123)
+    (body, seg_stats), stats = asyncio.run(_with_server(
+        data, lambda fetch, stream: _read_all(fetch, len(data), concurrency), latency=0.01,
+    ))
+    assert body == data
+    assert stats["requests"] == seg_stats["segments"] == 21
+    assert stats["max_active"] <= concurrency
+    assert sorted(stats["ranges"]) == [(i, min(i + SEGMENT, len(data)) - 1) for i in range(0, len(data), SEGMENT)]
+
+
+def test_failed_segments_are_retried(fast_retry):
+    data = os.urandom(4 * SEGMENT)
+    (body, seg_stats), stats = asyncio.run(_with_server(
+        data, lambda fetch, stream: _read_all(fetch, len(data), 2), failures=2,
+    ))
+    assert body == data
+    assert seg_stats["retries"] == 2
+    assert stats["requests"] == 6
+
+
+def test_short_reads_are_retried(fast_retry):
+    data = os.urandom(3 * SEGMENT)
+    calls = []
+
+    async def fetch(start: int, end: int) -> bytes:
+        calls.append(start)
+        chunk = data[start:end + 1]
+        return chunk[:-1] if calls.count(start) == 1 else chunk
+
+    body, seg_stats = asyncio.run(_read_all(fetch, len(data), 2))
+    assert body == data
+    assert seg_stats["retries"] == 3
+
+
+def test_fatal_errors_are_not_retried(fast_retry):
+    calls = []
+
+    async def fetch(start: int, end: int) -> bytes:
+        calls.append(start)
+        raise FileNotFoundError("/missing")
+
+    with pytest.raises(FileNotFoundError):
+        asyncio.run(_read_all(fetch, 2 * SEGMENT, 1))
+    assert calls == [0]
+
+
+def test_stream_serves_first_segment_then_fetches_rest():
+    data = os.urandom(10 * SEGMENT + 7)
+    (body, _), stats = asyncio.run(_with_server(
+        data, lambda fetch, stream: _read_all(fetch, len(data), 4, stream), latency=0.01,
+    ))
+    assert body == data
+    assert stats["ranges"][0] == (0, SEGMENT - 1)
+    assert stats["requests"] == 11
+
+
+def test_stream_probe_does_not_fan_out():
+    """只读开头就断开的客户端（播放器探测 bytes=0-）只产生首段这一个请求"""
+    data = os.urandom(10 * SEGMENT)
+
+    async def run(fetch, stream):
+        body = fetch_ranges(fetch, 0, len(data) - 1, 4, SEGMENT, SEGMENT, stream=stream)
+        first = await body.__anext__()
+        await body.aclose()
+        await asyncio.sleep(0.05)
+        return first
+
+    first, stats = asyncio.run(_with_server(data, run, latency=0.01))
+    assert first == data[:len(first)]
+    assert stats["requests"] == 1
@@ -0,0 +1,69 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+import pytest
+
+from services.adapters import s3 as s3_module
+from services.adapters.s3 import MIN_PART_SIZE, S3Adapter
+
+
+class FakeS3:
+    """记录 put_object 与分块上传收到的内容"""
+
+    def __init__(self):
+        self.objects = {}
+        self.parts = {}
+
+    async def put_object(self, Bucket, Key, Body):
+        self.objects[Key] = bytes(Body)
+
+    async def create_multipart_upload(self, Bucket, Key):
+        return {"UploadId": "u1"}
+
+    async def upload_part(self, Bucket, Key, PartNumber, UploadId, Body):
+        self.parts[PartNumber] = bytes(Body)
+        return {"ETag": f"e{PartNumber}"}
+
+    async def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        numbers = [p["PartNumber"] for p in MultipartUpload["Parts"]]
+        self.objects[Key] = b"".join(self.parts[n] for n in numbers)
+
+    async def abort_multipart_upload(self, Bucket, Key, UploadId):
+        pass
+
+
+@pytest.fixture
+def adapter(monkeypatch):
+    monkeypatch.setattr(s3_module.LogService, "info", staticmethod(lambda *a, **k: asyncio.sleep(0)))
+    record = SimpleNamespace(id=1, config={"bucket_name": "b", "access_key_id": "k", "secret_access_key": "s"})
+    adapter = S3Adapter(record)
+    adapter.fake = FakeS3()
+
+    @asynccontextmanager
+    async def client():
+        yield adapter.fake
+
+    adapter._get_client = client
+    return adapter
+
+
+async def _chunks(data: bytes, step: int = 300 * 1024):
+    for i in range(0, len(data), step):
+        yield data[i:i + step]
+
+
+@pytest.mark.parametrize("size", [0, 1000, MIN_PART_SIZE * 2 + 12345])
+def test_stream_upload_roundtrip(adapter, size):
+    data = os.urandom(size)
+    total = asyncio.run(adapter.write_file_stream("", "f.bin", _chunks(data)))
+    assert total == size
+    assert adapter.fake.objects["f.bin"] == data
+
+
+def test_parts_are_full_size_except_the_last(adapter):
+    adapter.part_size = MIN_PART_SIZE
+    data = os.urandom(MIN_PART_SIZE * 2 + 10)
+    asyncio.run(adapter.write_file_stream("", "f.bin", _chunks(data)))
+    assert [len(adapter.fake.parts[n]) for n in sorted(adapter.fake.parts)] == [MIN_PART_SIZE, MIN_PART_SIZE, 10]
@@ -0,0 +1,25 @@
+import asyncio
+
+from api.routes import search
+
+
+def test_adapter_catalog_results_are_not_cached(monkeypatch):
+    calls = []
+
+    async def catalog(q, top_k, mount, page=1):
+        calls.append(q)
+        return {"items": [f"{mount}/hit{len(calls)}"], "query": q, "page": page, "has_more": False}
+
+    monkeypatch.setattr(search, "search_adapter_catalog", catalog)
+
+    async def query():
+        return await search.search_files(
+            q="report", top_k=10, mode="filename", match="substring", mount="/tg", page=1, exts=None,
+            min_size=None, max_size=None, modified_after=None, modified_before=None, filter_mode="pre", user=None,
+        )
+
+    first = asyncio.run(query())
+    # 目录在两次查询之间同步了新消息，文件名索引版本不变也应看到新结果
+    second = asyncio.run(query())
+    assert calls == ["report", "report"]
+    assert first["items"] == ["/tg/hit1"] and second["items"] == ["/tg/hit2"]
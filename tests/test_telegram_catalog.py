@@ -0,0 +1,119 @@
+import asyncio
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from tortoise import Tortoise
+
+from models.database import TelegramMessage
+from services.adapters import _telegram_catalog
+from services.adapters._telegram_catalog import TelegramCatalog
+
+
+def _message(message_id: int):
+    document = SimpleNamespace(
+        size=100 + message_id, mime_type="application/pdf",
+        attributes=[SimpleNamespace(file_name=f"doc{message_id}.pdf")],
+    )
+    return SimpleNamespace(
+        id=message_id, photo=None, video=None, document=document, text="",
+        date=datetime(2024, 1, 1, tzinfo=timezone.utc),
+    )
+
+
+class FakeChannel:
+    """按 Telethon get_messages 的分页语义返回频道中的消息"""
+
+    def __init__(self):
+        self.messages = {}
+
+    def post(self, *ids: int):
+        for i in ids:
+            self.messages[i] = _message(i)
+
+    async def get_messages(self, chat_id, limit=None, min_id=0, offset_id=0, reverse=False, ids=None):
+        if ids is not None:
+            return [self.messages.get(i) for i in ids]
+        if reverse:
+            found = sorted(i for i in self.messages if i > min_id)
+        else:
+            found = sorted((i for i in self.messages if not offset_id or i < offset_id), reverse=True)
+        return [self.messages[i] for i in found[:limit]]
+
+
+class FakeAdapter:
+    def __init__(self, channel: FakeChannel):
+        self.record = SimpleNamespace(id=1)
+        self.chat_id = "@channel"
+        self.channel = channel
+
+    async def _call(self, fn):
+        return await fn(self.channel)
+
+
+@pytest.fixture
+def small_batches(monkeypatch):
+    monkeypatch.setattr(_telegram_catalog, "FETCH_BATCH", 3)
+
+
+def _run(steps):
+    async def main():
+        await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["models.database"]})
+        await Tortoise.generate_schemas()
+        channel = FakeChannel()
+        catalog = TelegramCatalog(FakeAdapter(channel))
+        try:
+            return await steps(channel, catalog)
+        finally:
+            await catalog.aclose()
+            await Tortoise.close_connections()
+
+    return asyncio.run(main())
+
+
+async def _catalogued(catalog: TelegramCatalog):
+    return sorted(await TelegramMessage.filter(adapter_id=catalog.adapter_id).values_list("message_id", flat=True))
+
+
+def test_channel_empty_at_first_sync_picks_up_later_messages(small_batches):
+    async def steps(channel, catalog):
+        await catalog.refresh(force=True)
+        assert (await catalog.status())["history_done"]
+        channel.post(*range(1, 8))
+        await catalog.refresh(force=True)
+        # 最新一批同步收录，更早的由后台回溯补齐
+        await catalog._backfill
+        return await _catalogued(catalog), await catalog.status()
+
+    ids, status = _run(steps)
+    assert ids == list(range(1, 8))
+    assert status["max_id"] == 7
+
+
+def test_add_advances_max_id_without_skipping_other_messages(small_batches):
+    async def steps(channel, catalog):
+        channel.post(1, 2)
+        await catalog.refresh(force=True)
+        # 其他客户端发的消息之后，Foxel 自己上传一条
+        channel.post(3, 4, 5, 6)
+        await catalog.add(channel.messages[6])
+        return await _catalogued(catalog), (await catalog.status())["max_id"]
+
+    ids, max_id = _run(steps)
+    assert ids == [1, 2, 3, 4, 5, 6]
+    assert max_id == 6
+
+
+def test_reconcile_drops_messages_deleted_elsewhere(small_batches):
+    async def steps(channel, catalog):
+        channel.post(*range(1, 8))
+        await catalog.refresh(force=True)
+        await catalog._backfill
+        for i in (2, 5, 7):
+            del channel.messages[i]
+        removed = await catalog._reconcile_all()
+        return removed, await _catalogued(catalog)
+
+    removed, ids = _run(steps)
+    assert removed == 3
+    assert ids == [1, 3, 4, 6]
@@ -0,0 +1,68 @@
+import asyncio
+
+from services.vector_backends.base import chunk_id
+from services.vector_db import create_backend
+from services.vector_store import AsyncVectorStore
+
+
+class _Store(AsyncVectorStore):
+    def __init__(self, backend):
+        super().__init__()
+        self._backend = backend
+
+    @property
+    def _db(self):
+        return self._backend
+
+
+def _rows(path: str, offsets, dim: int = 4):
+    return [
+        {"id": chunk_id(path, o), "path": path, "offset": o, "snippet": f"chunk {o}",
+         "embedding": [1.0] + [float(o)] * (dim - 1)}
+        for o in offsets
+    ]
+
+
+def test_reindex_keeps_new_chunks_and_drops_stale_ones(tmp_path):
+    async def main():
+        store = _Store(create_backend("numpy", str(tmp_path)))
+        try:
+            await store._create("c", {"dim": 4, "index_type": None, "params": {}, "model": "m"})
+            await store.upsert_many("c", _rows("/a.txt", [0, 100, 200, 300]) + _rows("/b.txt", [0]))
+            # 文件变短后重新索引：先写入新分块，再删除不再产生的旧分块
+            await store.upsert_many("c", _rows("/a.txt", [0, 100]))
+            removed = await store.delete_stale_chunks("c", "/a.txt", [chunk_id("/a.txt", o) for o in (0, 100)])
+            hits = await store.search("c", [1.0, 0.0, 0.0, 0.0], 10)
+            return removed, sorted(h["id"] for h in hits[0])
+        finally:
+            await store._run(store._db.close)
+            await store.aclose()
+
+    removed, ids = asyncio.run(main())
+    assert removed == 2
+    assert ids == ["/a.txt#0", "/a.txt#100", "/b.txt#0"]
+
+
+def test_matches_is_read_only_and_checks_model(tmp_path, monkeypatch):
+    async def main():
+        store = _Store(create_backend("numpy", str(tmp_path)))
+        spec = {"model": "embed", "dim": 8, "index_type": "FLAT", "params": {}}
+
+        async def default_spec():
+            return spec
+
+        monkeypatch.setattr(store, "_default_spec", default_spec)
+        try:
+            missing = await store.matches("features", 4, "local-image-v1")
+            created = await store._run(store._db.collection_info, "features")
+            await store._create("features", {"dim": 4, "index_type": None, "params": {}, "model": "local-image-v1"})
+            return (missing, created, await store.matches("features", 4, "local-image-v1"),
+                    await store.matches("features", 4, "local-image-v2"), await store.matches("features", 8))
+        finally:
+            await store._run(store._db.close)
+            await store.aclose()
+
+    missing, created, same, other_model, other_dim = asyncio.run(main())
+    assert not missing and created is None
+    assert same
+    assert not other_model and not other_dim
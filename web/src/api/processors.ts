@@ -36,4 +36,21 @@ export const processorsApi = {
         'Content-Type': 'application/json'
       }
     }),
+  processDirectory: (params: {
+    path: string;
+    processor_type: string;
+    config: any;
+    pattern?: string;
+    recursive?: boolean;
+    save_to_dir?: string;
+    overwrite?: boolean;
+    concurrency?: number;
+  }) =>
+    request<{ task_id: string; job_id: number }>('/processors/process-directory', {
+      method: 'POST',
+      body: JSON.stringify(params),
+      headers: {
+        'Content-Type': 'application/json'
+      }
+    }),
 };
@@ -21,6 +21,7 @@ export interface QueuedTask {
   result?: any;
   error?: string;
   task_info: Record<string, any>;
+  progress?: Record<string, any> | null;
 }
 
 export const tasksApi = {
@@ -244,12 +244,15 @@ export const en = {
   'Trigger Event': 'Trigger Event',
   'File Written': 'File Written',
   'File Deleted': 'File Deleted',
+  'File Moved': 'File Moved',
+  'File Copied': 'File Copied',
   'Matching Rules': 'Matching Rules',
   'Path Prefix (optional)': 'Path Prefix (optional)',
   'Filename Regex (optional)': 'Filename Regex (optional)',
   'Action': 'Action',
   'Current Task Queue': 'Current Task Queue',
   'Params': 'Params',
+  'Progress': 'Progress',
   'Status': 'Status',
 
   // Logs
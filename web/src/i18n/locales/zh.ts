@@ -246,12 +246,15 @@ export const zh = {
   'Trigger Event': '触发事件',
   'File Written': '文件写入',
   'File Deleted': '文件删除',
+  'File Moved': '文件移动',
+  'File Copied': '文件复制',
   'Matching Rules': '匹配规则',
   'Path Prefix (optional)': '路径前缀 (可选)',
   'Filename Regex (optional)': '文件名正则 (可选)',
   'Action': '执行动作',
   'Current Task Queue': '当前任务队列',
   'Params': '参数',
+  'Progress': '进度',
   'Status': '状态',
 
   // Logs
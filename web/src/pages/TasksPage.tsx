@@ -193,6 +193,8 @@ const TasksPage = memo(function TasksPage() {
             <Select options={[ 
               { value: 'file_written', label: t('File Written') }, 
               { value: 'file_deleted', label: t('File Deleted') }, 
+              { value: 'file_moved', label: t('File Moved') },
+              { value: 'file_copied', label: t('File Copied') },
             ]} />
           </Form.Item>
           <Typography.Title level={5} style={{ marginTop: 8, fontSize: 14 }}>{t('Matching Rules')}</Typography.Title>
@@ -239,6 +241,7 @@ const TasksPage = memo(function TasksPage() {
             { title: 'ID', dataIndex: 'id', width: 120, render: (id) => <Typography.Text style={{ fontSize: 12 }} copyable={{ text: id }}>{id.slice(0, 8)}</Typography.Text> },
             { title: t('Task Name'), dataIndex: 'name' },
             { title: t('Params'), dataIndex: 'task_info', render: (info) => <Typography.Text type="secondary" style={{ fontSize: 12 }}>{JSON.stringify(info)}</Typography.Text> },
+            { title: t('Progress'), dataIndex: 'progress', render: (progress) => progress ? <Typography.Text type="secondary" style={{ fontSize: 12 }}>{`${progress.processed ?? 0} / ${progress.seen ?? 0} · ${progress.files_per_sec ?? 0} files/s`}</Typography.Text> : '-' },
             {
               title: t('Status'), dataIndex: 'status', width: 100, render: (status: QueuedTask['status']) => {
                 const colorMap = {